@@ -0,0 +1,148 @@
+# app/chunker.py
+"""
+Texti af vefsíðum fyrirtækis -> chunks fyrir CompanyInfo og prompts.
+
+Allt er generators svo texti fer í gegn síðu fyrir síðu og orð fyrir orð
+(sjá scrape_company í scraper.py):
+  1. blocks af hverri síðu (extract_text_blocks)
+  2. NearDuplicateIndex hendir blocks sem hafa sést áður, t.d. á annarri síðu
+     (cookie borðar, "um okkur" textar, tengiliðaupplýsingar o.s.frv.)
+  3. iter_chunks raðar orðunum í chunks eftir token fjölda, með skörun
+  4. chunks sem eru næstum eins og fyrri chunk (t.d. sama síða á tveimur
+     slóðum) eru líka felld út með öðrum NearDuplicateIndex
+
+Tvítekningar eru fundnar með MinHash (64 hash föll) og LSH banding: 16 bönd
+með 4 gildum hvert. Aðeins textar sem lenda í sama hólfi í einhverju bandi eru
+bornir saman, svo vinnan er línuleg í stærð vefsins en ekki í öðru veldi. Með
+16 × 4 lenda pör með Jaccard 0.8 í sama hólfi í > 99.9% tilvika, en pör með
+0.3 í um 12% tilvika (og er þá hafnað við samanburð á allri undirskriftinni).
+"""
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List
+
+CHUNK_MAX_TOKENS = int(os.getenv("SCRAPE_CHUNK_TOKENS", 400))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("SCRAPE_CHUNK_OVERLAP_TOKENS", 50))
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+JACCARD_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+# Stuttur texti ("Hafa samband", "Vörur") er ekki borinn saman; hann fer alltaf í gegn
+MIN_DEDUPE_WORDS = 8
+
+_WORD_RE = re.compile(r"\S+")
+_NORMALIZE_RE = re.compile(r"[^\w]+")
+_MASK = (1 << 64) - 1
+
+
+def estimate_tokens(word: str) -> int:
+    # ~4 stafir á token með bilinu á undan, eins og tokenizer OpenAI á enskum
+    # texta; íslenska brotnar aðeins meira, svo þetta er frekar vanmat
+    return max(1, (len(word) + 4) // 4)
+
+
+def iter_words(texts: Iterable[str]) -> Iterator[str]:
+    for text in texts:
+        for m in _WORD_RE.finditer(text):
+            yield m.group()
+
+
+def iter_chunks(words: Iterable[str], max_tokens: int = CHUNK_MAX_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[str]:
+    """
+    Chunks með í mesta lagi max_tokens (nema eitt orð sé lengra), og síðustu
+    ~overlap_tokens úr fyrri chunk fremst í þeim næsta. Hvert orð fer einu
+    sinni inn í og einu sinni út úr glugganum.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    window: deque = deque()     # (orð, token)
+    tokens = 0
+    fresh = 0                   # orð í glugganum sem hafa ekki verið í chunk
+
+    for word in words:
+        n = estimate_tokens(word)
+        if window and tokens + n > max_tokens:
+            yield " ".join(w for w, _ in window)
+            fresh = 0
+            while window and tokens > overlap_tokens:
+                tokens -= window.popleft()[1]
+        window.append((word, n))
+        tokens += n
+        fresh += 1
+
+    # Síðasti chunk, nema hann sé bara skörun við þann á undan
+    if fresh:
+        yield " ".join(w for w, _ in window)
+
+
+def shingle_hashes(text: str) -> List[int]:
+    # Orða-shingles af lágstöfuðum texta án greinarmerkja; eitt hash á shingle
+    words = [w for w in _NORMALIZE_RE.sub(" ", text.lower()).split() if w]
+    if len(words) < MIN_DEDUPE_WORDS:
+        return []
+    k = SHINGLE_SIZE
+    return [hash(" ".join(words[i:i + k])) & _MASK for i in range(len(words) - k + 1)]
+
+
+class NearDuplicateIndex:
+    """
+    Man MinHash undirskriftir þess sem hefur sést; is_new() skilar False fyrir
+    texta sem hefur áætlað Jaccard líkindi >= threshold (á orða-shingles) við
+    eitthvað sem var séð áður. Texti styttri en MIN_DEDUPE_WORDS fer alltaf í gegn.
+
+    hash() á str er slembið milli ferla, svo index lifir bara í einu scrape.
+    """
+
+    def __init__(self, threshold: float = JACCARD_THRESHOLD):
+        import numpy as np
+
+        self._np = np
+        self.threshold = threshold
+        rng = np.random.default_rng(0)
+        # multiply-shift hash föll: (a * h + b) mod 2^64, efstu 32 bitarnir
+        self._a = rng.integers(1, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+        self._signatures: list = []
+        self._buckets: Dict[bytes, List[int]] = {}
+        self.kept = 0
+        self.dropped = 0
+
+    def signature(self, hashes: List[int]):
+        np = self._np
+        h = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[:, None]
+        with np.errstate(over="ignore"):
+            mixed = (h * self._a + self._b) >> np.uint64(32)
+        return mixed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig) -> Iterator[bytes]:
+        rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        for b in range(MINHASH_BANDS):
+            yield bytes([b]) + sig[b * rows:(b + 1) * rows].tobytes()
+
+    def is_new(self, text: str) -> bool:
+        hashes = shingle_hashes(text)
+        if not hashes:
+            self.kept += 1
+            return True
+        sig = self.signature(hashes)
+        keys = list(self._band_keys(sig))
+        # Aðeins textar sem deila a.m.k. einu bandi eru bornir saman
+        candidates = {i for key in keys for i in self._buckets.get(key, ())}
+        for i in candidates:
+            if (self._signatures[i] == sig).mean() >= self.threshold:
+                self.dropped += 1
+                return False
+        index = len(self._signatures)
+        self._signatures.append(sig)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(index)
+        self.kept += 1
+        return True
+
+    def filter(self, texts: Iterable[str]) -> Iterator[str]:
+        for text in texts:
+            if self.is_new(text):
+                yield text
@@ -0,0 +1,191 @@
+# app/company_cache.py
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from .database import SessionLocal
+from .responses import dumps
+
+# Svæði sem /companies?fields= má biðja um, í þeirri röð sem þau eru skrifuð
+COMPANY_FIELDS = ("id", "CompanyName", "CompanyDescription", "CompanyInfo")
+
+# Hversu oft (sek.) snapshot er borið saman við catalog_versions (migrations/019),
+# svo breytingar úr öðrum ferlum sjáist
+CATALOG_CHECK_SECONDS = float(os.getenv("COMPANY_CATALOG_CHECK_SECONDS", 2))
+
+
+class AliasSampler:
+    """
+    Vose alias method: O(n) uppsetning, O(1) fyrir hvert weighted úrtak.
+    """
+
+    def __init__(self, items: List[str], weights: List[float]):
+        n = len(items)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("AliasSampler needs at least one positive weight")
+
+        self.items = items
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Afgangur er 1.0 upp að floating point skekkju
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def sample(self, rng=random) -> str:
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+class _Snapshot:
+    def __init__(self, version: int, rows: List[dict]):
+        self.version = version
+        self.rows = rows
+        self.names = [r["CompanyName"] for r in rows]
+        payload = json.dumps(rows, sort_keys=True, default=str).encode("utf-8")
+        self.etag = f'W/"companies-{version}-{hashlib.sha1(payload).hexdigest()[:16]}"'
+        self.samplers: Dict[tuple, AliasSampler] = {}
+        self.encoded: Dict[Optional[tuple], bytes] = {}
+
+
+class CompanyCatalog:
+    """
+    Process-wide cache af "Companies" töflunni.
+
+    Snapshot-ið er merkt með catalog_versions.version, sem trigger hækkar við
+    hverja breytingu á töflunni (migrations/019), líka úr öðrum ferlum. Í mesta
+    lagi á CATALOG_CHECK_SECONDS fresti er version lesið; hafi það breyst er
+    taflan lesin aftur. invalidate() (t.d. eftir /scrape eða /cleanup-duplicates)
+    lætur þetta ferli lesa hana strax.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _db_version(self) -> int:
+        db = SessionLocal()
+        try:
+            version = db.execute(
+                text("SELECT version FROM catalog_versions WHERE name = 'Companies'")
+            ).scalar()
+            return version or 0
+        finally:
+            db.close()
+
+    def _load(self) -> List[dict]:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                text(
+                    """
+                    SELECT DISTINCT ON ("CompanyName")
+                           id,
+                           "CompanyName",
+                           "CompanyDescription",
+                           "CompanyInfo"
+                    FROM "Companies"
+                    ORDER BY "CompanyName", id
+                    """
+                )
+            )
+            return [dict(row) for row in result.mappings().all()]
+        finally:
+            db.close()
+
+    def _fresh(self) -> Optional[_Snapshot]:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < CATALOG_CHECK_SECONDS:
+            return snap
+        return None
+
+    def snapshot(self) -> _Snapshot:
+        snap = self._fresh()
+        if snap is not None:
+            return snap
+
+        with self._lock:
+            # Aðeins einn þráður les úr grunninum; hinir bíða eftir niðurstöðunni
+            snap = self._fresh()
+            if snap is not None:
+                return snap
+            # version lesið á undan töflunni: breyting á milli lendir í næsta
+            # samanburði og veldur bara auka lestri, aldrei gömlu snapshot-i
+            version = self._db_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = _Snapshot(version, self._load())
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    @property
+    def etag(self) -> str:
+        return self.snapshot().etag
+
+    def companies(self) -> List[dict]:
+        return self.snapshot().rows
+
+    def encoded(self, fields: Optional[List[str]] = None) -> bytes:
+        """
+        /companies svarið sem JSON bytes, serializað einu sinni fyrir hvert
+        fields-val og geymt með snapshot-inu þar til invalidate().
+        """
+        snap = self.snapshot()
+        key = tuple(fields) if fields else None
+        body = snap.encoded.get(key)
+        if body is None:
+            body = dumps([{f: row[f] for f in (fields or COMPANY_FIELDS)} for row in snap.rows])
+            snap.encoded[key] = body
+        return body
+
+    def random_company(self, rng=random) -> Optional[str]:
+        names = self.snapshot().names
+        if not names:
+            return None
+        return names[rng.randrange(len(names))]
+
+    def weighted_company(self, weights: Dict[str, float], rng=random) -> Optional[str]:
+        """
+        Velur fyrirtæki eftir vigtum {CompanyName: weight}. Fyrirtæki sem eru
+        ekki í weights fá vigt 0; nöfn sem eru ekki lengur í töflunni eru hunsuð.
+        """
+        snap = self.snapshot()
+        key = tuple(sorted(weights.items()))
+        sampler = snap.samplers.get(key)
+        if sampler is None:
+            known = set(snap.names)
+            items = [name for name, w in key if name in known and w > 0]
+            if not items:
+                return None
+            sampler = AliasSampler(items, [weights[name] for name in items])
+            snap.samplers[key] = sampler
+        return sampler.sample(rng)
+
+
+company_catalog = CompanyCatalog()
@@ -0,0 +1,60 @@
+# app/company_service.py
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import text
+
+# Krefst unique index á "CompanyName" (migrations/001_companies_unique_name.sql).
+# xmax = 0 þýðir að röðin var búin til í þessari skipun, annars var hún uppfærð.
+UPSERT_SQL = """
+    INSERT INTO "Companies" ("CompanyName", "CompanyDescription", "CompanyInfo")
+    VALUES {values}
+    ON CONFLICT ("CompanyName") DO UPDATE
+    SET "CompanyDescription" = EXCLUDED."CompanyDescription",
+        "CompanyInfo"        = EXCLUDED."CompanyInfo"
+    RETURNING "CompanyName", (xmax = 0) AS inserted
+"""
+
+
+def upsert_company(db, name: str, descr: str, info: str) -> str:
+    """
+    Setur inn eða uppfærir eitt fyrirtæki í einni skipun.
+    Skilar "created" eða "updated". Kallandi sér um commit.
+    """
+    row = db.execute(
+        text(UPSERT_SQL.format(values="(:name, :descr, :info)")),
+        {"name": name, "descr": descr, "info": info},
+    ).fetchone()
+    return "created" if row.inserted else "updated"
+
+
+def upsert_companies(db, companies: Iterable[Tuple[str, str, str]]) -> List[dict]:
+    """
+    Multi-row útgáfa af upsert_company: ein INSERT ... ON CONFLICT fyrir allan listann.
+
+    companies: (name, description, info) túplur. Ef sama nafn kemur oftar en
+    einu sinni gildir síðasta færslan (Postgres leyfir ekki að sama röð sé
+    uppfærð tvisvar í einni skipun).
+    """
+    latest = {}
+    for name, descr, info in companies:
+        latest[name] = (descr, info)
+    if not latest:
+        return []
+
+    params = {}
+    placeholders = []
+    for i, (name, (descr, info)) in enumerate(latest.items()):
+        placeholders.append(f"(:name_{i}, :descr_{i}, :info_{i})")
+        params[f"name_{i}"] = name
+        params[f"descr_{i}"] = descr
+        params[f"info_{i}"] = info
+
+    rows = db.execute(
+        text(UPSERT_SQL.format(values=", ".join(placeholders))),
+        params,
+    ).fetchall()
+
+    return [
+        {"name": row.CompanyName, "action": "created" if row.inserted else "updated"}
+        for row in rows
+    ]
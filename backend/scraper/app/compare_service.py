@@ -0,0 +1,379 @@
+# app/compare_service.py
+import math
+import random
+from typing import Callable, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from .load_generator import percentile
+
+# Sjálfgefin mörk fyrir hvað telst afturför. Tölfræðilega marktækur munur er
+# ekki nóg: munurinn þarf líka að vera nógu stór til að skipta máli.
+DEFAULT_ALPHA = 0.05
+MIN_LATENCY_INCREASE_PCT = 5.0      # miðgildi svartíma hækkar um meira en 5%
+MIN_GRADE_DROP = 0.2                # meðaleinkunn lækkar um meira en 0.2
+MIN_FAILURE_RATE_INCREASE = 0.01    # villuhlutfall hækkar um meira en 1 prósentustig
+MIN_SAMPLES = 5
+BOOTSTRAP_RESAMPLES = 2000
+
+
+def _phi(z: float) -> float:
+    return 0.5 * math.erfc(-z / math.sqrt(2))
+
+
+def mann_whitney_u(baseline: Sequence[float], candidate: Sequence[float], alternative: str) -> dict:
+    """
+    Mann-Whitney U með normal nálgun, tie leiðréttingu og continuity correction.
+
+    alternative="greater": candidate er stochastically stærra en baseline
+    alternative="less":    candidate er stochastically minna en baseline
+    """
+    n1, n2 = len(candidate), len(baseline)
+    combined = sorted([(v, 0) for v in candidate] + [(v, 1) for v in baseline])
+    n = n1 + n2
+
+    # Meðalröð fyrir jöfn gildi
+    rank_sum = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        avg_rank = (i + j) / 2 + 1
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        rank_sum += avg_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 0)
+        i = j + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mu = n1 * n2 / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        p = 1.0
+    elif alternative == "greater":
+        p = 1 - _phi((u - mu - 0.5) / sigma)
+    elif alternative == "less":
+        p = _phi((u - mu + 0.5) / sigma)
+    else:
+        raise ValueError("alternative must be 'greater' or 'less'")
+
+    return {
+        "u": u,
+        "p_value": min(1.0, max(0.0, p)),
+        # P(candidate > baseline) - P(candidate < baseline), -1..1
+        "rank_biserial": 2 * u / (n1 * n2) - 1,
+    }
+
+
+def bootstrap_diff_ci(
+    baseline: Sequence[float],
+    candidate: Sequence[float],
+    stat: Callable[[List[float]], float],
+    alpha: float = DEFAULT_ALPHA,
+    n_resamples: int = BOOTSTRAP_RESAMPLES,
+    rng: Optional[random.Random] = None,
+) -> dict:
+    """
+    Percentile bootstrap öryggisbil fyrir stat(candidate) - stat(baseline).
+    """
+    rng = rng or random.Random(0)
+    diffs = sorted(
+        stat(rng.choices(candidate, k=len(candidate))) - stat(rng.choices(baseline, k=len(baseline)))
+        for _ in range(n_resamples)
+    )
+    return {
+        "diff": stat(list(candidate)) - stat(list(baseline)),
+        "ci_low": percentile(diffs, alpha / 2),
+        "ci_high": percentile(diffs, 1 - alpha / 2),
+    }
+
+
+def _median(values: List[float]) -> float:
+    return percentile(sorted(values), 0.50)
+
+
+def _p95(values: List[float]) -> float:
+    return percentile(sorted(values), 0.95)
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values)
+
+
+def _check_tests(db, test_ids: List[int]) -> List[int]:
+    """
+    404 ef einhver test er ekki til. Skilar þeim sem hafa engar keyrslur
+    tengdar (t.d. bench tests úr backend/testResult/bench.py).
+    """
+    rows = db.execute(
+        text("""
+            SELECT t.test_id,
+                   EXISTS (SELECT 1 FROM "EmailTestRuns" r WHERE r.test_id = t.test_id) AS has_runs
+            FROM tests t
+            WHERE t.test_id = ANY(:ids)
+        """),
+        {"ids": test_ids},
+    ).all()
+    missing = sorted(set(test_ids) - {r.test_id for r in rows})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tests not found: {missing}")
+    return sorted(r.test_id for r in rows if not r.has_runs)
+
+
+def fetch_samples(db, test_ids: List[int]) -> Dict[str, list]:
+    """
+    Sækir svartíma, einkunnir og villur allra keyrslna í test_ids (tengdar með EmailTestRuns.test_id).
+    Sjálfsmat (grade_source = 'self') er ekki einkunn dómarans og er ekki með í reply_grade.
+    """
+    rows = db.execute(
+        text("""
+            SELECT latency_ms,
+                   CASE WHEN grade_source IS DISTINCT FROM 'self' THEN reply_grade END AS reply_grade,
+                   generated_body IS NULL AS failed
+            FROM "EmailTestRuns"
+            WHERE test_id = ANY(:ids)
+        """),
+        {"ids": test_ids},
+    ).all()
+
+    return {
+        "latency_ms": [float(r.latency_ms) for r in rows if r.latency_ms is not None and not r.failed],
+        "reply_grade": [float(r.reply_grade) for r in rows if r.reply_grade is not None],
+        "failed": [bool(r.failed) for r in rows],
+    }
+
+
+def fetch_test_metrics(db, test_ids: List[int]) -> dict:
+    """
+    Tölur af tests-röðunum sjálfum (meðaltal yfir hópinn), fyrir tests án keyrslna.
+    """
+    row = db.execute(
+        text("""
+            SELECT AVG(latency_p50_ms)  AS latency_p50_ms,
+                   AVG(latency_p95_ms)  AS latency_p95_ms,
+                   AVG(throughput_rps)  AS throughput_rps,
+                   AVG(avg_reply_grade) AS reply_grade,
+                   SUM(failure_count)::float / NULLIF(SUM(total_requests), 0) AS failure_rate,
+                   SUM(total_requests)  AS runs,
+                   SUM(failure_count)   AS failures
+            FROM tests
+            WHERE test_id = ANY(:ids)
+        """),
+        {"ids": test_ids},
+    ).mappings().first()
+    return {k: float(v) if v is not None else None for k, v in row.items()}
+
+
+def _compare_values(base: Optional[float], cand: Optional[float], threshold: float, worse: str) -> dict:
+    """
+    Samanburður á einu gildi í hvorum hóp. Engin dreifing, svo ekkert
+    marktektarpróf: afturför er bara munur handan threshold.
+    worse="higher" (svartími, villur) eða "lower" (einkunn, afköst).
+    """
+    if base is None or cand is None:
+        return {"status": "insufficient_data", "regression": False}
+    diff = cand - base
+    regression = diff > threshold if worse == "higher" else diff < -threshold
+    return {
+        "status": "regression" if regression else "ok",
+        "regression": regression,
+        "baseline": base,
+        "candidate": cand,
+        "diff": diff,
+        "threshold": threshold if worse == "higher" else -threshold,
+    }
+
+
+def compare_test_level(base: dict, cand: dict, min_latency_increase_pct: float,
+                       min_grade_drop: float, min_failure_rate_increase: float) -> dict:
+    def pct_of(value):
+        return value * min_latency_increase_pct / 100 if value is not None else 0.0
+
+    return {
+        "latency_p50_ms": _compare_values(
+            base["latency_p50_ms"], cand["latency_p50_ms"], pct_of(base["latency_p50_ms"]), "higher"
+        ),
+        "latency_p95_ms": _compare_values(
+            base["latency_p95_ms"], cand["latency_p95_ms"], pct_of(base["latency_p95_ms"]), "higher"
+        ),
+        "throughput_rps": _compare_values(
+            base["throughput_rps"], cand["throughput_rps"], pct_of(base["throughput_rps"]), "lower"
+        ),
+        "reply_grade": _compare_values(base["reply_grade"], cand["reply_grade"], min_grade_drop, "lower"),
+        "failure_rate": _compare_values(
+            base["failure_rate"], cand["failure_rate"], min_failure_rate_increase, "higher"
+        ),
+    }
+
+
+def _compare_latency(base, cand, alpha, min_increase_pct, n_resamples, rng) -> dict:
+    if len(base) < MIN_SAMPLES or len(cand) < MIN_SAMPLES:
+        return {"status": "insufficient_data", "regression": False}
+
+    test = mann_whitney_u(base, cand, "greater")
+    median = bootstrap_diff_ci(base, cand, _median, alpha, n_resamples, rng)
+    p95 = bootstrap_diff_ci(base, cand, _p95, alpha, n_resamples, rng)
+    threshold = _median(base) * min_increase_pct / 100
+
+    regression = test["p_value"] < alpha and median["ci_low"] > threshold
+    return {
+        "status": "regression" if regression else "ok",
+        "regression": regression,
+        "baseline_median": _median(base),
+        "candidate_median": _median(cand),
+        "baseline_p95": _p95(base),
+        "candidate_p95": _p95(cand),
+        "median_diff": median,
+        "p95_diff": p95,
+        "mann_whitney": test,
+        "threshold_ms": threshold,
+    }
+
+
+def _compare_grades(base, cand, alpha, min_drop, n_resamples, rng) -> dict:
+    if len(base) < MIN_SAMPLES or len(cand) < MIN_SAMPLES:
+        return {"status": "insufficient_data", "regression": False}
+
+    test = mann_whitney_u(base, cand, "less")
+    mean = bootstrap_diff_ci(base, cand, _mean, alpha, n_resamples, rng)
+
+    regression = test["p_value"] < alpha and mean["ci_high"] < -min_drop
+    return {
+        "status": "regression" if regression else "ok",
+        "regression": regression,
+        "baseline_mean": _mean(base),
+        "candidate_mean": _mean(cand),
+        "mean_diff": mean,
+        "mann_whitney": test,
+        "threshold": -min_drop,
+    }
+
+
+def _compare_failures(base, cand, alpha, min_increase) -> dict:
+    n1, n2 = len(base), len(cand)
+    if n1 < MIN_SAMPLES or n2 < MIN_SAMPLES:
+        return {"status": "insufficient_data", "regression": False}
+
+    f1, f2 = sum(base), sum(cand)
+    p1, p2 = f1 / n1, f2 / n2
+    pooled = (f1 + f2) / (n1 + n2)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    # Einhliða tveggja hlutfalla z-próf: er villuhlutfallið hærra?
+    p_value = 1 - _phi((p2 - p1) / se) if se > 0 else 1.0
+
+    regression = p_value < alpha and p2 - p1 > min_increase
+    return {
+        "status": "regression" if regression else "ok",
+        "regression": regression,
+        "baseline_rate": p1,
+        "candidate_rate": p2,
+        "p_value": p_value,
+        "threshold": min_increase,
+    }
+
+
+def compare_tests(
+    db,
+    baseline_ids: List[int],
+    candidate_ids: List[int],
+    alpha: float = DEFAULT_ALPHA,
+    min_latency_increase_pct: float = MIN_LATENCY_INCREASE_PCT,
+    min_grade_drop: float = MIN_GRADE_DROP,
+    min_failure_rate_increase: float = MIN_FAILURE_RATE_INCREASE,
+    n_resamples: int = BOOTSTRAP_RESAMPLES,
+    seed: int = 0,
+) -> dict:
+    """
+    Ber saman keyrslur tveggja hópa af tests (baseline vs. candidate).
+
+    Afturför er flögguð þegar munurinn er bæði marktækur (einhliða Mann-Whitney
+    eða z-próf, p < alpha) og bootstrap öryggisbilið er allt handan marksins
+    (t.d. miðgildi svartíma hækkar um meira en 5%).
+
+    Ef engin test í hvorugum hópnum hefur keyrslur (bench tests) eru tölurnar
+    á tests-röðunum bornar saman í staðinn (method="test_level"), án marktektarprófs.
+    """
+    if not baseline_ids or not candidate_ids:
+        raise HTTPException(status_code=400, detail="baseline and candidate must both contain test ids")
+    overlap = set(baseline_ids) & set(candidate_ids)
+    if overlap:
+        raise HTTPException(status_code=400, detail=f"Test ids in both groups: {sorted(overlap)}")
+    if not 0 < alpha < 1:
+        raise HTTPException(status_code=400, detail="alpha must be between 0 and 1")
+
+    no_runs = _check_tests(db, baseline_ids) + _check_tests(db, candidate_ids)
+    if len(no_runs) == len(baseline_ids) + len(candidate_ids):
+        # Bara samantektir (t.d. bench tests): borið saman á tests-röðunum
+        return _test_level_result(
+            db, baseline_ids, candidate_ids, alpha,
+            min_latency_increase_pct, min_grade_drop, min_failure_rate_increase,
+        )
+    if no_runs:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tests {no_runs} have no runs linked to them; compare them only with other tests "
+                   "without runs (test-level metrics), or leave them out",
+        )
+
+    base = fetch_samples(db, baseline_ids)
+    cand = fetch_samples(db, candidate_ids)
+
+    rng = random.Random(seed)
+    metrics = {
+        "latency_ms": _compare_latency(
+            base["latency_ms"], cand["latency_ms"], alpha, min_latency_increase_pct, n_resamples, rng
+        ),
+        "reply_grade": _compare_grades(
+            base["reply_grade"], cand["reply_grade"], alpha, min_grade_drop, n_resamples, rng
+        ),
+        "failure_rate": _compare_failures(
+            base["failed"], cand["failed"], alpha, min_failure_rate_increase
+        ),
+    }
+    regressions = [name for name, m in metrics.items() if m["regression"]]
+
+    def group(ids, samples):
+        return {
+            "test_ids": ids,
+            "runs": len(samples["failed"]),
+            "failures": sum(samples["failed"]),
+            "graded": len(samples["reply_grade"]),
+        }
+
+    return {
+        "method": "runs",
+        "baseline": group(baseline_ids, base),
+        "candidate": group(candidate_ids, cand),
+        "alpha": alpha,
+        "metrics": metrics,
+        "regressions": regressions,
+        "regression": bool(regressions),
+    }
+
+
+def _test_level_result(db, baseline_ids, candidate_ids, alpha, min_latency_increase_pct,
+                       min_grade_drop, min_failure_rate_increase) -> dict:
+    base = fetch_test_metrics(db, baseline_ids)
+    cand = fetch_test_metrics(db, candidate_ids)
+    metrics = compare_test_level(base, cand, min_latency_increase_pct, min_grade_drop, min_failure_rate_increase)
+    regressions = [name for name, m in metrics.items() if m["regression"]]
+
+    def group(ids, values):
+        return {
+            "test_ids": ids,
+            "runs": int(values["runs"] or 0),
+            "failures": int(values["failures"] or 0),
+            "graded": None,
+        }
+
+    return {
+        "method": "test_level",
+        "baseline": group(baseline_ids, base),
+        "candidate": group(candidate_ids, cand),
+        "alpha": alpha,
+        "metrics": metrics,
+        "regressions": regressions,
+        "regression": bool(regressions),
+    }
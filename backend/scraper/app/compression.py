@@ -0,0 +1,158 @@
+# app/compression.py
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli er valkvætt; án þess er bara gzip í boði
+    brotli = None
+
+# Svör minni en þetta eru send óþjöppuð; þjöppun borgar sig ekki
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+# 5 er álíka lítið og gzip 6 en hraðara (sjá testResult/serialization_bench.py);
+# 11 er of hægt fyrir dýnamísk svör
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+
+# Þegar þjappað á annan hátt eða streymt jafnóðum til client (SSE)
+SKIP_CONTENT_TYPES = ("text/event-stream", "image/", "application/gzip", "application/zip")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Velur "br" eða "gzip" úr Accept-Encoding eftir q-gildum; br ef jafnt.
+    """
+    q = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name.strip()] = weight
+    if "*" in q:
+        q.setdefault("br", q["*"])
+        q.setdefault("gzip", q["*"])
+
+    candidates = [e for e in (("br", "gzip") if brotli is not None else ("gzip",)) if q.get(e, 0) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda e: q[e])
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31: gzip haus og checksum
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data) if data else b""
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _add_vary(headers: list) -> list:
+    """
+    Bætir Accept-Encoding við Vary sem fyrir er (t.d. Origin frá CORS) í stað
+    þess að skipta því út.
+    """
+    values = [v for k, v in headers if k.lower() == b"vary"]
+    tokens = [t.strip().lower() for v in values for t in v.decode("latin-1").split(",")]
+    if "accept-encoding" in tokens or "*" in tokens:
+        return headers
+    merged = b", ".join(values + [b"Accept-Encoding"])
+    return [(k, v) for k, v in headers if k.lower() != b"vary"] + [(b"vary", merged)]
+
+
+def _weak_etag(value: bytes) -> bytes:
+    # Þjappaður body er ekki bæti-fyrir-bæti sá sami og óþjappaður (né gzip og br
+    # hvor annar), svo sterkt ETag má ekki fylgja honum óbreytt
+    return value if value.startswith(b"W/") else b"W/" + value
+
+
+class CompressionMiddleware:
+    """
+    Hrá ASGI middleware sem þjappar svörum með brotli eða gzip eftir
+    Accept-Encoding. Svör í einum hluta undir MINIMUM_SIZE eru send óbreytt;
+    streymd svör (t.d. /test-runs/export) eru þjöppuð hluta fyrir hluta svo
+    þau haldist streymd.
+
+    Öll svör sem gætu verið þjöppuð fá Vary: Accept-Encoding (líka þau sem eru
+    send óþjöppuð), bætt við Vary sem fyrir er. ETag á þjöppuðu svari verður weak.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept) if accept else None
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or content_type.startswith(SKIP_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = {**message, "headers": _add_vary(list(message.get("headers", [])))}
+                if encoding is None:
+                    passthrough = True
+                    await send(start_message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = [
+                    (k, _weak_etag(v) if k.lower() == b"etag" else v)
+                    for k, v in start_message["headers"]
+                    if k.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                data = compressor.compress(body, final=not more_body)
+                if not more_body:
+                    headers.append((b"content-length", str(len(data)).encode()))
+                await send({**start_message, "headers": headers})
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            data = compressor.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
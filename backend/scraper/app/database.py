@@ -1,23 +1,34 @@
 import os
-from pathlib import Path
-from dotenv import load_dotenv
+from functools import lru_cache
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
-# Path to this file: backend/scraper/app/database.py
-BASE_DIR = Path(__file__).resolve()
+from .env import load_env
 
-# Go up: app -> scraper -> backend -> project root
-PROJECT_ROOT = BASE_DIR.parents[3]
+load_env()
 
-# Load .env from project root (SUPREME-COUSCOUS/.env)
-load_dotenv(PROJECT_ROOT / ".env")
+Base = declarative_base()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set")
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    Engine búið til við fyrstu notkun en ekki við import, svo ferlið ræsi án
+    grunns og villa um DATABASE_URL komi þar sem hann er notaður.
+    create_engine tengist ekki; fyrsta tenging er við fyrstu fyrirspurn.
+    """
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is not set")
+    return create_engine(database_url, pool_pre_ping=True)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+
+@lru_cache(maxsize=None)
+def _sessionmaker() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+def SessionLocal() -> Session:
+    # Sama notkun og sessionmaker áður: SessionLocal() / with SessionLocal() as db
+    return _sessionmaker()()
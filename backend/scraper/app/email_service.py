@@ -3,10 +3,11 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from .env import load_env
+from .metrics import SMTP_LATENCY, timed
+
+load_env()
 
 class EmailService:
     def __init__(self):
@@ -15,6 +16,8 @@ class EmailService:
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.from_email = os.getenv("FROM_EMAIL", self.smtp_username)
+        # SMTP_USE_TLS=false fyrir staðbundna SMTP þjóna (t.d. sink í benchmark) sem styðja ekki STARTTLS
+        self.use_tls = os.getenv("SMTP_USE_TLS", "true").lower() not in ("0", "false", "no")
         
     def send_email(
         self,
@@ -71,8 +74,9 @@ class EmailService:
                 msg.attach(html_part)
             
             # Connect to SMTP server and send
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Secure the connection
+            with timed(SMTP_LATENCY), smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                if self.use_tls:
+                    server.starttls()  # Secure the connection
                 server.login(self.smtp_username, self.smtp_password)
                 server.send_message(msg)
             
@@ -0,0 +1,21 @@
+# app/env.py
+from functools import lru_cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Path to this file: backend/scraper/app/env.py
+# Go up: app -> scraper -> backend -> project root
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+
+@lru_cache(maxsize=None)
+def load_env():
+    """
+    Les .env einu sinni fyrir allt ferlið; modules sem lesa stillingar við
+    import kalla á þetta fyrst. Gildi sem eru þegar í umhverfinu ráða.
+    """
+    # Load .env from project root (SUPREME-COUSCOUS/.env)
+    load_dotenv(PROJECT_ROOT / ".env")
+    # .env næst app/ (það sem email_service las áður)
+    load_dotenv()
@@ -0,0 +1,250 @@
+# app/export_service.py
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from .models import EmailTestRun, Scenario
+
+# Röðin hér ræður röð dálka í CSV/Parquet
+EXPORT_COLUMNS = [
+    "id",
+    "test_id",
+    "company_id",
+    "company_name",
+    "scenario",
+    "input_email",
+    "generated_subject",
+    "generated_body",
+    "model_name",
+    "temperature",
+    "max_tokens",
+    "llm_seed",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "prompt_version",
+    "latency_ms",
+    "grading_latency_ms",
+    "grading_prompt_tokens",
+    "grading_cached_tokens",
+    "stage_timings",
+    "sent_ok",
+    "reply_grade",
+    "grade_source",
+    "self_grade",
+    "scheduled_at",
+    "started_at",
+    "created_at",
+]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Hversu margar raðir eru sóttar í einu (ein keyset síða)
+YIELD_PER = 1000
+
+
+def build_export_query(
+    test_id: Optional[int] = None,
+    company: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Allar síur fara inn í SQL svo aðeins raðirnar sem eru fluttar út eru lesnar.
+    """
+    table = EmailTestRun.__table__
+    scenarios = Scenario.__table__
+    # Textinn kemur úr "Scenarios"; eldri raðir hafa hann enn í eigin dálkum
+    joined = {
+        "scenario": func.coalesce(scenarios.c.label, table.c.scenario).label("scenario"),
+        "input_email": func.coalesce(scenarios.c.input_email, table.c.input_email).label("input_email"),
+    }
+    stmt = select(*[joined.get(name, table.c[name]) for name in EXPORT_COLUMNS]).select_from(
+        table.outerjoin(scenarios, scenarios.c.id == table.c.scenario_id)
+    )
+    if test_id is not None:
+        stmt = stmt.where(table.c.test_id == test_id)
+    if company:
+        stmt = stmt.where(table.c.company_name == company)
+    if since:
+        stmt = stmt.where(table.c.created_at >= since)
+    if until:
+        stmt = stmt.where(table.c.created_at < until)
+    return stmt.order_by(table.c.id)
+
+
+def iter_rows(db, stmt) -> Iterator[dict]:
+    """
+    Les raðir í keyset síðum eftir id (WHERE id > síðasta id LIMIT YIELD_PER),
+    svo minnisnotkun helst föst óháð fjölda raða. yield_per dugar ekki: pg8000
+    sækir allt svarið inn í minni áður en fyrsta röðin er skilað.
+    stmt verður að vera raðað eftir id (build_export_query).
+    """
+    id_col = EmailTestRun.__table__.c.id
+    last_id = None
+    while True:
+        page_stmt = stmt if last_id is None else stmt.where(id_col > last_id)
+        page = db.execute(page_stmt.limit(YIELD_PER)).mappings().all()
+        yield from page
+        if len(page) < YIELD_PER:
+            return
+        last_id = page[-1]["id"]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _flat(value):
+    # CSV/Parquet: dagsetningar sem ISO strengir og JSON dálkar sem JSON strengir
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def iter_ndjson(rows: Iterable[dict]) -> Iterator[bytes]:
+    for row in rows:
+        yield (json.dumps(dict(row), default=_json_default, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_csv(rows: Iterable[dict]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow([_flat(row[name]) for name in EXPORT_COLUMNS])
+        if i % YIELD_PER == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+class _DrainBuffer(io.RawIOBase):
+    """
+    Write-only sink fyrir pyarrow sem við tæmum eftir hvern row group,
+    svo Parquet skráin sé send út í bútum í stað þess að byggjast upp í minni.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("test_id", pa.int64()),
+        ("company_id", pa.int64()),
+        ("company_name", pa.string()),
+        ("scenario", pa.string()),
+        ("input_email", pa.string()),
+        ("generated_subject", pa.string()),
+        ("generated_body", pa.string()),
+        ("model_name", pa.string()),
+        ("temperature", pa.float64()),
+        ("max_tokens", pa.int64()),
+        ("llm_seed", pa.int64()),
+        ("prompt_tokens", pa.int64()),
+        ("completion_tokens", pa.int64()),
+        ("cached_tokens", pa.int64()),
+        ("prompt_version", pa.string()),
+        ("latency_ms", pa.int64()),
+        ("grading_latency_ms", pa.int64()),
+        ("grading_prompt_tokens", pa.int64()),
+        ("grading_cached_tokens", pa.int64()),
+        ("stage_timings", pa.string()),
+        ("sent_ok", pa.bool_()),
+        ("reply_grade", pa.float64()),
+        ("grade_source", pa.string()),
+        ("self_grade", pa.float64()),
+        ("scheduled_at", pa.timestamp("us", tz="UTC")),
+        ("started_at", pa.timestamp("us", tz="UTC")),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def iter_parquet(rows: Iterable[dict], compression: str = "zstd") -> Iterator[bytes]:
+    """
+    Skrifar einn Parquet row group fyrir hverjar YIELD_PER raðir.
+    Krefst pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _DrainBuffer()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression=compression)
+
+    def flush(batch):
+        columns = {name: [r[name] for r in batch] for name in EXPORT_COLUMNS}
+        for name in ("reply_grade", "self_grade"):
+            columns[name] = [float(g) if g is not None else None for g in columns[name]]
+        columns["stage_timings"] = [_flat(v) for v in columns["stage_timings"]]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= YIELD_PER:
+            flush(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        flush(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(rows: Iterable[dict], fmt: str) -> Iterator[bytes]:
+    """
+    Velur writer eftir sniði. Villur (óþekkt snið, pyarrow vantar) koma hér,
+    áður en byrjað er að streyma svarinu.
+    """
+    if fmt == "ndjson":
+        return iter_ndjson(rows)
+    if fmt == "csv":
+        return iter_csv(rows)
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            # Vantar á þjóninum, ekki villa í beiðninni
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed on the server")
+        return iter_parquet(rows)
+    raise HTTPException(status_code=400, detail=f"Unknown export format: {fmt}")
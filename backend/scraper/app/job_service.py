@@ -0,0 +1,1321 @@
+# app/job_service.py
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from .database import SessionLocal
+from .simulation_service import (
+    GRADING_MODES,
+    _remaining,
+    create_test_summary_from_run_ids,
+    refresh_test_summary,
+    run_single_simulation,
+    test_summary_to_dict,
+)
+from .llm_service import evaluate_with_openai_rubric
+from .prompts import get_template
+from . import reevaluation_service, task_queue
+from .load_generator import arrival_offsets, build_report
+from .scenario_corpus import DEFAULT_CORPUS, new_seed, sample_plan
+from .tracing import RunTrace
+
+TERMINAL_STATUSES = {"completed", "cancelled", "deadline_exceeded", "failed", "interrupted"}
+
+JSON_FIELDS = {"params", "report"}
+
+# Framvinda er skrifuð í simulation_jobs í mesta lagi þetta oft (sek.)
+PROGRESS_WRITE_INTERVAL = 1.0
+
+# Hversu lengi við bíðum eftir köllum sem eru í gangi þegar job er stöðvað.
+# LLM köllin sjálf fá timeout sem rennur út á deadline.
+STOP_GRACE_SECONDS = 5.0
+
+# Eftir STOP_GRACE_SECONDS er beðið eftir að þræðirnir sjálfir klárist (þeirra
+# LLM köll hafa í mesta lagi JOB_CALL_TIMEOUT_SECONDS), svo allar keyrslur séu
+# komnar í EmailTestRuns áður en _finalize safnar þeim í tests-röð
+STOP_DRAIN_SECONDS = float(os.getenv("SIMULATION_STOP_DRAIN_SECONDS", 300))
+
+# "inprocess": job keyra í API ferlinu. "queue": closed-loop, model matrix og
+# endurmat eru sett í simulation_tasks og keyrð af worker.py (migrations/014, 020);
+# API bara bætir í biðröðina. Open-loop álagsprófanir þurfa einn tímastjóra sem
+# ræsir beiðnir á réttum tíma og er hafnað (409): keyrið þær á eintaki með
+# SIMULATION_BACKEND=inprocess sem tekur ekki við annarri umferð.
+# Sjálfgefið "inprocess" svo dev.py virki án worker.py.
+SIMULATION_BACKEND = os.getenv("SIMULATION_BACKEND", "inprocess")
+
+# Hversu oft wait()/events lesa stöðu job-s sem worker keyrir (sek.)
+QUEUE_POLL_INTERVAL = 1.0
+
+# In-process job fá heartbeat á JOB_HEARTBEAT_SECONDS fresti frá ferlinu sem
+# keyrir þau (simulation_jobs.owner, migrations/017). Annað ferli klárar job sem
+# 'interrupted' aðeins þegar heartbeat er eldra en JOB_STALE_SECONDS.
+JOB_HEARTBEAT_SECONDS = float(os.getenv("SIMULATION_JOB_HEARTBEAT_SECONDS", 15))
+JOB_STALE_SECONDS = float(os.getenv("SIMULATION_JOB_STALE_SECONDS", 60))
+
+# Sjálfgefinn fjöldi samtímis beiðna í open-loop álagsprófun (LoadTestRequest líka)
+DEFAULT_MAX_IN_FLIGHT = 64
+
+
+def _utc(ts: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None
+
+
+def instance_id() -> str:
+    # Sama snið og worker_id í queue_worker; reiknað við kall svo hvert ferli fái sitt pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _insert_job(params: dict, num_total: int, deadline: Optional[float], owner: Optional[str] = None) -> int:
+    with SessionLocal() as db:
+        job_id = db.execute(
+            text("""
+                INSERT INTO simulation_jobs (status, params, num_total, deadline_at, owner, heartbeat_at)
+                VALUES ('queued', CAST(:params AS jsonb), :num_total, :deadline_at, :owner, :heartbeat_at)
+                RETURNING job_id
+            """),
+            {"params": json.dumps(params), "num_total": num_total, "deadline_at": _utc(deadline),
+             "owner": owner, "heartbeat_at": datetime.now(timezone.utc) if owner else None},
+        ).scalar()
+        db.commit()
+        return job_id
+
+
+def _heartbeat_jobs(owner: str, job_ids: List[int]) -> List[int]:
+    """
+    Uppfærir heartbeat_at á job sem þetta ferli keyrir. Skilar þeim sem það á
+    enn; job sem vantar hafa verið kláruð af öðru ferli (heartbeat var of gamalt).
+    """
+    if not job_ids:
+        return []
+    with SessionLocal() as db:
+        held = [
+            r[0] for r in db.execute(
+                text("""
+                    UPDATE simulation_jobs SET heartbeat_at = now()
+                    WHERE job_id = ANY(:ids) AND owner = :owner AND status IN ('queued', 'running')
+                    RETURNING job_id
+                """),
+                {"ids": list(job_ids), "owner": owner},
+            )
+        ]
+        db.commit()
+    return held
+
+
+def _update_job(job_id: int, **fields):
+    sets = ", ".join(
+        f"{name} = CAST(:{name} AS jsonb)" if name in JSON_FIELDS else f"{name} = :{name}"
+        for name in fields
+    )
+    with SessionLocal() as db:
+        db.execute(text(f"UPDATE simulation_jobs SET {sets} WHERE job_id = :job_id"), {**fields, "job_id": job_id})
+        db.commit()
+
+
+def get_job(job_id: int) -> Optional[dict]:
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                SELECT job_id, status, params, num_total, num_completed, num_failed,
+                       deadline_at, test_id, error, report, created_at, started_at, finished_at
+                FROM simulation_jobs
+                WHERE job_id = :job_id
+            """),
+            {"job_id": job_id},
+        ).mappings().first()
+        if row is None:
+            return None
+        job = dict(row)
+        job["run_ids"] = [
+            r[0] for r in db.execute(
+                text('SELECT id FROM "EmailTestRuns" WHERE job_id = :job_id ORDER BY id'),
+                {"job_id": job_id},
+            )
+        ]
+
+    for key in ("deadline_at", "created_at", "started_at", "finished_at"):
+        if job[key] is not None:
+            job[key] = job[key].isoformat()
+    return job
+
+
+def _test_attrs(params: dict) -> dict:
+    # Það sem þarf til að endurtaka test-ið (sjá TEST_REPLAY_COLUMNS)
+    return {
+        "seed": params.get("seed"),
+        "scenario_corpus": params.get("corpus"),
+        "stratify_by": ",".join(params.get("stratify_by") or []) or None,
+    }
+
+
+def _scenario_params(corpus: Optional[str], seed: Optional[int],
+                     stratify_by: Optional[List[str]], strata: str,
+                     company_weights: Optional[Dict[str, float]] = None) -> dict:
+    if company_weights and (any(w < 0 for w in company_weights.values()) or not any(company_weights.values())):
+        raise HTTPException(status_code=400, detail="company_weights must be >= 0 with at least one > 0")
+    return {
+        "corpus": corpus or DEFAULT_CORPUS,
+        "seed": new_seed() if seed is None else seed,
+        "stratify_by": list(stratify_by or []),
+        "strata": strata,
+        "company_weights": dict(company_weights or {}),
+    }
+
+
+def _company_kwargs(params: dict) -> dict:
+    # Fyrirtæki scenario-s án fyrirtækis eru dregin eftir company_weights (ef gefnar)
+    return {"company_weights": params.get("company_weights") or None}
+
+
+def _grading_params(grading: str, judge_sample_rate: float, prompt_version: Optional[str] = None) -> dict:
+    if grading not in GRADING_MODES:
+        raise HTTPException(status_code=400, detail=f"grading must be one of {', '.join(GRADING_MODES)}")
+    if not 0 <= judge_sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="judge_sample_rate must be between 0 and 1")
+    # Útgáfan er fest í params svo öll verk job-sins (líka í worker.py) noti sama sniðmát
+    prompt_version = get_template("reply", prompt_version).version
+    return {"grading": grading, "judge_sample_rate": judge_sample_rate, "prompt_version": prompt_version}
+
+
+def _grading_kwargs(params: dict) -> dict:
+    # Eldri job (fyrir grading="self" / prompt_version) hafa ekki þessa lykla
+    return {
+        "grading": params.get("grading", "judge"),
+        "judge_sample_rate": params.get("judge_sample_rate", 0.0),
+        "prompt_version": params.get("prompt_version"),
+    }
+
+
+async def _plan(params: dict, n: int) -> List[dict]:
+    # Öll scenarios dregin fyrirfram svo sama seed gefi sömu beiðnir í sömu röð
+    return await asyncio.to_thread(
+        sample_plan, params["corpus"], n, params["seed"], params["stratify_by"], params["strata"]
+    )
+
+
+def _run_rng(seed: int, i: int) -> random.Random:
+    # Sér RNG fyrir hverja beiðni svo val á fyrirtæki sé óháð röð þráða
+    return random.Random(f"{seed}:{i}")
+
+
+def _finalize(job_id: int, status: str, concurrency_level: int,
+              error: Optional[str] = None, report: Optional[dict] = None,
+              summarize: bool = True, report_key: str = "load_report",
+              test_attrs: Optional[dict] = None) -> Optional[dict]:
+    """
+    Býr til tests-row úr öllum keyrslum sem voru skráðar á job-ið (líka ef það
+    var stöðvað í miðjum klíðum) og merkir job-ið sem klárað.
+
+    summarize=False ef job-ið hefur þegar búið til sínar tests-raðir (model matrix).
+    """
+    summary = None
+    with SessionLocal() as db:
+        run_ids = [
+            r[0] for r in db.execute(
+                text('SELECT id FROM "EmailTestRuns" WHERE job_id = :job_id ORDER BY id'),
+                {"job_id": job_id},
+            )
+        ]
+        if run_ids and summarize:
+            summary = create_test_summary_from_run_ids(
+                db=db,
+                run_ids=run_ids,
+                concurrency_level=concurrency_level,
+                test_attrs=test_attrs,
+            )
+        elif run_ids or report is not None:
+            summary = {"status": "ok"}
+        if summary is not None:
+            if run_ids:
+                summary["run_ids"] = run_ids
+            if report is not None:
+                summary[report_key] = report
+
+    fields = dict(
+        status=status,
+        test_id=summary.get("test_id") if summary else None,
+        error=error,
+        finished_at=datetime.now(timezone.utc),
+    )
+    if report is not None:
+        fields["report"] = json.dumps(report)
+    _update_job(job_id, **fields)
+    return summary
+
+
+def finalize_queue_job(job_id: int) -> Optional[dict]:
+    """
+    Klárar job úr biðröðinni þegar öll verk þess eru búin. Sá worker sem lýkur
+    síðasta verkinu fær að gera það (task_queue.claim_finalize); hinir fá None.
+    """
+    claimed = task_queue.claim_finalize(job_id)
+    if claimed is None:
+        return None
+    params = claimed["params"]
+    if claimed["previous"] == "cancelling":
+        status = "cancelled"
+    elif claimed["deadline_hit"]:
+        status = "deadline_exceeded"
+    else:
+        status = "completed"
+    concurrency_level = params.get("concurrency_level", 1)
+    try:
+        if params.get("mode") == "matrix":
+            report = _summarize_matrix(
+                job_id, params["cells"], concurrency_level, params.get("min_grade"), _test_attrs(params)
+            )
+            return _finalize(job_id, status, concurrency_level, report=report,
+                             summarize=False, report_key="matrix")
+        if params.get("mode") == "reevaluate":
+            report = _reevaluation_report(job_id, params)
+            return _finalize(job_id, status, concurrency_level, report=report,
+                             summarize=False, report_key="reevaluation")
+        return _finalize(job_id, status, concurrency_level, test_attrs=_test_attrs(params))
+    except Exception as e:
+        print(f"Failed to finalize simulation job {job_id}: {e}")
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+        return None
+
+
+def _reevaluation_report(job_id: int, params: dict) -> dict:
+    # Workers skrifa einkunnir jafnóðum; samantektirnar eru reiknaðar einu sinni í lokin
+    refreshed = _refresh_summaries(reevaluation_service.affected_test_ids(params))
+    job = get_job(job_id)
+    return {
+        "graded": job["num_completed"],
+        "failed": job["num_failed"],
+        "tests_refreshed": refreshed,
+    }
+
+
+def queue_job_summary(job: dict) -> Optional[dict]:
+    # Sama form og _finalize skilar, lesið úr tests-röðinni sem worker bjó til
+    if job["test_id"] is None:
+        return None
+    with SessionLocal() as db:
+        row = db.execute(
+            text("SELECT * FROM tests WHERE test_id = :test_id"), {"test_id": job["test_id"]}
+        ).mappings().first()
+    if row is None:
+        return None
+    return {"status": "ok", **test_summary_to_dict(row), "run_ids": job["run_ids"]}
+
+
+def is_queue_job(job: Optional[dict]) -> bool:
+    if job is None:
+        return False
+    params = job["params"] if isinstance(job["params"], dict) else json.loads(job["params"] or "{}")
+    return params.get("backend") == "queue"
+
+
+def matrix_cells(models: List[str], temperatures: List[float], max_tokens_values: List[int]) -> List[dict]:
+    return [
+        {"model": m, "temperature": t, "max_tokens": n}
+        for m in models
+        for t in temperatures
+        for n in max_tokens_values
+    ]
+
+
+def _summarize_matrix(job_id: int, cells: List[dict], concurrency_level: int,
+                      min_grade: Optional[float] = None, test_attrs: Optional[dict] = None) -> dict:
+    """
+    Ein tests-röð fyrir hverja stillingu (cell) í model matrix job, og skýrsla
+    sem mælir með hraðasta cell sem nær min_grade.
+    """
+    results = []
+    with SessionLocal() as db:
+        for cell in cells:
+            run_ids = [
+                r[0] for r in db.execute(
+                    text("""
+                        SELECT id FROM "EmailTestRuns"
+                        WHERE job_id = :job_id AND model_name = :model
+                          AND temperature = :temperature AND max_tokens = :max_tokens
+                        ORDER BY id
+                    """),
+                    {"job_id": job_id, **cell},
+                )
+            ]
+            result = dict(cell, test_id=None, runs=len(run_ids))
+            if run_ids:
+                summary = create_test_summary_from_run_ids(db, run_ids, concurrency_level, test_attrs)
+                result.update(
+                    test_id=summary["test_id"],
+                    failures=summary["failure_count"],
+                    latency_p50_ms=summary["latency_ms"]["p50"],
+                    latency_p95_ms=summary["latency_ms"]["p95"],
+                    avg_reply_grade=summary["avg_reply_grade"],
+                    avg_prompt_tokens=summary["tokens"]["avg_prompt"],
+                    avg_completion_tokens=summary["tokens"]["avg_completion"],
+                    total_tokens=summary["tokens"]["total"],
+                )
+            results.append(result)
+
+    eligible = [
+        r for r in results
+        if r.get("latency_p50_ms") is not None
+        and (min_grade is None or (r.get("avg_reply_grade") or 0) >= min_grade)
+    ]
+    best = min(eligible, key=lambda r: r["latency_p50_ms"], default=None)
+    return {
+        "min_grade": min_grade,
+        "cells": results,
+        "recommended": {k: best[k] for k in ("model", "temperature", "max_tokens", "test_id")} if best else None,
+    }
+
+
+def _refresh_summaries(test_ids) -> List[int]:
+    refreshed = []
+    with SessionLocal() as db:
+        for test_id in sorted(test_ids):
+            if refresh_test_summary(db, test_id) is not None:
+                refreshed.append(test_id)
+    return refreshed
+
+
+def replay_source(test_id: int):
+    """
+    (params, cell) fyrir job-ið sem bjó til test_id. cell er stilling test-sins
+    ef það er eitt cell í model matrix, annars None.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                SELECT j.params, t.model_name, t.temperature, t.max_tokens, t.seed
+                FROM tests t
+                LEFT JOIN simulation_jobs j ON j.job_id = (
+                    SELECT job_id FROM "EmailTestRuns"
+                    WHERE test_id = t.test_id AND job_id IS NOT NULL
+                    LIMIT 1
+                )
+                WHERE t.test_id = :test_id
+            """),
+            {"test_id": test_id},
+        ).mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Test not found")
+    params = row["params"]
+    if isinstance(params, str):
+        params = json.loads(params)
+    if not params or row["seed"] is None or "corpus" not in params:
+        raise HTTPException(status_code=400, detail="Test was not run with a recorded seed and corpus, so it cannot be replayed")
+
+    cell = None
+    if params.get("mode") == "matrix":
+        cell = {"model": row["model_name"], "temperature": row["temperature"], "max_tokens": row["max_tokens"]}
+    return params, cell
+
+
+class _JobState:
+    def __init__(self, job_id: int, num_total: int, deadline: Optional[float]):
+        self.job_id = job_id
+        self.num_total = num_total
+        self.deadline = deadline
+        self.stop = threading.Event()          # lesið af worker þráðum
+        self.running = set()                   # Future fyrir hverja keyrslu í threadpool
+        self.cancel_requested = asyncio.Event()
+        # cancel() er líka kallað úr þráðum (sync endpoints, asyncio.to_thread)
+        self.loop = asyncio.get_running_loop()
+        self.completed = 0
+        self.failed = 0
+        self.subscribers = set()
+        self.task: Optional[asyncio.Task] = None
+        self.summary: Optional[dict] = None
+        self._last_progress_write = 0.0
+        self.orphaned = False                  # annað ferli tók job-ið (heartbeat rann út)
+
+    def publish(self, event: dict):
+        for q in list(self.subscribers):
+            q.put_nowait(event)
+
+    async def save_progress(self, force: bool = False):
+        # Í mesta lagi ein UPDATE á sekúndu, svo hátt álag drekki ekki grunninum
+        now = time.monotonic()
+        if not force and now - self._last_progress_write < PROGRESS_WRITE_INTERVAL:
+            return
+        self._last_progress_write = now
+        await asyncio.to_thread(
+            _update_job, self.job_id, num_completed=self.completed, num_failed=self.failed
+        )
+
+
+class JobManager:
+    """
+    Keyrir simulation jobs sem asyncio tasks í API ferlinu.
+
+    Staðan er vistuð í simulation_jobs jafnóðum og hver keyrsla er skrifuð í
+    EmailTestRuns um leið og hún klárast, svo ekkert tapast ef job er stöðvað.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[int, _JobState] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Heartbeat fær eigin þráð: sjálfgefni pool-inn (asyncio.to_thread) getur
+        # verið fullur undir álagi og heartbeat myndi þá dragast fram yfir JOB_STALE_SECONDS
+        self._heartbeat_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-heartbeat")
+
+    async def _register(self, params: dict, num_total: int, deadline: Optional[float], run) -> int:
+        job_id = await asyncio.to_thread(_insert_job, params, num_total, deadline, instance_id())
+        state = _JobState(job_id, num_total, deadline)
+        self._jobs[job_id] = state
+        state.task = asyncio.create_task(run(state))
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return job_id
+
+    async def _heartbeat_loop(self):
+        # Keyrir á meðan eitthvert job er í gangi í þessu ferli
+        while self._jobs:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            job_ids = list(self._jobs)
+            try:
+                held = set(await asyncio.get_running_loop().run_in_executor(
+                    self._heartbeat_executor, _heartbeat_jobs, instance_id(), job_ids
+                ))
+            except Exception as e:
+                print(f"Simulation job heartbeat failed: {e}")
+                continue
+            for job_id in job_ids:
+                state = self._jobs.get(job_id)
+                if state is None or job_id in held:
+                    continue
+                # Annað ferli hefur klárað job-ið; hættum án þess að búa til aðra tests-röð
+                print(f"Lost ownership of simulation job {job_id}; stopping it")
+                state.orphaned = True
+                state.stop.set()
+                state.cancel_requested.set()
+
+    async def start(
+        self,
+        to_email: str,
+        num_emails: int,
+        concurrency_level: int,
+        company_name: Optional[str] = None,
+        deadline_seconds: Optional[float] = None,
+        corpus: Optional[str] = None,
+        seed: Optional[int] = None,
+        stratify_by: Optional[List[str]] = None,
+        strata: str = "proportional",
+        grading: str = "judge",
+        judge_sample_rate: float = 0.0,
+        prompt_version: Optional[str] = None,
+        company_weights: Optional[Dict[str, float]] = None,
+    ) -> int:
+        """
+        Closed loop: num_emails hermanir, í mesta lagi concurrency_level í einu.
+
+        Scenarios eru dregin úr corpus með seed (nýtt seed ef ekkert er gefið),
+        og seed-ið er vistað í params og á tests-röðinni.
+        """
+        deadline = time.time() + deadline_seconds if deadline_seconds else None
+        params = {
+            "mode": "closed_loop",
+            "to": to_email,
+            "num_emails": num_emails,
+            "concurrency_level": concurrency_level,
+            "company_name": company_name,
+            "deadline_seconds": deadline_seconds,
+            **_scenario_params(corpus, seed, stratify_by, strata, company_weights),
+            **_grading_params(grading, judge_sample_rate, prompt_version),
+        }
+        plan = await _plan(params, num_emails)
+        if SIMULATION_BACKEND == "queue":
+            return await self._enqueue(params, plan, deadline)
+        return await self._register(
+            params,
+            num_emails,
+            deadline,
+            lambda state: self._run_closed_loop(state, to_email, plan, params),
+        )
+
+    async def _enqueue(self, params: dict, plan: List[Optional[dict]], deadline: Optional[float],
+                       payloads: Optional[List[dict]] = None, num_total: Optional[int] = None) -> int:
+        """
+        Job-ið er aðeins skráð og verkin sett í simulation_tasks; worker.py
+        keyrir þau og klárar job-ið (finalize_queue_job).
+
+        num_total: fjöldi keyrslna ef verk ná yfir fleiri en eina (endurmat).
+        """
+        params = {**params, "backend": "queue"}
+        num_total = len(plan) if num_total is None else num_total
+        job_id = await asyncio.to_thread(_insert_job, params, num_total, deadline)
+        try:
+            await asyncio.to_thread(task_queue.enqueue, job_id, plan, payloads)
+        except Exception as e:
+            await asyncio.to_thread(
+                _update_job, job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc)
+            )
+            raise HTTPException(status_code=500, detail=f"Could not enqueue simulation job {job_id}: {e}")
+        if not plan:
+            # Engin verk, svo enginn worker klárar job-ið (t.d. endurmat án keyrslna)
+            await asyncio.to_thread(finalize_queue_job, job_id)
+        return job_id
+
+    async def start_load_test(
+        self,
+        to_email: str,
+        schedule: str,
+        rps: float,
+        duration_s: float,
+        ramp_to_rps: Optional[float] = None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        company_name: Optional[str] = None,
+        seed: Optional[int] = None,
+        drain_seconds: float = 60.0,
+        corpus: Optional[str] = None,
+        stratify_by: Optional[List[str]] = None,
+        strata: str = "proportional",
+        grading: str = "judge",
+        judge_sample_rate: float = 0.0,
+        prompt_version: Optional[str] = None,
+        company_weights: Optional[Dict[str, float]] = None,
+    ) -> int:
+        """
+        Open loop: beiðnir byrja á fyrirfram ákveðnum tímum (schedule/rps),
+        óháð því hvort fyrri beiðnir eru búnar.
+
+        Alltaf keyrt í þessu ferli: biðröðin (poll, claim) myndi skekkja
+        komutímana sem verið er að mæla. Hafnað ef SIMULATION_BACKEND=queue.
+        """
+        if SIMULATION_BACKEND == "queue":
+            raise HTTPException(
+                status_code=409,
+                detail="Open-loop load tests run in the API process; "
+                       "use an instance with SIMULATION_BACKEND=inprocess",
+            )
+        scenario_params = _scenario_params(corpus, seed, stratify_by, strata, company_weights)
+        offsets = arrival_offsets(schedule, rps, duration_s, ramp_to_rps, random.Random(scenario_params["seed"]))
+        deadline = time.time() + duration_s + drain_seconds
+        params = {
+            "mode": "open_loop",
+            "to": to_email,
+            "schedule": schedule,
+            "rps": rps,
+            "ramp_to_rps": ramp_to_rps,
+            "duration_s": duration_s,
+            "max_in_flight": max_in_flight,
+            "company_name": company_name,
+            "concurrency_level": max_in_flight,
+            **scenario_params,
+            **_grading_params(grading, judge_sample_rate, prompt_version),
+        }
+        plan = await _plan(params, len(offsets))
+        return await self._register(
+            params,
+            len(offsets),
+            deadline,
+            lambda state: self._run_open_loop(state, to_email, company_name, offsets, plan, params),
+        )
+
+    async def start_matrix(
+        self,
+        to_email: str,
+        models: List[str],
+        temperatures: List[float],
+        max_tokens_values: List[int],
+        num_emails: int,
+        concurrency_level: int,
+        company_name: Optional[str] = None,
+        seed: Optional[int] = None,
+        min_grade: Optional[float] = None,
+        deadline_seconds: Optional[float] = None,
+        corpus: Optional[str] = None,
+        stratify_by: Optional[List[str]] = None,
+        strata: str = "proportional",
+        grading: str = "judge",
+        judge_sample_rate: float = 0.0,
+        prompt_version: Optional[str] = None,
+        company_weights: Optional[Dict[str, float]] = None,
+    ) -> int:
+        """
+        Model matrix: sömu num_emails beiðnir (sama fyrirtæki, scenario og seed)
+        keyrðar fyrir hverja samsetningu af model × temperature × max_tokens.
+        Ein stilling í einu svo þær keppi ekki hver við aðra um svartíma.
+        """
+        cells = matrix_cells(models, temperatures, max_tokens_values)
+        deadline = time.time() + deadline_seconds if deadline_seconds else None
+        params = {
+            "mode": "matrix",
+            "to": to_email,
+            "num_emails": num_emails,
+            "concurrency_level": concurrency_level,
+            "company_name": company_name,
+            "min_grade": min_grade,
+            "cells": cells,
+            "deadline_seconds": deadline_seconds,
+            **_scenario_params(corpus, seed, stratify_by, strata, company_weights),
+            **_grading_params(grading, judge_sample_rate, prompt_version),
+        }
+        plan = await _plan(params, num_emails)
+        if SIMULATION_BACKEND == "queue":
+            # Eitt verk per (cell, beiðni), cell fyrir cell: verk eru tekin í röð
+            # task_id og concurrency_level job-sins gildir, svo stillingar keppa
+            # aðeins hver við aðra um svartíma þar sem ein endar og næsta byrjar
+            return await self._enqueue(
+                params,
+                [plan[i] for _ in cells for i in range(num_emails)],
+                deadline,
+                payloads=[{"cell": cell, "index": i} for cell in cells for i in range(num_emails)],
+            )
+        return await self._register(
+            params,
+            len(cells) * num_emails,
+            deadline,
+            lambda state: self._run_matrix(state, to_email, company_name, cells, plan, params),
+        )
+
+    async def start_reevaluation(
+        self,
+        test_id: Optional[int] = None,
+        company: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        only_ungraded: bool = False,
+        concurrency_level: int = 4,
+        deadline_seconds: Optional[float] = None,
+        pregrade: bool = False,
+        pregrade_low: Optional[float] = None,
+        pregrade_high: Optional[float] = None,
+    ) -> int:
+        """
+        Endurmetur allar keyrslur sem passa við síurnar með LLM dómaranum,
+        concurrency_level í einu, og reiknar tests-raðirnar sem þær tilheyra aftur.
+
+        pregrade=True: hver síða er fyrst borin saman við ExpectedAnswers í einu
+        (app/pregrader.py). Aðeins keyrslur á milli pregrade_low og pregrade_high,
+        eða án ExpectedAnswer, fara til LLM dómarans (None = PREGRADE_LOW/HIGH).
+        """
+        # pregrader dregur inn numpy; aðeins sótt þegar endurmat er byrjað
+        from . import pregrader
+
+        pregrade_low = pregrader.PREGRADE_LOW if pregrade_low is None else pregrade_low
+        pregrade_high = pregrader.PREGRADE_HIGH if pregrade_high is None else pregrade_high
+        if pregrade and not 0 <= pregrade_low <= pregrade_high <= 1:
+            raise HTTPException(status_code=400, detail="pregrade bands must satisfy 0 <= low <= high <= 1")
+        deadline = time.time() + deadline_seconds if deadline_seconds else None
+        params = {
+            "mode": "reevaluate",
+            "test_id": test_id,
+            "company": company,
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "only_ungraded": only_ungraded,
+            "concurrency_level": concurrency_level,
+            "deadline_seconds": deadline_seconds,
+            "pregrade": pregrade,
+            "pregrade_low": pregrade_low,
+            "pregrade_high": pregrade_high,
+        }
+        if SIMULATION_BACKEND == "queue":
+            # Verk með allt að TASK_SIZE keyrslum; worker metur þau og skrifar einkunnirnar
+            run_ids = await asyncio.to_thread(reevaluation_service.select_run_ids, params)
+            size = reevaluation_service.TASK_SIZE
+            pages = [run_ids[i:i + size] for i in range(0, len(run_ids), size)]
+            return await self._enqueue(
+                params,
+                [None] * len(pages),
+                deadline,
+                payloads=[{"run_ids": page} for page in pages],
+                num_total=len(run_ids),
+            )
+        num_total = await asyncio.to_thread(reevaluation_service.count_runs, params)
+        return await self._register(
+            params,
+            num_total,
+            deadline,
+            lambda state: self._run_reevaluation(state, params),
+        )
+
+    async def _simulate(self, state: _JobState, to_email, company_name, executor: ThreadPoolExecutor,
+                        on_start=None, trace=None, **kwargs) -> bool:
+        """
+        Ein hermun í threadpool job-sins; uppfærir teljara og sendir event. Skilar
+        True ef tókst. on_start er kallað í þræðinum sjálfum, þegar keyrslan byrjar í raun.
+        """
+        trace = trace or RunTrace(job_id=state.job_id)
+        thread_wait = trace.start("thread_wait")
+
+        def work():
+            thread_wait.end()
+            if on_start is not None:
+                on_start()
+            return run_single_simulation(
+                to_email,
+                company_name,
+                job_id=state.job_id,
+                deadline=state.deadline,
+                stop_event=state.stop,
+                trace=trace,
+                **kwargs,
+            )
+
+        # Þráðurinn heldur áfram þótt task-inu sé hætt; _drain bíður eftir þessu.
+        # Ef task-inu er hætt áður en verkið byrjar er framtíðinni hætt líka
+        # (wrap_future), svo hún er strax done og _drain bíður ekki eftir henni.
+        finished = executor.submit(work)
+        state.running.add(finished)
+
+        try:
+            test_run, total_latency_ms, _ = await asyncio.wrap_future(finished)
+            state.running.discard(finished)
+            state.completed += 1
+            event = {
+                "type": "run",
+                "run_id": test_run.id,
+                "company_name": test_run.company_name,
+                "latency_ms": total_latency_ms,
+                "reply_grade": float(test_run.reply_grade) if test_run.reply_grade is not None else None,
+            }
+            ok = True
+        except Exception as e:
+            state.running.discard(finished)
+            state.failed += 1
+            event = {"type": "run_failed", "error": str(e)}
+            ok = False
+
+        event.update(completed=state.completed, failed=state.failed, total=state.num_total)
+        state.publish(event)
+        await state.save_progress()
+        return ok
+
+    async def _wait_for(self, state: _JobState, tasks) -> str:
+        """
+        Bíður eftir tasks þar til þau klárast, job er stöðvað eða deadline rennur út.
+        """
+        if not tasks:
+            return "cancelled" if state.cancel_requested.is_set() else "completed"
+
+        all_done = asyncio.gather(*tasks)
+        cancel_wait = asyncio.create_task(state.cancel_requested.wait())
+        timeout = max(0.0, state.deadline - time.time()) if state.deadline else None
+
+        await asyncio.wait({all_done, cancel_wait}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        cancel_wait.cancel()
+
+        if all_done.done():
+            return "cancelled" if state.cancel_requested.is_set() else "completed"
+
+        state.stop.set()
+        # Köll sem eru í gangi fá að klára (þau fá timeout á deadline);
+        # það sem ekki er byrjað hættir strax.
+        await asyncio.wait(tasks, timeout=STOP_GRACE_SECONDS)
+        await self._drain(state, tasks)
+        return "cancelled" if state.cancel_requested.is_set() else "deadline_exceeded"
+
+    async def _drain(self, state: _JobState, tasks):
+        """
+        Hættir við tasks og bíður eftir þráðunum sem þau ræstu. Að hætta við
+        task stöðvar ekki þráðinn, og keyrsla sem er skrifuð eftir _finalize
+        myndi vanta í tests-röð job-sins.
+        """
+        for t in tasks:
+            t.cancel()
+        pending = [f for f in state.running if not f.done()]
+        if not pending:
+            return
+        _, not_done = await asyncio.to_thread(wait_futures, pending, STOP_DRAIN_SECONDS)
+        if not_done:
+            print(f"Simulation job {state.job_id}: {len(not_done)} runs still running "
+                  f"after {STOP_DRAIN_SECONDS}s; they will not be in the summary")
+
+    async def _complete(self, state: _JobState, status: str, error: Optional[str],
+                        concurrency_level: int, report: Optional[dict] = None, **finalize_kwargs):
+        job_id = state.job_id
+        if state.orphaned:
+            state.publish({"type": "done", "status": "interrupted", "summary": None, "report": report})
+            self._jobs.pop(job_id, None)
+            return
+        await state.save_progress(force=True)
+        try:
+            state.summary = await asyncio.to_thread(
+                _finalize, job_id, status, concurrency_level, error, report, **finalize_kwargs
+            )
+        except Exception as e:
+            print(f"Failed to finalize simulation job {job_id}: {e}")
+            status = "failed"
+            await asyncio.to_thread(_update_job, job_id, status=status, error=str(e))
+
+        state.publish({"type": "done", "status": status, "summary": state.summary, "report": report})
+        self._jobs.pop(job_id, None)
+
+    async def _run_closed_loop(self, state: _JobState, to_email, plan, params):
+        await asyncio.to_thread(_update_job, state.job_id, status="running", started_at=datetime.now(timezone.utc))
+        concurrency_level = params["concurrency_level"]
+        semaphore = asyncio.Semaphore(concurrency_level)
+        # Eigin threadpool: í sjálfgefna pool-inum gætu verk beðið í röð á eftir
+        # öðrum job-um (og asyncio.to_thread) og ekki byrjað fyrr en eftir stop
+        executor = ThreadPoolExecutor(max_workers=concurrency_level, thread_name_prefix=f"sim-{state.job_id}")
+
+        async def run_one(i: int):
+            trace = RunTrace(job_id=state.job_id)
+            queue_wait = trace.start("queue_wait")
+            async with semaphore:
+                queue_wait.end()
+                if state.stop.is_set():
+                    return
+                await self._simulate(
+                    state,
+                    to_email,
+                    params["company_name"],
+                    executor,
+                    trace=trace,
+                    scenario=plan[i],
+                    rng=_run_rng(params["seed"], i),
+                    **_grading_kwargs(params),
+                    **_company_kwargs(params),
+                )
+
+        status, error = "completed", None
+        tasks = [asyncio.create_task(run_one(i)) for i in range(len(plan))]
+        try:
+            status = await self._wait_for(state, tasks)
+        except Exception as e:
+            status, error = "failed", str(e)
+            state.stop.set()
+            await self._drain(state, tasks)
+
+        executor.shutdown(wait=False)
+        await self._complete(state, status, error, concurrency_level, test_attrs=_test_attrs(params))
+
+    async def _run_open_loop(self, state: _JobState, to_email, company_name, offsets, plan, params):
+        await asyncio.to_thread(_update_job, state.job_id, status="running", started_at=datetime.now(timezone.utc))
+        in_flight = asyncio.Semaphore(params["max_in_flight"])
+        # Eigin threadpool svo sjálfgefni pool-inn (min(32, cpu+4)) takmarki ekki álagið
+        executor = ThreadPoolExecutor(max_workers=params["max_in_flight"], thread_name_prefix=f"load-{state.job_id}")
+        samples = []
+        t0 = time.monotonic()
+        wall_t0 = time.time()
+
+        async def fire(i: int, offset: float):
+            sample = {"scheduled": offset, "started": None, "finished": None, "ok": False}
+            samples.append(sample)
+
+            def mark_started():
+                sample["started"] = time.monotonic() - t0
+
+            trace = RunTrace(job_id=state.job_id, scheduled_offset_s=offset)
+            queue_wait = trace.start("queue_wait")
+            try:
+                async with in_flight:
+                    queue_wait.end()
+                    if state.stop.is_set():
+                        return
+                    sample["ok"] = await self._simulate(
+                        state,
+                        to_email,
+                        company_name,
+                        executor,
+                        on_start=mark_started,
+                        trace=trace,
+                        scheduled_at=_utc(wall_t0 + offset),
+                        scenario=plan[i],
+                        rng=_run_rng(params["seed"], i),
+                        **_grading_kwargs(params),
+                        **_company_kwargs(params),
+                    )
+            finally:
+                if sample["started"] is not None:
+                    sample["finished"] = time.monotonic() - t0
+
+        status, error = "completed", None
+        tasks = []
+        try:
+            for i, offset in enumerate(offsets):
+                delay = t0 + offset - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(state.cancel_requested.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                if state.stop.is_set():
+                    break
+                # Ekki beðið eftir fyrri beiðnum: það er það sem gerir þetta open loop
+                tasks.append(asyncio.create_task(fire(i, offset)))
+
+            status = await self._wait_for(state, tasks)
+        except Exception as e:
+            status, error = "failed", str(e)
+            state.stop.set()
+            await self._drain(state, tasks)
+
+        executor.shutdown(wait=False)
+        report = build_report(
+            samples,
+            params["schedule"],
+            params["rps"],
+            params["duration_s"],
+            params["ramp_to_rps"],
+        )
+        await self._complete(state, status, error, params["max_in_flight"], report,
+                             test_attrs=_test_attrs(params))
+
+    async def _run_matrix(self, state: _JobState, to_email, company_name, cells, plan, params):
+        await asyncio.to_thread(_update_job, state.job_id, status="running", started_at=datetime.now(timezone.utc))
+        concurrency_level = params["concurrency_level"]
+        semaphore = asyncio.Semaphore(concurrency_level)
+        seed = params["seed"]
+        executor = ThreadPoolExecutor(max_workers=concurrency_level, thread_name_prefix=f"matrix-{state.job_id}")
+
+        async def run_one(cell: dict, i: int):
+            trace = RunTrace(job_id=state.job_id, model=cell["model"])
+            queue_wait = trace.start("queue_wait")
+            async with semaphore:
+                queue_wait.end()
+                if state.stop.is_set():
+                    return
+                await self._simulate(
+                    state,
+                    to_email,
+                    company_name,
+                    executor,
+                    trace=trace,
+                    model=cell["model"],
+                    temperature=cell["temperature"],
+                    max_tokens=cell["max_tokens"],
+                    # Beiðni i fær sama fyrirtæki, scenario og seed í öllum cells
+                    llm_seed=seed + i,
+                    rng=_run_rng(seed, i),
+                    scenario=plan[i],
+                    **_grading_kwargs(params),
+                    **_company_kwargs(params),
+                )
+
+        status, error = "completed", None
+        tasks = []
+        try:
+            for cell in cells:
+                state.publish({"type": "cell", **cell})
+                tasks = [asyncio.create_task(run_one(cell, i)) for i in range(params["num_emails"])]
+                status = await self._wait_for(state, tasks)
+                if status != "completed":
+                    break
+        except Exception as e:
+            status, error = "failed", str(e)
+            state.stop.set()
+            await self._drain(state, tasks)
+
+        executor.shutdown(wait=False)
+
+        report = None
+        try:
+            report = await asyncio.to_thread(
+                _summarize_matrix, state.job_id, cells, concurrency_level, params["min_grade"], _test_attrs(params)
+            )
+        except Exception as e:
+            status, error = "failed", error or f"matrix summary failed: {e}"
+
+        await self._complete(state, status, error, concurrency_level, report,
+                             summarize=False, report_key="matrix")
+
+    async def _run_reevaluation(self, state: _JobState, params: dict):
+        from . import pregrader
+
+        await asyncio.to_thread(_update_job, state.job_id, status="running", started_at=datetime.now(timezone.utc))
+        concurrency_level = params["concurrency_level"]
+        executor = ThreadPoolExecutor(max_workers=concurrency_level, thread_name_prefix=f"reeval-{state.job_id}")
+        semaphore = asyncio.Semaphore(concurrency_level)
+        loop = asyncio.get_running_loop()
+        t0 = time.monotonic()
+
+        pending = []            # write_grades tuples sem á eftir að skrifa
+        last_write = t0
+        test_ids = set()
+        grade_sum = {"before": 0.0, "before_n": 0, "after": 0.0}
+        by_source = {"reference": 0, "llm": 0}
+
+        async def write_pending(force: bool = False):
+            nonlocal pending, last_write
+            due = len(pending) >= reevaluation_service.WRITE_BATCH_SIZE or \
+                time.monotonic() - last_write >= reevaluation_service.WRITE_MAX_DELAY_S
+            if not pending or not (force or due):
+                return
+            batch, pending = pending, []
+            last_write = time.monotonic()
+            await asyncio.to_thread(reevaluation_service.write_grades, batch)
+
+        def throughput() -> float:
+            elapsed = time.monotonic() - t0
+            return state.completed / elapsed if elapsed > 0 else 0.0
+
+        def record(row, grade, latency_ms, source, score, usage=None) -> dict:
+            usage = usage or {}
+            pending.append((
+                row.id, grade, latency_ms, source, score,
+                usage.get("prompt_tokens"), usage.get("cached_tokens"),
+            ))
+            if row.test_id is not None:
+                test_ids.add(row.test_id)
+            if row.reply_grade is not None:
+                grade_sum["before"] += float(row.reply_grade)
+                grade_sum["before_n"] += 1
+            grade_sum["after"] += grade
+            by_source[source] += 1
+            state.completed += 1
+            return {
+                "type": "graded",
+                "run_id": row.id,
+                "old_grade": float(row.reply_grade) if row.reply_grade is not None else None,
+                "reply_grade": grade,
+                "grade_source": source,
+            }
+
+        async def publish(event):
+            event.update(
+                completed=state.completed,
+                failed=state.failed,
+                total=state.num_total,
+                throughput_rps=round(throughput(), 3),
+            )
+            state.publish(event)
+            await write_pending()
+            await state.save_progress()
+
+        async def grade_one(row, score):
+            try:
+                if state.stop.is_set():
+                    return
+                grade, latency_ms, usage = await loop.run_in_executor(
+                    executor,
+                    lambda: evaluate_with_openai_rubric(
+                        company_name=row.company_name,
+                        scenario=row.scenario,
+                        input_email=row.input_email,
+                        generated_body=row.generated_body,
+                        timeout=_remaining(state.deadline),
+                    ),
+                )
+                event = record(row, grade, latency_ms, "llm", score, usage)
+            except Exception as e:
+                state.failed += 1
+                event = {"type": "grade_failed", "run_id": row.id, "error": str(e)}
+            finally:
+                semaphore.release()
+            await publish(event)
+
+        status, error = "completed", None
+        tasks = []
+        try:
+            after_id = 0
+            while not state.stop.is_set():
+                rows = await asyncio.to_thread(reevaluation_service.select_runs_page, params, after_id)
+                if not rows:
+                    break
+                decisions = {}
+                if params.get("pregrade"):
+                    # Öll síðan í einu; numpy vinnan fer ekki á event loop-ið
+                    decisions = await asyncio.to_thread(
+                        pregrader.pregrade, rows, params["pregrade_low"], params["pregrade_high"]
+                    )
+                for row in rows:
+                    grade, score = decisions.get(row.id, (None, None))
+                    if grade is not None:
+                        await publish(record(row, grade, None, "reference", score))
+                        continue
+                    await semaphore.acquire()
+                    if state.stop.is_set() or (state.deadline and time.time() >= state.deadline):
+                        semaphore.release()
+                        break
+                    tasks.append(asyncio.create_task(grade_one(row, score)))
+                after_id = rows[-1].id
+                # Kláruð tasks þurfa ekki að lifa; heldur minninu í O(concurrency + síða)
+                tasks = [t for t in tasks if not t.done()]
+                if state.deadline and time.time() >= state.deadline:
+                    break
+
+            status = await self._wait_for(state, tasks)
+            if status == "completed" and state.deadline and time.time() >= state.deadline:
+                status = "deadline_exceeded"
+        except Exception as e:
+            status, error = "failed", str(e)
+            state.stop.set()
+            for t in tasks:
+                t.cancel()
+
+        report = None
+        try:
+            await write_pending(force=True)
+            refreshed = await asyncio.to_thread(_refresh_summaries, test_ids)
+            elapsed = time.monotonic() - t0
+            report = {
+                "graded": state.completed,
+                "failed": state.failed,
+                "elapsed_s": round(elapsed, 3),
+                "throughput_rps": round(state.completed / elapsed, 3) if elapsed > 0 else None,
+                "avg_grade_before": grade_sum["before"] / grade_sum["before_n"] if grade_sum["before_n"] else None,
+                "avg_grade_after": grade_sum["after"] / state.completed if state.completed else None,
+                "graded_by_reference": by_source["reference"],
+                "graded_by_llm": by_source["llm"],
+                "tests_refreshed": refreshed,
+            }
+        except Exception as e:
+            status, error = "failed", error or f"writing grades failed: {e}"
+        finally:
+            executor.shutdown(wait=False)
+
+        await self._complete(state, status, error, concurrency_level, report,
+                             summarize=False, report_key="reevaluation")
+
+    async def replay(self, params: dict, cell: Optional[dict] = None) -> int:
+        """
+        Nýtt job með sömu params (corpus, seed, stratify, álag) og upprunalega job-ið.
+        cell: keyra bara eina stillingu úr model matrix.
+        """
+        scenario = dict(
+            corpus=params["corpus"],
+            seed=params["seed"],
+            stratify_by=params.get("stratify_by"),
+            strata=params.get("strata", "proportional"),
+            company_weights=params.get("company_weights"),
+            **_grading_kwargs(params),
+        )
+        mode = params.get("mode")
+        if mode == "closed_loop":
+            return await self.start(
+                params["to"], params["num_emails"], params["concurrency_level"],
+                params.get("company_name"), params.get("deadline_seconds"), **scenario,
+            )
+        if mode == "open_loop":
+            return await self.start_load_test(
+                params["to"], params["schedule"], params["rps"], params["duration_s"],
+                params.get("ramp_to_rps"), params["max_in_flight"], params.get("company_name"), **scenario,
+            )
+        if mode == "matrix":
+            cells = [cell] if cell else params["cells"]
+            return await self.start_matrix(
+                params["to"],
+                models=list(dict.fromkeys(c["model"] for c in cells)),
+                temperatures=list(dict.fromkeys(c["temperature"] for c in cells)),
+                max_tokens_values=list(dict.fromkeys(c["max_tokens"] for c in cells)),
+                num_emails=params["num_emails"],
+                concurrency_level=params["concurrency_level"],
+                company_name=params.get("company_name"),
+                min_grade=params.get("min_grade"),
+                deadline_seconds=params.get("deadline_seconds"),
+                **scenario,
+            )
+        raise HTTPException(status_code=400, detail=f"Cannot replay job mode {mode!r}")
+
+    def cancel(self, job_id: int) -> bool:
+        state = self._jobs.get(job_id)
+        if state is None:
+            # Job sem worker keyrir er stöðvað í gegnum biðröðina. Ef ekkert verk
+            # er í gangi klárar enginn worker það, svo það er gert hér.
+            if not task_queue.cancel_job(job_id):
+                return False
+            finalize_queue_job(job_id)
+            return True
+        state.stop.set()
+        state.loop.call_soon_threadsafe(state.cancel_requested.set)
+        return True
+
+    async def wait(self, job_id: int) -> Optional[dict]:
+        """
+        Bíður eftir að job klárist og skilar samantektinni (eða None).
+        """
+        state = self._jobs.get(job_id)
+        if state is None:
+            return await self._wait_queued(job_id)
+        await asyncio.shield(state.task)
+        return state.summary
+
+    async def _wait_queued(self, job_id: int) -> Optional[dict]:
+        while True:
+            job = await asyncio.to_thread(get_job, job_id)
+            if not is_queue_job(job):
+                return None
+            if job["status"] in TERMINAL_STATUSES:
+                return await asyncio.to_thread(queue_job_summary, job)
+            await asyncio.sleep(QUEUE_POLL_INTERVAL)
+
+    def subscribe(self, job_id: int) -> Optional[asyncio.Queue]:
+        state = self._jobs.get(job_id)
+        if state is None:
+            return None
+        q = asyncio.Queue()
+        state.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, job_id: int, q: asyncio.Queue):
+        state = self._jobs.get(job_id)
+        if state is not None:
+            state.subscribers.discard(q)
+
+
+def recover_interrupted_jobs() -> List[int]:
+    """
+    Job sem voru í gangi þegar ferlið sem keyrði þau dó eru kláruð með því sem
+    var vistað. Job í biðröðinni eru ekki snert; workers halda áfram með þau.
+
+    Aðeins job þar sem heartbeat er eldra en JOB_STALE_SECONDS: önnur eintök
+    af API-inu (autoscaling, --workers N, rolling restart) gætu enn verið að
+    keyra þau. Job sem þetta ferli á sjálft eru aldrei tekin, jafnvel þótt
+    heartbeat hafi dregist. Job-ið er fyrst tekið yfir (owner + heartbeat) í
+    einni UPDATE, svo tvö ferli geta ekki bæði klárað það. Skilar job_id sem voru kláruð.
+    """
+    with SessionLocal() as db:
+        rows = db.execute(
+            text("""
+                UPDATE simulation_jobs
+                SET owner = :owner, heartbeat_at = now()
+                WHERE status IN ('queued', 'running')
+                  AND COALESCE(params->>'backend', '') <> 'queue'
+                  AND owner IS DISTINCT FROM :owner
+                  AND COALESCE(heartbeat_at, started_at, created_at) < now() - make_interval(secs => :stale)
+                RETURNING job_id, params
+            """),
+            {"owner": instance_id(), "stale": JOB_STALE_SECONDS},
+        ).fetchall()
+        db.commit()
+
+    recovered = []
+    for job_id, params in rows:
+        params = params if isinstance(params, dict) else json.loads(params or "{}")
+        recovered.append(job_id)
+        concurrency_level = params.get("concurrency_level", 1)
+        try:
+            if params.get("mode") == "reevaluate":
+                # Einkunnir sem voru skrifaðar eiga að sjást í samantektunum
+                _refresh_summaries(reevaluation_service.affected_test_ids(params))
+                _finalize(job_id, "interrupted", concurrency_level, summarize=False)
+                continue
+            if params.get("mode") == "matrix":
+                report = _summarize_matrix(
+                    job_id, params["cells"], concurrency_level, params.get("min_grade"), _test_attrs(params)
+                )
+                _finalize(job_id, "interrupted", concurrency_level, report=report,
+                          summarize=False, report_key="matrix")
+                continue
+            _finalize(job_id, "interrupted", concurrency_level, test_attrs=_test_attrs(params))
+        except Exception as e:
+            print(f"Failed to recover simulation job {job_id}: {e}")
+    return recovered
+
+
+async def recovery_loop():
+    """
+    Keyrir recover_interrupted_jobs reglulega í hverju API ferli: job ferlis
+    sem dó verða ekki gömul fyrr en JOB_STALE_SECONDS eftir síðasta heartbeat,
+    og þá er ekki víst að neitt ferli sé að ræsa sig.
+    """
+    while True:
+        try:
+            recovered = await asyncio.to_thread(recover_interrupted_jobs)
+            if recovered:
+                print(f"Recovered interrupted simulation jobs: {recovered}")
+        except Exception as e:
+            print(f"Could not recover simulation jobs: {e}")
+        await asyncio.sleep(JOB_STALE_SECONDS / 2)
+
+
+job_manager = JobManager()
@@ -1,41 +1,103 @@
 # app/llm_service.py
 import os, time, re, json
-from openai import OpenAI
+from functools import lru_cache
 from fastapi import HTTPException
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-MODEL_NAME = "gpt-4.1-mini"
-
-def generate_reply_with_openai(company_name: str, input_email: str):
-    """
-    Skilar (subject, body, model_name, llm_latency_ms)
-    """
-    if not client.api_key:
+from .env import load_env
+from .metrics import LLM_LATENCY, timed
+from .prompts import get_template
+
+load_env()
+# Sjálfgefið líkan; model matrix prófanir (job_service.start_matrix) senda model inn beint
+MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+# Dómarinn er fastur óháð því hvaða líkan býr til svarið, svo einkunnir séu sambærilegar
+JUDGE_MODEL_NAME = os.getenv("OPENAI_JUDGE_MODEL", MODEL_NAME)
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_MAX_TOKENS = 600
+
+# Structured output: svar og sjálfsmat í einu kalli
+REPLY_WITH_GRADE_SCHEMA = {
+    "name": "reply_with_self_grade",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "subject": {"type": "string"},
+            "body": {"type": "string"},
+            "self_grade": {"type": "number", "description": "Score from 1 to 10 for the reply in body"},
+        },
+        "required": ["subject", "body", "self_grade"],
+        "additionalProperties": False,
+    },
+}
+
+@lru_cache(maxsize=None)
+def get_client():
+    # openai pakkinn tekur um hálfa sekúndu í import, svo hann og client-inn eru
+    # búnir til við fyrstu notkun en ekki þegar API ferlið ræsir (sjá lifespan í main.py)
+    from openai import OpenAI
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
+    return OpenAI(api_key=api_key)
+
 
-    prompt = f"""
-You are a representative of the company "{company_name}".
+def _client_for(timeout):
+    # timeout (sek.) er notað til að stöðva köll sem myndu fara fram yfir deadline
+    client = get_client()
+    return client.with_options(timeout=timeout) if timeout else client
 
-You received the following email from a customer:
 
-{input_email}
+def _usage(resp, template) -> dict:
+    usage = getattr(resp, "usage", None)
+    # cached_tokens: sá hluti prompt_tokens sem kom úr prompt cache hjá OpenAI
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "cached_tokens": getattr(details, "cached_tokens", None),
+        "prompt_version": template.version,
+    }
 
-1) First, infer an appropriate email subject line.
-2) Then, write a professional, friendly email reply.
 
-Return your result in JSON with the fields:
-- subject
-- body
-"""
+def _create(template, timeout, **kwargs):
+    # prompt_cache_key hópar köll með sama forskeyti á sama cache hjá OpenAI
+    return _client_for(timeout).chat.completions.create(prompt_cache_key=template.key, **kwargs)
+
+
+def generate_reply_with_openai(company_name: str, input_email: str, timeout: float = None,
+                               model: str = None, temperature: float = None,
+                               max_tokens: int = None, seed: int = None,
+                               prompt_version: str = None):
+    """
+    Skilar (subject, body, model_name, llm_latency_ms, usage) þar sem usage er
+    {"prompt_tokens", "completion_tokens", "cached_tokens", "prompt_version"}.
+
+    seed er sent áfram til OpenAI (best effort endurtekningarhæfni).
+    prompt_version velur sniðmát í app/prompts.py (sjálfgefið PROMPT_VERSION).
+    """
+    model = model or MODEL_NAME
+    temperature = DEFAULT_TEMPERATURE if temperature is None else temperature
+    max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
+
+    template = get_template("reply", prompt_version)
+    messages = template.render(company_name=company_name, input_email=input_email)
 
     t0 = time.time()
-    resp = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0.7,
-        max_tokens=600,
-    )
+    extra = {"seed": seed} if seed is not None else {}
+    with timed(LLM_LATENCY, operation="generate", model=model):
+        resp = _create(
+            template,
+            timeout,
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **extra,
+        )
     llm_latency_ms = int((time.time() - t0) * 1000)
 
     content = resp.choices[0].message.content
@@ -46,52 +108,87 @@ Return your result in JSON with the fields:
     if not body:
         raise HTTPException(status_code=500, detail="LLM did not return a body")
 
-    return subject, body, MODEL_NAME, llm_latency_ms
+    return subject, body, model, llm_latency_ms, _usage(resp, template)
 
 
-def evaluate_with_openai_rubric(company_name: str, scenario: str,
-                                input_email: str, generated_body: str):
+def generate_and_grade_with_openai(company_name: str, scenario: str, input_email: str,
+                                   timeout: float = None, model: str = None,
+                                   temperature: float = None, max_tokens: int = None,
+                                   seed: int = None, prompt_version: str = None):
     """
-    LLM-dómari. Skilar (grade_float, latency_ms) 1–10.
-    """
-    start = time.time()
+    Eitt kall í stað generate + dómara: líkanið skrifar svarið og metur það
+    sjálft eftir sömu viðmiðum og evaluate_with_openai_rubric.
 
-    prompt = f"""
-You are a strict reviewer grading an automatic customer support email reply.
+    Skilar (subject, body, self_grade, model_name, llm_latency_ms, usage);
+    self_grade er None ef líkanið skilaði ekki nothæfu mati.
+    Sjálfsmatið er ekki jafn áreiðanlegt og óháður dómari; sjá judge_sample_rate
+    í run_single_simulation.
+    """
+    model = model or MODEL_NAME
+    temperature = DEFAULT_TEMPERATURE if temperature is None else temperature
+    max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
 
-COMPANY:
---------
-{company_name}
+    template = get_template("reply_with_grade", prompt_version)
+    messages = template.render(company_name=company_name, scenario=scenario, input_email=input_email)
 
-SCENARIO:
----------
-{scenario}
+    t0 = time.time()
+    extra = {"seed": seed} if seed is not None else {}
+    with timed(LLM_LATENCY, operation="generate_and_grade", model=model):
+        resp = _create(
+            template,
+            timeout,
+            model=model,
+            messages=messages,
+            response_format={"type": "json_schema", "json_schema": REPLY_WITH_GRADE_SCHEMA},
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **extra,
+        )
+    llm_latency_ms = int((time.time() - t0) * 1000)
 
-CUSTOMER EMAIL:
----------------
-{input_email}
+    parsed = json.loads(resp.choices[0].message.content)
+    subject = (parsed.get("subject") or "").strip()
+    body = (parsed.get("body") or "").strip()
+    if not body:
+        raise HTTPException(status_code=500, detail="LLM did not return a body")
+    # Svarið sjálft er nothæft þó sjálfsmatið vanti; þá fer það til dómarans
+    try:
+        self_grade = max(1.0, min(10.0, float(parsed["self_grade"])))
+    except (KeyError, TypeError, ValueError):
+        self_grade = None
 
-MODEL-GENERATED REPLY:
-----------------------
-{generated_body}
+    return subject, body, self_grade, model, llm_latency_ms, _usage(resp, template)
 
-TASK:
-Give a single numeric score from 1 to 10 indicating how good this reply is in terms of:
-- correctness and factual accuracy
-- helpfulness and clarity
-- tone and professionalism
-- whether it fully answers the customer’s request/complaint
 
-Respond ONLY with the number, for example: 7.5
-"""
+def evaluate_with_openai_rubric(company_name: str, scenario: str,
+                                input_email: str, generated_body: str,
+                                timeout: float = None, prompt_version: str = None):
+    """
+    LLM-dómari. Skilar (grade_float, latency_ms, usage), einkunn 1–10; usage
+    eins og í generate_reply_with_openai.
+    """
+    start = time.time()
 
-    resp = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=10,
-        temperature=0.0,
+    template = get_template("grade", prompt_version)
+    messages = template.render(
+        company_name=company_name,
+        scenario=scenario,
+        input_email=input_email,
+        generated_body=generated_body,
     )
 
+    with timed(LLM_LATENCY, operation="grade", model=JUDGE_MODEL_NAME):
+        resp = _create(
+            template,
+            timeout,
+            model=JUDGE_MODEL_NAME,
+            messages=messages,
+            max_tokens=10,
+            temperature=0.0,
+        )
+
     latency_ms = int((time.time() - start) * 1000)
     text = resp.choices[0].message.content.strip()
 
@@ -102,4 +199,4 @@ Respond ONLY with the number, for example: 7.5
     grade = float(m.group(1))
     grade = max(1.0, min(10.0, grade))
 
-    return grade, latency_ms
+    return grade, latency_ms, _usage(resp, template)
@@ -0,0 +1,171 @@
+# app/load_generator.py
+import math
+import random
+from typing import Dict, List, Optional
+
+SCHEDULES = ("constant", "poisson", "ramp")
+
+# Gluggi telst mettaður þegar miðgildi biðtíma eftir að byrja fer yfir þetta
+# hlutfall af miðgildi service time, þ.e. biðröðin er farin að vaxa
+SATURATION_LAG_TO_SERVICE_RATIO = 0.25
+
+
+def arrival_offsets(
+    schedule: str,
+    rps: float,
+    duration_s: float,
+    ramp_to_rps: Optional[float] = None,
+    rng: Optional[random.Random] = None,
+) -> List[float]:
+    """
+    Sekúndur frá upphafi þar sem hver beiðni á að byrja (open loop).
+
+    constant: jafnt bil 1/rps
+    poisson:  veldisdreifð bil með meðaltal 1/rps
+    ramp:     álag eykst línulega frá rps upp í ramp_to_rps yfir duration_s
+    """
+    if rps <= 0 or duration_s <= 0:
+        raise ValueError("rps and duration_s must be > 0")
+    rng = rng or random.Random()
+
+    if schedule == "constant":
+        return [i / rps for i in range(int(math.floor(rps * duration_s)))]
+
+    if schedule == "poisson":
+        offsets, t = [], 0.0
+        while True:
+            t += rng.expovariate(rps)
+            if t >= duration_s:
+                return offsets
+            offsets.append(t)
+
+    if schedule == "ramp":
+        r0 = rps
+        r1 = ramp_to_rps if ramp_to_rps is not None else rps
+        if r1 <= 0:
+            raise ValueError("ramp_to_rps must be > 0")
+        # Fjöldi beiðna fram að t er Λ(t) = r0 t + (r1 - r0) t² / (2D);
+        # k-ta beiðnin byrjar þar sem Λ(t) = k.
+        slope = (r1 - r0) / duration_s
+        total = int(math.floor(r0 * duration_s + slope * duration_s ** 2 / 2))
+        offsets = []
+        for k in range(total):
+            if abs(slope) < 1e-12:
+                offsets.append(k / r0)
+            else:
+                offsets.append((-r0 + math.sqrt(r0 * r0 + 2 * slope * k)) / slope)
+        return offsets
+
+    raise ValueError(f"schedule must be one of {', '.join(SCHEDULES)}")
+
+
+def offered_rps_at(schedule: str, rps: float, duration_s: float, t: float,
+                   ramp_to_rps: Optional[float] = None) -> float:
+    if schedule == "ramp" and ramp_to_rps is not None:
+        return rps + (ramp_to_rps - rps) * min(max(t / duration_s, 0.0), 1.0)
+    return rps
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """
+    Línuleg brúun eins og percentile_cont í Postgres.
+    """
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p
+    lo = math.floor(k)
+    hi = math.ceil(k)
+    if lo == hi:
+        return sorted_values[lo]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None,
+    }
+
+
+def build_report(
+    samples: List[dict],
+    schedule: str,
+    rps: float,
+    duration_s: float,
+    ramp_to_rps: Optional[float] = None,
+    window_s: Optional[float] = None,
+) -> dict:
+    """
+    samples: {"scheduled": s, "started": s, "finished": s, "ok": bool} þar sem
+    tímarnir eru sekúndur frá upphafi prófsins.
+
+    Svartími er mældur frá áætluðum upphafstíma (scheduled), ekki raunverulegum,
+    svo bið eftir lausum þræði telst með (coordinated omission). service_ms er
+    tíminn frá því keyrslan byrjaði í raun.
+    """
+    # Sjálfgefið ~20 gluggar, en aldrei styttri en 1 sek.
+    window_s = window_s or max(1.0, duration_s / 20)
+    done = [s for s in samples if s.get("finished") is not None]
+    ok = [s for s in done if s["ok"]]
+
+    response_ms = [(s["finished"] - s["scheduled"]) * 1000 for s in ok]
+    service_ms = [(s["finished"] - s["started"]) * 1000 for s in ok]
+    start_lag_ms = [(s["started"] - s["scheduled"]) * 1000 for s in samples if s.get("started") is not None]
+
+    elapsed = max([s["finished"] for s in done], default=0.0)
+    windows = []
+    n_windows = max(1, int(math.ceil(duration_s / window_s)))
+    for w in range(n_windows):
+        lo, hi = w * window_s, min((w + 1) * window_s, duration_s)
+        span = hi - lo
+        if span <= 0:
+            continue
+        scheduled = [s for s in samples if lo <= s["scheduled"] < hi]
+        completed = [s for s in ok if lo <= s["finished"] < hi]
+        resp = sorted((s["finished"] - s["scheduled"]) * 1000 for s in scheduled if s["ok"] and s.get("finished") is not None)
+        lag = sorted((s["started"] - s["scheduled"]) * 1000 for s in scheduled if s.get("started") is not None)
+        windows.append({
+            "start_s": lo,
+            "offered_rps": offered_rps_at(schedule, rps, duration_s, (lo + hi) / 2, ramp_to_rps),
+            "scheduled_rps": len(scheduled) / span,
+            "achieved_rps": len(completed) / span,
+            "response_p50_ms": percentile(resp, 0.50),
+            "response_p95_ms": percentile(resp, 0.95),
+            "start_lag_p50_ms": percentile(lag, 0.50),
+        })
+
+    # Mettun: fyrsti gluggi þar sem biðröðin er farin að vaxa
+    service = _summary(service_ms)
+    saturation = None
+    if service["p50"]:
+        for win in windows:
+            if win["start_lag_p50_ms"] is not None and \
+                    win["start_lag_p50_ms"] > SATURATION_LAG_TO_SERVICE_RATIO * service["p50"]:
+                saturation = {
+                    "at_s": win["start_s"],
+                    "offered_rps": win["offered_rps"],
+                    "achieved_rps": win["achieved_rps"],
+                }
+                break
+
+    return {
+        "schedule": schedule,
+        "target_rps": rps,
+        "ramp_to_rps": ramp_to_rps,
+        "duration_s": duration_s,
+        "scheduled": len(samples),
+        "completed": len(ok),
+        "failed": len(done) - len(ok),
+        "not_finished": len(samples) - len(done),
+        "offered_rps": len(samples) / duration_s,
+        "achieved_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "response_ms": _summary(response_ms),
+        "service_ms": service,
+        "start_lag_ms": _summary(start_lag_ms),
+        "saturation": saturation,
+        "windows": windows,
+    }
@@ -1,28 +1,108 @@
-from fastapi import FastAPI, Query, Depends, HTTPException, Body
+from fastapi import FastAPI, Query, Depends, HTTPException, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+import asyncio
 import json
 import random  
 import os
 
 from app.scraper import scrape_company
-from app.database import SessionLocal, engine
-from .models import Company, EmailSent, Base, EmailTestRun
+from .company_service import upsert_company, upsert_companies
+from .company_cache import COMPANY_FIELDS, company_catalog
+from .pagination import NEXT_CURSOR_HEADER, decode_cursor, page_with_cursor
+from .export_service import EXPORT_FORMATS, build_export_query, iter_export, iter_rows
+from app.database import SessionLocal, get_engine
+from .models import Company, EmailSent, Base, EmailTestRun, ExpectedAnswer
 from .email_service import get_email_service
-from .llm_service import generate_reply_with_openai, evaluate_with_openai_rubric
-from .simulation_service import run_single_simulation, create_test_summary_from_run_ids
+from .llm_service import (
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_TEMPERATURE,
+    generate_reply_with_openai,
+    evaluate_with_openai_rubric,
+    get_client,
+)
+from .simulation_service import (
+    run_single_simulation,
+    create_test_summary_from_run_ids,
+    test_summary_to_dict,
+    TEST_METRIC_COLUMNS,
+    TEST_SUMMARY_FIELDS,
+)
+from .run_writer import run_writer
+from .job_service import (
+    DEFAULT_MAX_IN_FLIGHT,
+    QUEUE_POLL_INTERVAL,
+    TERMINAL_STATUSES,
+    queue_job_summary,
+    get_job,
+    is_queue_job,
+    job_manager,
+    recovery_loop,
+    replay_source,
+)
+from .load_generator import SCHEDULES
+from .compare_service import DEFAULT_ALPHA, compare_tests
+from .scenario_store import scenario_interner
+from .partitions import ensure_partitions
+from .rollup_service import query_rollups
+from .metrics import PrometheusMiddleware, register_db_pool, render_latest
+from .responses import FastJSONResponse, parse_fields, pick_fields
+from .compression import CompressionMiddleware
 
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-#  Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+def prepare_database():
+    """
+    Allt sem ræsing þarf frá grunninum, keyrt í bakgrunni eftir að ferlið er
+    tilbúið. Hvert skref má mistakast (t.d. grunnur ekki kominn upp) án þess
+    að ferlið deyi; beiðnir fá þá villu frá grunninum eins og venjulega.
+    """
+    try:
+        #  Create tables if they don't exist
+        Base.metadata.create_all(bind=get_engine())
+    except Exception as e:
+        print(f"Could not create tables: {e}")
+    try:
+        # Næstu mánuðir þurfa partition áður en fyrsta röðin lendir í þeim (sjá partitions.py)
+        ensure_partitions()
+    except Exception as e:
+        print(f"Could not create partitions: {e}")
 
-app = FastAPI(title="Virkum Company Scraper & Email API")
+
+def warm_llm_client():
+    # Sækir openai pakkann áður en fyrsta LLM kallið er mælt
+    try:
+        get_client()
+    except Exception as e:
+        print(f"OpenAI client not available: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ekkert hér bíður eftir grunni eða OpenAI, svo ferlið tekur við beiðnum strax
+    app.state.prepare_database = asyncio.create_task(asyncio.to_thread(prepare_database))
+    # Job sem ferli sem dó var að keyra fá tests-row úr því sem kláraðist, en
+    # aðeins þegar heartbeat þeirra er útrunnið (sjá recover_interrupted_jobs)
+    app.state.job_recovery = asyncio.create_task(recovery_loop())
+    app.state.warm_llm_client = asyncio.create_task(asyncio.to_thread(warm_llm_client))
+    yield
+    app.state.job_recovery.cancel()
+    # Skrifa EmailTestRuns sem bíða í write-behind biðröðinni áður en ferlið hættir
+    run_writer.close()
+
+
+app = FastAPI(
+    title="Virkum Company Scraper & Email API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 # --- CORS so React (localhost:3000) can talk to FastAPI ---
 origins = [
@@ -36,10 +116,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(PrometheusMiddleware)
+register_db_pool(get_engine)
 
 # Pydantic models
 class CompanyOut(BaseModel):
+    id: Optional[int] = None
     CompanyName: str
     CompanyDescription: str | None = None
     CompanyInfo: str | None = None
@@ -68,6 +153,15 @@ class RunTestRequest(BaseModel):
     concurrency_level: int = 1
     to: EmailStr
     company_name: Optional[str] = None  # if None → random
+    deadline_seconds: Optional[float] = None  # wall-clock hámark fyrir allt test-ið
+    corpus: Optional[str] = None        # skrá í scenarios/ (sjálfgefið default.jsonl)
+    seed: Optional[int] = None          # sama seed → sömu scenarios og fyrirtæki; nýtt ef None
+    stratify_by: List[str] = []         # "category" og/eða "company"
+    strata: str = "proportional"        # eða "equal"
+    grading: str = "judge"              # "self": svar og sjálfsmat í einu kalli
+    judge_sample_rate: float = 0.0      # hlutfall grading="self" keyrslna sem dómarinn metur líka
+    prompt_version: Optional[str] = None  # sniðmát í app/prompts.py; sjálfgefið PROMPT_VERSION
+    company_weights: Dict[str, float] = {}  # {CompanyName: vigt} fyrir scenarios án fyrirtækis; tómt = jafnt
 
 class ManualGenerateRequest(BaseModel):
     company_name: str       # verður að velja company í UI
@@ -83,39 +177,34 @@ def get_db():
         db.close()
 
 @app.get("/companies", response_model=List[CompanyOut])
-def list_companies(db: Session = Depends(get_db)):
-    # Use DISTINCT to get unique companies by name
-    result = db.execute(
-        text(
-            """
-            SELECT DISTINCT ON ("CompanyName") 
-                   id,
-               "CompanyName",
-               "CompanyDescription",
-               "CompanyInfo"
-            FROM "Companies"
-            ORDER BY "CompanyName"
-            """
-        )
+def list_companies(
+    request: Request,
+    fields: Optional[str] = Query(None, description=f"Comma separated subset of: {', '.join(COMPANY_FIELDS)}"),
+):
+    # Lesið úr company_catalog cache; DISTINCT ON keyrir bara eftir invalidate()
+    selected = parse_fields(fields, COMPANY_FIELDS)
+    etag = company_catalog.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    # JSON er serializað einu sinni fyrir hvert fields-val og snapshot
+    return Response(
+        content=company_catalog.encoded(selected),
+        media_type="application/json",
+        headers=headers,
     )
-    rows = result.mappings().all()
-
-    # Map rows to plain dicts that match CompanyOut
-    companies = [
-        {
-            "CompanyName": row["CompanyName"],
-            "CompanyDescription": row["CompanyDescription"],
-            "CompanyInfo": row["CompanyInfo"],
-        }
-        for row in rows
-    ]
-
-    return companies
 
 @app.get("/")
 def root():
     return {"message": "✅ Scraper service is running."}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus text format: HTTP, LLM, SMTP, scrape, DB pool og simulations_in_flight
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/scrape")
 def scrape(
     url: str = Query(..., description="Public website URL"),
@@ -133,49 +222,16 @@ def scrape(
 
     saved = False
     error = None
-    action = "created"
-    
+    action = None
+
     try:
-        # Check if company already exists
-        existing = db.execute(
-            text(
-                """
-                SELECT "CompanyName" FROM "Companies" 
-                WHERE "CompanyName" = :name
-                """
-            ),
-            {"name": name},
-        ).fetchone()
-
-        if existing:
-            # Update existing company instead of creating new one
-            db.execute(
-                text(
-                    """
-                    UPDATE "Companies" 
-                    SET "CompanyDescription" = :descr, "CompanyInfo" = :info
-                    WHERE "CompanyName" = :name
-                    """
-                ),
-                {"name": name, "descr": descr, "info": info},
-            )
-            action = "updated"
-        else:
-            # Create new company
-            db.execute(
-                text(
-                    """
-                    INSERT INTO "Companies" ("CompanyName", "CompanyDescription", "CompanyInfo")
-                    VALUES (:name, :descr, :info)
-                    """
-                ),
-                {"name": name, "descr": descr, "info": info},
-            )
-            action = "created"
-        
+        # Ein INSERT ... ON CONFLICT í stað SELECT + UPDATE/INSERT
+        action = upsert_company(db, name, descr, info)
         db.commit()
         saved = True
+        company_catalog.invalidate()
     except Exception as e:
+        db.rollback()
         error = str(e)
 
     return {
@@ -185,23 +241,54 @@ def scrape(
         "scraped": data,
     }
 
+@app.post("/companies/bulk")
+def bulk_upsert_companies(
+    companies: List[CompanyOut],
+    db: Session = Depends(get_db),
+):
+    """
+    Setur inn eða uppfærir mörg fyrirtæki í einni multi-row INSERT ... ON CONFLICT.
+    """
+    try:
+        results = upsert_companies(
+            db,
+            (
+                (c.CompanyName, c.CompanyDescription or "", c.CompanyInfo or "")
+                for c in companies
+            ),
+        )
+        db.commit()
+        company_catalog.invalidate()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error saving companies: {str(e)}")
+
+    return {
+        "created": sum(1 for r in results if r["action"] == "created"),
+        "updated": sum(1 for r in results if r["action"] == "updated"),
+        "companies": results,
+    }
+
 @app.delete("/cleanup-duplicates")
 def cleanup_duplicates(db: Session = Depends(get_db)):
     """
-    Remove duplicate companies based on CompanyName
+    Remove duplicate companies based on CompanyName.
+
+    Eftir migrations/001_companies_unique_name.sql geta tvítekningar ekki
+    myndast lengur; þetta er bara fyrir gagnagrunna sem hafa ekki fengið
+    migration-ið. Self-join á id í stað ctid NOT IN (... GROUP BY).
     """
     try:
         result = db.execute(
             text("""
-                DELETE FROM "Companies" 
-                WHERE ctid NOT IN (
-                    SELECT MIN(ctid) 
-                    FROM "Companies" 
-                    GROUP BY "CompanyName"
-                )
+                DELETE FROM "Companies" c
+                USING "Companies" older
+                WHERE c."CompanyName" = older."CompanyName"
+                  AND c.id > older.id
             """)
         )
         db.commit()
+        company_catalog.invalidate()
         
         return {"message": f"Removed {result.rowcount} duplicate company/companies"}
         
@@ -284,32 +371,84 @@ async def send_email(
             error=result.get("error", "Unknown error")
         )
 
+EMAIL_HISTORY_FIELDS = ("id", "recipient", "subject", "sent_at", "status", "company_id")
+
 # NEW: Get email sending history
 @app.get("/email-history")
 def get_email_history(
+    response: Response,
     limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    company_id: Optional[int] = None,
+    company: Optional[str] = Query(None, description="Company name"),
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description=f"Comma separated subset of: {', '.join(EMAIL_HISTORY_FIELDS)}"),
     db: Session = Depends(get_db)
 ):
     """
     Get history of sent emails
+
+    Keyset pagination á (sent_at, id): næsta síða er sótt með cursor úr
+    X-Next-Cursor headernum, svo djúpar síður kosta það sama og sú fyrsta.
     """
+    selected = parse_fields(fields, EMAIL_HISTORY_FIELDS)
+    where = []
+    params = {"limit": limit + 1}
+
+    after = decode_cursor(cursor, datetime, int)
+    if after:
+        # ORDER BY sent_at DESC setur NULL fremst (eldri raðir án sent_at);
+        # (NULL, id) < (...) er aldrei satt, svo NULL er meðhöndlað sér
+        if after[0] is None:
+            where.append("(sent_at IS NOT NULL OR id < :cursor_id)")
+            params["cursor_id"] = after[1]
+        else:
+            where.append("sent_at IS NOT NULL AND (sent_at, id) < (:cursor_sent_at, :cursor_id)")
+            params["cursor_sent_at"], params["cursor_id"] = after
+    if company_id is not None:
+        where.append("company_id = :company_id")
+        params["company_id"] = company_id
+    if company:
+        where.append('company_id IN (SELECT id FROM "Companies" WHERE "CompanyName" = :company)')
+        params["company"] = company
+    if status:
+        where.append("status = :status")
+        params["status"] = status
+    if since:
+        where.append("sent_at >= :since")
+        params["since"] = since
+    if until:
+        where.append("sent_at < :until")
+        params["until"] = until
+
     try:
-        emails = db.query(EmailSent).order_by(EmailSent.sent_at.desc()).limit(limit).all()
-        
-        return [
-            {
-                "id": email.id,
-                "recipient": email.recipient,
-                "subject": email.subject,
-                "sent_at": email.sent_at.isoformat() if email.sent_at else None,
-                "status": email.status,
-                "company_id": email.company_id
-            }
-            for email in emails
-        ]
+        # Bara dálkarnir sem við skilum; content (Text) er aldrei lesinn
+        rows = db.execute(
+            text(f"""
+                SELECT id, recipient, subject, sent_at, status, company_id
+                FROM emails_sent
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY sent_at DESC, id DESC
+                LIMIT :limit
+            """),
+            params,
+        ).mappings().all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching email history: {str(e)}")
 
+    rows, next_cursor = page_with_cursor(rows, limit, key=lambda r: (r["sent_at"], r["id"]))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    # Raðirnar eru þegar JSON-hæfar (orjson skrifar datetime sem ISO), svo
+    # svarið fer beint í FastJSONResponse framhjá jsonable_encoder
+    return FastJSONResponse(
+        pick_fields(rows, selected),
+        headers=dict(response.headers),
+    )
+
 # NEW: Check email service status
 @app.get("/email-service/status")
 def check_email_service():
@@ -341,11 +480,39 @@ def check_email_service():
 
 @app.get("/tests")
 def list_tests(
+    response: Response,
     limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    company: Optional[str] = Query(None, description="Only tests that included this company"),
+    label: Optional[str] = Query(None, description="e.g. bench:scrape for benchmark results"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description=f"Comma separated subset of: {', '.join(TEST_SUMMARY_FIELDS)}"),
     db: Session = Depends(get_db),
 ):
+    selected = parse_fields(fields, TEST_SUMMARY_FIELDS)
+    where = []
+    params = {"limit": limit + 1}
+
+    after = decode_cursor(cursor, int)
+    if after:
+        where.append("test_id < :cursor_test_id")
+        params["cursor_test_id"] = after[0]
+    if label:
+        where.append("label = :label")
+        params["label"] = label
+    if company:
+        where.append("companies::jsonb @> jsonb_build_array(CAST(:company AS text))")
+        params["company"] = company
+    if since:
+        where.append("started_at >= :since")
+        params["since"] = since
+    if until:
+        where.append("started_at < :until")
+        params["until"] = until
+
     try:
-        sql = text("""
+        sql = text(f"""
             SELECT
                 test_id,
                 companies,
@@ -354,45 +521,205 @@ def list_tests(
                 started_at,
                 finished_at,
                 total_requests,
-                avg_reply_grade
+                avg_reply_grade,
+                label,
+                peak_rss_mb,
+                seed,
+                scenario_corpus,
+                stratify_by,
+                {", ".join(TEST_METRIC_COLUMNS)}
             FROM tests
+            {"WHERE " + " AND ".join(where) if where else ""}
             ORDER BY test_id DESC
             LIMIT :limit
         """)
 
-        rows = db.execute(sql, {"limit": limit}).mappings().all()
-
-        def parse_companies(val):
-            # Ensure companies is a Python list, regardless of JSONB/text
-            try:
-                if val is None:
-                    return []
-                if isinstance(val, (list, dict)):
-                    return val
-                return json.loads(val)
-            except Exception:
-                # Fallback: return as-is if parsing fails
-                return val
-
-        return [
-            {
-                "test_id": row["test_id"],
-                "companies": parse_companies(row["companies"]),
-                "num_emails": row["num_emails"],
-                "concurrency_level": row["concurrency_level"],
-                "started_at": row["started_at"],
-                "finished_at": row["finished_at"],
-                "total_requests": row["total_requests"],
-                "avg_reply_grade": row["avg_reply_grade"],
-            }
-            for row in rows
-        ]
+        rows = db.execute(sql, params).mappings().all()
+        rows, next_cursor = page_with_cursor(rows, limit, key=lambda r: (r["test_id"],))
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
+        return FastJSONResponse(
+            pick_fields((test_summary_to_dict(row) for row in rows), selected),
+            headers=dict(response.headers),
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print("[ERROR] /tests handler exception:\n", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tests/compare")
+def compare_test_groups(
+    baseline: List[int] = Query(..., description="Baseline test ids (repeat the parameter for a group)"),
+    candidate: List[int] = Query(..., description="Candidate test ids"),
+    alpha: float = Query(DEFAULT_ALPHA, gt=0, lt=1),
+    db: Session = Depends(get_db),
+):
+    """
+    Ber saman svartíma, einkunnir og villuhlutfall tveggja hópa af tests.
+    regression=true ef candidate er marktækt verri; sjá compare_tests.py fyrir CI.
+    """
+    return compare_tests(db, baseline, candidate, alpha=alpha)
+
+@app.get("/rollups")
+def list_rollups(
+    group_by: str = Query("company", description="Comma separated: day, company, model"),
+    company: Optional[str] = None,
+    model: Optional[str] = Query(None, description="Model name; empty string for runs without one"),
+    since: Optional[date] = None,
+    until: Optional[date] = Query(None, description="Exclusive"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    """
+    Fjöldi keyrslna, einkunnir og svartími eftir degi, fyrirtæki og/eða líkani.
+    Lesið úr run_rollups (migrations/015) sem triggerar halda við, svo svarið
+    er jafn hratt óháð því hversu margar keyrslur eru í EmailTestRuns.
+    avg_reply_grade og graded_runs telja aðeins einkunnir dómarans, ekki
+    sjálfsmat úr grading="self" (migrations/018).
+    """
+    return query_rollups(
+        db,
+        [g.strip() for g in group_by.split(",") if g.strip()],
+        company=company,
+        model=model,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+
+@app.get("/test-runs")
+def list_test_runs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    test_id: Optional[int] = None,
+    company: Optional[str] = Query(None, description="Company name"),
+    status: Optional[str] = Query(None, description="'ok' (reply generated) or 'failed'"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    EmailTestRuns, nýjast fyrst, með keyset pagination á (created_at, id).
+    Skilar ekki input_email / generated_body; sjá /evaluate-test-run o.fl. fyrir stakar keyrslur.
+    """
+    where = []
+    params = {"limit": limit + 1}
+
+    after = decode_cursor(cursor, datetime, int)
+    if after:
+        where.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+        params["cursor_created_at"], params["cursor_id"] = after
+    if test_id is not None:
+        where.append("test_id = :test_id")
+        params["test_id"] = test_id
+    if company:
+        where.append("company_name = :company")
+        params["company"] = company
+    if status == "ok":
+        where.append("generated_body IS NOT NULL")
+    elif status == "failed":
+        where.append("generated_body IS NULL")
+    elif status:
+        raise HTTPException(status_code=400, detail="status must be 'ok' or 'failed'")
+    if since:
+        where.append("created_at >= :since")
+        params["since"] = since
+    if until:
+        where.append("created_at < :until")
+        params["until"] = until
+
+    rows = db.execute(
+        text(f"""
+            SELECT id, test_id, company_name, scenario, scenario_id, generated_subject,
+                   model_name, temperature, max_tokens, prompt_tokens, completion_tokens,
+                   cached_tokens, prompt_version, grading_cached_tokens,
+                   latency_ms, grading_latency_ms, stage_timings,
+                   sent_ok, reply_grade, grade_source, self_grade, created_at,
+                   generated_body IS NOT NULL AS generated
+            FROM "EmailTestRuns"
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """),
+        params,
+    ).mappings().all()
+
+    rows, next_cursor = page_with_cursor(rows, limit, key=lambda r: (r["created_at"], r["id"]))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    scenarios = scenario_interner.resolve_many(r["scenario_id"] for r in rows)
+    return [
+        {
+            "id": row["id"],
+            "test_id": row["test_id"],
+            "company_name": row["company_name"],
+            "scenario": scenarios[row["scenario_id"]][0] if row["scenario_id"] in scenarios else row["scenario"],
+            "generated_subject": row["generated_subject"],
+            "status": "ok" if row["generated"] else "failed",
+            "model_name": row["model_name"],
+            "temperature": row["temperature"],
+            "max_tokens": row["max_tokens"],
+            "prompt_tokens": row["prompt_tokens"],
+            "completion_tokens": row["completion_tokens"],
+            "cached_tokens": row["cached_tokens"],
+            "prompt_version": row["prompt_version"],
+            "latency_ms": row["latency_ms"],
+            "grading_latency_ms": row["grading_latency_ms"],
+            "grading_cached_tokens": row["grading_cached_tokens"],
+            "stage_timings": row["stage_timings"],
+            "sent_ok": row["sent_ok"],
+            "reply_grade": float(row["reply_grade"]) if row["reply_grade"] is not None else None,
+            "grade_source": row["grade_source"],
+            "self_grade": float(row["self_grade"]) if row["self_grade"] is not None else None,
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        }
+        for row in rows
+    ]
+
+@app.get("/test-runs/export")
+def export_test_runs(
+    format: str = Query("ndjson", description="ndjson, csv or parquet"),
+    test_id: Optional[int] = None,
+    company: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Streymir EmailTestRuns út sem NDJSON, CSV eða Parquet.
+    Raðirnar eru lesnar í keyset síðum eftir id og skrifaðar út jafnóðum.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    stmt = build_export_query(test_id=test_id, company=company, since=since, until=until)
+
+    # Eigin session: get_db lokar sinni áður en StreamingResponse klárast
+    db = SessionLocal()
+
+    def body():
+        try:
+            yield from chunks
+        finally:
+            db.close()
+
+    try:
+        chunks = iter_export(iter_rows(db, stmt), format)
+    except Exception:
+        db.close()
+        raise
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="test_runs.{format}"'},
+    )
+
 @app.post("/manual-generate")
 def manual_generate_email(
     body: ManualGenerateRequest,
@@ -413,7 +740,7 @@ def manual_generate_email(
     scenario = first_line or "Manual scenario"
 
     # 2) LLM svar
-    generated_subject, generated_body, model_name, llm_latency_ms = generate_reply_with_openai(
+    generated_subject, generated_body, model_name, llm_latency_ms, usage = generate_reply_with_openai(
         company_name=company_name,
         input_email=input_email,
     )
@@ -422,24 +749,33 @@ def manual_generate_email(
     # 3) Búa til EmailTestRun
     test_run = EmailTestRun(
         company_name=company_name,
-        scenario=scenario,
-        input_email=input_email,
+        scenario_id=scenario_interner.intern(scenario, input_email),
         generated_subject=generated_subject,
         generated_body=generated_body,
         model_name=model_name,
         latency_ms=total_latency_ms,
         sent_ok=False,   # við erum bara að generate-a, ekki senda raunpóst hér
+        temperature=DEFAULT_TEMPERATURE,
+        max_tokens=DEFAULT_MAX_TOKENS,
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        cached_tokens=usage["cached_tokens"],
+        prompt_version=usage["prompt_version"],
     )
 
     # 4) LLM dómari – gefur einkunn
     try:
-        grade, eval_latency_ms = evaluate_with_openai_rubric(
+        grade, eval_latency_ms, grading_usage = evaluate_with_openai_rubric(
             company_name=company_name,
             scenario=scenario,
             input_email=input_email,
             generated_body=generated_body,
         )
         test_run.reply_grade = grade
+        test_run.grading_latency_ms = eval_latency_ms
+        test_run.grading_prompt_tokens = grading_usage["prompt_tokens"]
+        test_run.grading_cached_tokens = grading_usage["cached_tokens"]
+        test_run.grade_source = "llm"
     except Exception as e:
         print(f"LLM grading failed (manual_generate): {e}")
 
@@ -483,17 +819,19 @@ def simulate_email(
     )
 
     send_message = "Simulation only – email was NOT actually sent."
+    scenario, input_email = scenario_interner.for_run(test_run)
 
     return {
         "status": "ok",
         "company_used": test_run.company_name,
         "latency_ms": total_latency_ms,
         "llm_latency_ms": llm_latency_ms,
+        "stage_timings": test_run.stage_timings,
         "sent_ok": test_run.sent_ok,
         "test_run_id": test_run.id,
         "preview": {
-            "scenario": test_run.scenario,
-            "input_email": test_run.input_email,
+            "scenario": scenario,
+            "input_email": input_email,
             "generated_subject": test_run.generated_subject,
             "generated_body": test_run.generated_body,
             "send_message": send_message,
@@ -527,15 +865,21 @@ def evaluate_test_run(
             detail="No generated_body to evaluate for this test_run",
         )
 
+    scenario, input_email = scenario_interner.for_run(test_run)
+
     # LLM-dómari án ExpectedAnswer
-    grade, eval_latency_ms = evaluate_with_openai_rubric(
+    grade, eval_latency_ms, grading_usage = evaluate_with_openai_rubric(
         company_name=test_run.company_name,
-        scenario=test_run.scenario,
-        input_email=test_run.input_email,
+        scenario=scenario,
+        input_email=input_email,
         generated_body=test_run.generated_body,
     )
 
     test_run.reply_grade = grade
+    test_run.grading_latency_ms = eval_latency_ms
+    test_run.grading_prompt_tokens = grading_usage["prompt_tokens"]
+    test_run.grading_cached_tokens = grading_usage["cached_tokens"]
+    test_run.grade_source = "llm"
     db.commit()
     db.refresh(test_run)
 
@@ -543,44 +887,354 @@ def evaluate_test_run(
         "status": "ok",
         "test_run_id": test_run.id,
         "company_name": test_run.company_name,
-        "scenario": test_run.scenario,
+        "scenario": scenario,
         "grade": float(grade),
         "evaluation_latency_ms": eval_latency_ms,
     }
 
-import asyncio
+
+class ExpectedAnswerIn(BaseModel):
+    scenario: str           # sama og Scenarios.label (fyrsta lína input_email)
+    company_name: str
+    expected_body: str
+
+
+@app.post("/expected-answers")
+def add_expected_answers(
+    answers: List[ExpectedAnswerIn],
+    db: Session = Depends(get_db),
+):
+    """
+    Bætir við viðmiðunarsvörum sem pre-grader ber svör saman við.
+    Fleiri en eitt svar má vera fyrir sama (scenario, company_name).
+    """
+    if not answers:
+        raise HTTPException(status_code=400, detail="No expected answers given")
+    db.add_all([
+        ExpectedAnswer(scenario=a.scenario, company_name=a.company_name, expected_body=a.expected_body)
+        for a in answers
+    ])
+    db.commit()
+    return {"status": "ok", "inserted": len(answers)}
+
+
+class ReevaluateRequest(BaseModel):
+    test_id: Optional[int] = None
+    company: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    only_ungraded: bool = False
+    concurrency_level: int = 4
+    deadline_seconds: Optional[float] = None
+    # Bera fyrst saman við ExpectedAnswers; bara óljós tilfelli fara til LLM dómarans
+    pregrade: bool = False
+    pregrade_low: Optional[float] = None
+    pregrade_high: Optional[float] = None
+
+
+@app.post("/test-runs/reevaluate")
+async def reevaluate_test_runs(body: ReevaluateRequest):
+    """
+    Endurmetur margar keyrslur í einu sem background job (t.d. eftir breytingu á
+    rubric). Einkunnir eru skrifaðar í batches og tests-raðirnar reiknaðar aftur.
+    Framvinda og throughput: /simulation-jobs/{job_id} og /simulation-jobs/{job_id}/events.
+
+    pregrade=true: keyrslur með ExpectedAnswer fyrir (scenario, company_name) fá
+    einkunn út frá líkindum ef þau eru undir pregrade_low eða yfir pregrade_high
+    (sjálfgefið PREGRADE_LOW / PREGRADE_HIGH); hinar fara til LLM dómarans.
+
+    SIMULATION_BACKEND=queue: keyrslunum er skipt í verk sem worker.py metur;
+    framvinda er þá í "progress" events.
+    """
+    if body.test_id is None and not body.company and not body.since and not body.until:
+        raise HTTPException(status_code=400, detail="Give at least one of test_id, company, since, until")
+    if body.concurrency_level <= 0:
+        raise HTTPException(status_code=400, detail="concurrency_level must be > 0")
+    if body.deadline_seconds is not None and body.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be > 0")
+
+    job_id = await job_manager.start_reevaluation(
+        test_id=body.test_id,
+        company=body.company,
+        since=body.since,
+        until=body.until,
+        only_ungraded=body.only_ungraded,
+        concurrency_level=body.concurrency_level,
+        deadline_seconds=body.deadline_seconds,
+        pregrade=body.pregrade,
+        pregrade_low=body.pregrade_low,
+        pregrade_high=body.pregrade_high,
+    )
+    job = await asyncio.to_thread(get_job, job_id)
+    return {"status": "running", "job_id": job_id, "num_total": job["num_total"] if job else None}
 
 @app.post("/run-simulated-test")
 async def run_simulated_test(
     body: RunTestRequest,
-    db: Session = Depends(get_db),
+    request: Request,
 ):
+    """
+    Keyrir test sem background job og bíður eftir niðurstöðunni.
+    Ef client aftengist er job-ið stöðvað svo það brenni ekki LLM köllum.
+    Sjá /simulation-jobs fyrir útgáfu sem skilar strax job_id.
+    """
+    validate_run_test_request(body)
+    job_id = await start_simulation_job(body)
+
+    waiter = asyncio.ensure_future(job_manager.wait(job_id))
+    cancelled = False
+    while not waiter.done():
+        await asyncio.wait({waiter}, timeout=1.0)
+        if not cancelled and not waiter.done() and await request.is_disconnected():
+            # Fyrir queue jobs skrifar cancel() í grunninn og býr til samantekt
+            await asyncio.to_thread(job_manager.cancel, job_id)
+            cancelled = True
+
+    summary = waiter.result()
+    if summary is None:
+        job = await asyncio.to_thread(get_job, job_id)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Simulation job {job_id} finished without any runs: {job['error'] if job else 'unknown'}",
+        )
+
+    summary["job_id"] = job_id
+    return summary
+
+
+def validate_run_test_request(body: RunTestRequest):
     if body.num_emails <= 0:
         raise HTTPException(status_code=400, detail="num_emails must be > 0")
     if body.concurrency_level <= 0:
         raise HTTPException(status_code=400, detail="concurrency_level must be > 0")
+    if body.deadline_seconds is not None and body.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be > 0")
 
-    semaphore = asyncio.Semaphore(body.concurrency_level)
 
-    async def run_one():
-        async with semaphore:
-            test_run, _, _ = await asyncio.to_thread(
-                run_single_simulation,
-                body.to,
-                body.company_name,
-            )
-            return test_run.id
+async def start_simulation_job(body: RunTestRequest) -> int:
+    return await job_manager.start(
+        to_email=body.to,
+        num_emails=body.num_emails,
+        concurrency_level=body.concurrency_level,
+        company_name=body.company_name,
+        deadline_seconds=body.deadline_seconds,
+        corpus=body.corpus,
+        seed=body.seed,
+        stratify_by=body.stratify_by,
+        strata=body.strata,
+        grading=body.grading,
+        judge_sample_rate=body.judge_sample_rate,
+        prompt_version=body.prompt_version,
+        company_weights=body.company_weights,
+    )
 
-    tasks = [run_one() for _ in range(body.num_emails)]
-    run_ids = await asyncio.gather(*tasks)
 
-    summary = create_test_summary_from_run_ids(
-        db=db,
-        run_ids=list(run_ids),
+@app.post("/simulation-jobs")
+async def create_simulation_job(body: RunTestRequest):
+    """
+    Setur test af stað sem background job og skilar job_id strax.
+    """
+    validate_run_test_request(body)
+    job_id = await start_simulation_job(body)
+    return {"status": "running", "job_id": job_id}
+
+
+class LoadTestRequest(BaseModel):
+    to: EmailStr
+    company_name: Optional[str] = None
+    schedule: str = "constant"          # constant / poisson / ramp
+    rps: float                          # markálag (beiðnir á sek.); upphafsgildi ef ramp
+    ramp_to_rps: Optional[float] = None # lokagildi ef schedule = ramp
+    duration_s: float
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT
+    seed: Optional[int] = None
+    corpus: Optional[str] = None
+    stratify_by: List[str] = []
+    strata: str = "proportional"
+    grading: str = "judge"
+    judge_sample_rate: float = 0.0
+    prompt_version: Optional[str] = None
+    company_weights: Dict[str, float] = {}
+
+
+@app.post("/simulation-jobs/load-test")
+async def create_load_test_job(body: LoadTestRequest):
+    """
+    Open-loop álagspróf: beiðnir byrja á áætluðum tímum óháð svartíma, svo
+    biðraðir og raunveruleg afköst sjáist. Skýrslan (throughput, percentiles,
+    mettunarpunktur, latency vs. offered load) er í "done" eventinu og í
+    /simulation-jobs/{job_id} þegar prófinu lýkur.
+
+    Keyrt í API ferlinu; 409 ef SIMULATION_BACKEND=queue (sjá job_service).
+    """
+    if body.schedule not in SCHEDULES:
+        raise HTTPException(status_code=400, detail=f"schedule must be one of {', '.join(SCHEDULES)}")
+    if body.rps <= 0 or body.duration_s <= 0:
+        raise HTTPException(status_code=400, detail="rps and duration_s must be > 0")
+    if body.schedule == "ramp" and (body.ramp_to_rps is None or body.ramp_to_rps <= 0):
+        raise HTTPException(status_code=400, detail="ramp schedule needs ramp_to_rps > 0")
+    if body.max_in_flight <= 0:
+        raise HTTPException(status_code=400, detail="max_in_flight must be > 0")
+
+    job_id = await job_manager.start_load_test(
+        to_email=body.to,
+        schedule=body.schedule,
+        rps=body.rps,
+        duration_s=body.duration_s,
+        ramp_to_rps=body.ramp_to_rps,
+        max_in_flight=body.max_in_flight,
+        company_name=body.company_name,
+        seed=body.seed,
+        corpus=body.corpus,
+        stratify_by=body.stratify_by,
+        strata=body.strata,
+        grading=body.grading,
+        judge_sample_rate=body.judge_sample_rate,
+        prompt_version=body.prompt_version,
+        company_weights=body.company_weights,
+    )
+    return {"status": "running", "job_id": job_id}
+
+
+class MatrixTestRequest(BaseModel):
+    to: EmailStr
+    company_name: Optional[str] = None
+    models: List[str]
+    temperatures: List[float] = [DEFAULT_TEMPERATURE]
+    max_tokens: List[int] = [DEFAULT_MAX_TOKENS]
+    num_emails: int                     # fjöldi beiðna í hverri stillingu
+    concurrency_level: int = 1
+    seed: Optional[int] = None
+    min_grade: Optional[float] = None   # gæðakrafa fyrir "recommended"
+    deadline_seconds: Optional[float] = None
+    corpus: Optional[str] = None
+    stratify_by: List[str] = []
+    strata: str = "proportional"
+    grading: str = "judge"
+    judge_sample_rate: float = 0.0
+    prompt_version: Optional[str] = None
+    company_weights: Dict[str, float] = {}
+
+
+@app.post("/simulation-jobs/matrix")
+async def create_matrix_job(body: MatrixTestRequest):
+    """
+    Keyrir sömu beiðnir (sama seed) fyrir hverja samsetningu af models ×
+    temperatures × max_tokens. Hver stilling fær sína tests-röð með svartíma,
+    token notkun og einkunn; skýrslan mælir með hraðasta stillingu sem nær min_grade.
+    """
+    if not body.models or not body.temperatures or not body.max_tokens:
+        raise HTTPException(status_code=400, detail="models, temperatures and max_tokens cannot be empty")
+    if body.num_emails <= 0 or body.concurrency_level <= 0:
+        raise HTTPException(status_code=400, detail="num_emails and concurrency_level must be > 0")
+    if any(t < 0 or t > 2 for t in body.temperatures):
+        raise HTTPException(status_code=400, detail="temperatures must be between 0 and 2")
+    if any(n <= 0 for n in body.max_tokens):
+        raise HTTPException(status_code=400, detail="max_tokens must be > 0")
+    if body.deadline_seconds is not None and body.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be > 0")
+
+    job_id = await job_manager.start_matrix(
+        to_email=body.to,
+        models=list(dict.fromkeys(body.models)),
+        temperatures=list(dict.fromkeys(body.temperatures)),
+        max_tokens_values=list(dict.fromkeys(body.max_tokens)),
+        num_emails=body.num_emails,
         concurrency_level=body.concurrency_level,
+        company_name=body.company_name,
+        seed=body.seed,
+        min_grade=body.min_grade,
+        deadline_seconds=body.deadline_seconds,
+        corpus=body.corpus,
+        stratify_by=body.stratify_by,
+        strata=body.strata,
+        grading=body.grading,
+        judge_sample_rate=body.judge_sample_rate,
+        prompt_version=body.prompt_version,
+        company_weights=body.company_weights,
     )
-    summary["run_ids"] = list(run_ids)
-    return summary
+    return {"status": "running", "job_id": job_id}
+
+
+@app.get("/simulation-jobs/{job_id}")
+def get_simulation_job(job_id: int):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Simulation job not found")
+    return job
+
+
+@app.post("/simulation-jobs/{job_id}/cancel")
+def cancel_simulation_job(job_id: int):
+    """
+    Stöðvar job: ekkert nýtt er byrjað og tests-row er búin til úr því sem kláraðist.
+    """
+    if not job_manager.cancel(job_id):
+        job = get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Simulation job not found")
+        return {"status": job["status"], "job_id": job_id, "cancelled": False}
+    return {"status": "cancelling", "job_id": job_id, "cancelled": True}
+
+
+@app.get("/simulation-jobs/{job_id}/events")
+async def simulation_job_events(job_id: int):
+    """
+    Server-Sent Events: fyrst "snapshot" með núverandi stöðu, síðan "run" /
+    "run_failed" fyrir hverja keyrslu og loks "done" með samantektinni.
+    Job sem worker.py keyrir fá "progress" í stað "run" events.
+    """
+    # Skráum okkur áður en staðan er lesin svo ekkert event tapist á milli
+    queue = job_manager.subscribe(job_id)
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        if queue is not None:
+            job_manager.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Simulation job not found")
+
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    async def poll_queue_job():
+        # Job sem worker keyrir: engin events í þessu ferli, svo staðan er lesin úr grunninum
+        last = (job["num_completed"], job["num_failed"])
+        while True:
+            await asyncio.sleep(QUEUE_POLL_INTERVAL)
+            current = await asyncio.to_thread(get_job, job_id)
+            if current is None:
+                return
+            progress = (current["num_completed"], current["num_failed"])
+            if progress != last:
+                last = progress
+                yield sse("progress", {
+                    "type": "progress",
+                    "completed": progress[0],
+                    "failed": progress[1],
+                    "total": current["num_total"],
+                })
+            if current["status"] in TERMINAL_STATUSES:
+                summary = await asyncio.to_thread(queue_job_summary, current)
+                yield sse("done", {"type": "done", "status": current["status"], "summary": summary})
+                return
+
+    async def stream():
+        try:
+            yield sse("snapshot", job)
+            if queue is None:
+                if is_queue_job(job) and job["status"] not in TERMINAL_STATUSES:
+                    async for event in poll_queue_job():
+                        yield event
+                return
+            while True:
+                event = await queue.get()
+                yield sse(event["type"], event)
+                if event["type"] == "done":
+                    return
+        finally:
+            if queue is not None:
+                job_manager.unsubscribe(job_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 class CreateTestFromRunsRequest(BaseModel):
     run_ids: List[int]
@@ -597,3 +1251,14 @@ def create_test_from_runs(
         run_ids=body.run_ids,
         concurrency_level=body.concurrency_level,
     )
+
+
+@app.post("/tests/{test_id}/replay")
+async def replay_test(test_id: int):
+    """
+    Keyrir test aftur með sama corpus, seed og stillingum, svo sömu beiðnir fari
+    á sömu fyrirtæki í sömu röð. Skilar nýju job_id; bera má saman með /tests/compare.
+    """
+    params, cell = await asyncio.to_thread(replay_source, test_id)
+    job_id = await job_manager.replay(params, cell)
+    return {"status": "running", "job_id": job_id, "replay_of": test_id, "seed": params["seed"]}
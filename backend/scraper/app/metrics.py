@@ -0,0 +1,135 @@
+# app/metrics.py
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Bil í sekúndum. LLM köll eru hægari en HTTP/DB svo þau fá sín eigin bil.
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=FAST_BUCKETS + (30, 60),
+)
+
+LLM_LATENCY = Histogram(
+    "llm_call_duration_seconds", "OpenAI call latency", ["operation", "model", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+
+SMTP_LATENCY = Histogram(
+    "smtp_send_duration_seconds", "SMTP send latency", ["outcome"],
+    buckets=FAST_BUCKETS + (30,),
+)
+
+SCRAPE_FETCH_LATENCY = Histogram(
+    "scrape_fetch_duration_seconds", "Time to fetch a page while scraping", ["outcome"],
+    buckets=FAST_BUCKETS + (15, 30),
+)
+SCRAPE_PARSE_LATENCY = Histogram(
+    "scrape_parse_duration_seconds", "Time to parse and clean a scraped page", ["outcome"],
+    buckets=FAST_BUCKETS,
+)
+
+SIMULATIONS_IN_FLIGHT = Gauge(
+    "simulations_in_flight", "run_single_simulation calls currently running"
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """
+    Mælir tímann á with-blokkinni og skráir hann með outcome="ok" eða "error".
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+
+
+class DBPoolCollector:
+    """
+    Les stöðu SQLAlchemy connection pool-sins þegar /metrics er sótt,
+    svo það kostar ekkert á milli.
+    """
+
+    _GAUGES = (
+        ("db_pool_size", "Configured pool size", "size"),
+        ("db_pool_checked_out", "Connections currently checked out", "checkedout"),
+        ("db_pool_overflow", "Connections above pool size", "overflow"),
+        ("db_pool_checked_in", "Idle connections in the pool", "checkedin"),
+    )
+
+    def __init__(self, get_engine):
+        # Fall en ekki engine, svo skráningin búi ekki til engine við ræsingu
+        self.get_engine = get_engine
+
+    def describe(self):
+        # REGISTRY.register() kallar annars á collect() strax til að fá nöfnin
+        return [GaugeMetricFamily(name, doc) for name, doc, _ in self._GAUGES]
+
+    def collect(self):
+        pool = self.get_engine().pool
+        for name, doc, getter in self._GAUGES:
+            fn = getattr(pool, getter, None)
+            if fn is not None:
+                yield GaugeMetricFamily(name, doc, value=fn())
+
+
+def register_db_pool(get_engine):
+    REGISTRY.register(DBPoolCollector(get_engine))
+
+
+class PrometheusMiddleware:
+    """
+    Hrá ASGI middleware (ekki BaseHTTPMiddleware) svo kostnaðurinn á hverja
+    beiðni sé bara tvær mælingar. route er template slóðin (t.d.
+    /simulation-jobs/{job_id}) svo label fjöldi haldist takmarkaður.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.labels(method=method, route=route_path, status=str(status)).inc()
+            HTTP_LATENCY.labels(method=method, route=route_path).observe(time.perf_counter() - start)
+
+
+def render_latest():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
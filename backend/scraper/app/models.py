@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Numeric
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Date, DateTime, Text, Boolean, Numeric, Index, UniqueConstraint
 from datetime import datetime
 from .database import Base
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 
 class Company(Base):
     __tablename__ = "Companies"  # taflan í google cloud
@@ -14,6 +15,7 @@ class Company(Base):
 
 class EmailSent(Base):
     __tablename__ = "emails_sent"
+    # Partitioned eftir mánuðum á sent_at (migrations/013, app/partitions.py)
     
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, nullable=True)
@@ -24,28 +26,154 @@ class EmailSent(Base):
     status = Column(String, default="sent")
     error_message = Column(String, nullable=True)
 
+    # Keyset pagination fyrir /email-history (sjá migrations/002)
+    __table_args__ = (
+        Index("ix_emails_sent_sent_at_id", sent_at.desc(), id.desc()),
+        Index("ix_emails_sent_company_sent_at_id", company_id, sent_at.desc(), id.desc()),
+    )
+
 class EmailTestRun(Base):
     __tablename__ = "EmailTestRuns"
+    # Partitioned eftir mánuðum á created_at (migrations/013, app/partitions.py)
 
     id = Column(Integer, primary_key=True, index=True)
 
     company_id = Column(Integer, nullable=True)   # má vera null 
     company_name = Column(String, nullable=False)
 
+    # Textinn er í "Scenarios" (app/scenario_store.py); scenario og input_email
+    # eru bara fyllt í eldri röðum sem hafa ekki verið færðar (migrations/012)
+    scenario_id = Column(Integer, nullable=True)
     scenario = Column(String, nullable=True)      # "Complaint" / "Ingredients question" etc.
-    input_email = Column(Text, nullable=False)
+    input_email = Column(Text, nullable=True)
 
     generated_subject = Column(String, nullable=True)
     generated_body = Column(Text, nullable=True)
 
     model_name = Column(String, nullable=True)    # t.d. "gpt-4.1-mini"
-    latency_ms = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=True)           # generate_reply_with_openai
+    grading_latency_ms = Column(Integer, nullable=True)   # evaluate_with_openai_rubric
 
     sent_ok = Column(Boolean, default=False)
 
     reply_grade = Column(Numeric, nullable=True)
+    grade_source = Column(String, nullable=True)   # "llm" eða "reference" (app/pregrader.py)
+    pregrade_score = Column(Float, nullable=True)  # líkindi við ExpectedAnswers, 0..1
+    self_grade = Column(Numeric, nullable=True)    # sjálfsmat úr generate_and_grade_with_openai
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    test_id = Column(Integer, nullable=True)      # tests.test_id, sett þegar test-row er búin til
+    job_id = Column(Integer, nullable=True)       # simulation_jobs.job_id ef keyrt sem background job
+
+    # Open-loop álagsprófun: áætlaður vs. raunverulegur upphafstími
+    scheduled_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+
+    # {skref: ms}, t.d. queue_wait, thread_wait, pick_company, generate, grade (sjá app/tracing.py)
+    stage_timings = Column(JSONB, nullable=True)
+
+    # LLM stillingar og token notkun fyrir generate kallið (model matrix)
+    temperature = Column(Float, nullable=True)
+    max_tokens = Column(Integer, nullable=True)
+    llm_seed = Column(BigInteger, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+
+    # Prompt cache (app/prompts.py): sniðmát og token úr cache hjá OpenAI í hvoru kalli
+    prompt_version = Column(String, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)
+    grading_prompt_tokens = Column(Integer, nullable=True)
+    grading_cached_tokens = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_test_runs_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_email_test_runs_company_created_at_id", company_name, created_at.desc(), id.desc()),
+        Index("ix_email_test_runs_test_id", test_id, id),
+        Index("ix_email_test_runs_job_id", job_id, id),
+        Index("ix_email_test_runs_scenario_id", scenario_id),
+    )
+
+
+class Scenario(Base):
+    __tablename__ = "Scenarios"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String, nullable=False, unique=True)   # sha256(label + "\n" + input_email)
+    label = Column(Text, nullable=True)
+    input_email = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SimulationJob(Base):
+    __tablename__ = "simulation_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued/running/completed/cancelled/deadline_exceeded/failed/interrupted
+    params = Column(JSONB, nullable=True)
+
+    num_total = Column(Integer, nullable=False, default=0)
+    num_completed = Column(Integer, nullable=False, default=0)
+    num_failed = Column(Integer, nullable=False, default=0)
+
+    deadline_at = Column(DateTime(timezone=True), nullable=True)
+    test_id = Column(Integer, nullable=True)      # tests-row sem var búin til úr því sem kláraðist
+    error = Column(Text, nullable=True)
+    report = Column(JSONB, nullable=True)         # load_generator.build_report fyrir open-loop próf
+
+    owner = Column(String, nullable=True)         # API ferli (hostname:pid) sem keyrir job-ið
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class SimulationTask(Base):
+    __tablename__ = "simulation_tasks"
+    # Biðröð fyrir worker.py (migrations/014, app/task_queue.py)
+
+    task_id = Column(BigInteger, primary_key=True)
+    job_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)          # númer beiðnar í plani job-sins
+    scenario = Column(JSONB, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued/running/done/failed/cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+
+    lease_owner = Column(String, nullable=True)    # worker_id (hostname:pid)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint(job_id, seq),
+    )
+
+
+class RunRollup(Base):
+    __tablename__ = "run_rollups"
+    # Haldið við af triggerum á "EmailTestRuns" (migrations/015); lesið í app/rollup_service.py
+
+    day = Column(Date, primary_key=True)                     # created_at í UTC
+    company_name = Column(Text, primary_key=True)
+    model_name = Column(Text, primary_key=True, default="")  # '' ef model_name er NULL
+
+    run_count = Column(BigInteger, nullable=False, default=0)
+    generated_count = Column(BigInteger, nullable=False, default=0)
+    sent_ok_count = Column(BigInteger, nullable=False, default=0)
+    latency_count = Column(BigInteger, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0)
+    latency_sumsq = Column(Float, nullable=False, default=0)
+    latency_buckets = Column(ARRAY(BigInteger), nullable=False)   # sjá LATENCY_BUCKETS_MS
+    graded_count = Column(BigInteger, nullable=False, default=0)
+    grade_sum = Column(Float, nullable=False, default=0)
+    grade_sumsq = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class ExpectedAnswer(Base):
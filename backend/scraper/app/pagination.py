@@ -0,0 +1,52 @@
+# app/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Býr til ógegnsæjan keyset cursor úr gildum síðustu raðar (t.d. sent_at, id).
+    """
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], *types) -> Optional[List[Any]]:
+    """
+    Öfugt við encode_cursor. types segir hvernig á að túlka hvert gildi
+    (datetime eða int). datetime gildi má vera None (NULL dálkur í síðustu
+    röð). Skilar None ef enginn cursor er gefinn.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if len(values) != len(types):
+            raise ValueError("wrong number of cursor values")
+        return [
+            (None if v is None else datetime.fromisoformat(v)) if t is datetime else t(v)
+            for v, t in zip(values, types)
+        ]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_with_cursor(rows: list, limit: int, key) -> tuple:
+    """
+    Fyrirspurnir sækja limit + 1 raðir; ef fleiri komu en limit er til næsta síða.
+    Skilar (rows[:limit], next_cursor eða None).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
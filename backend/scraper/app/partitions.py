@@ -0,0 +1,268 @@
+# app/partitions.py
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+from .database import get_engine
+
+# Töflur sem eru partitioned eftir mánuðum (migrations/013) og partition lykill þeirra
+PARTITIONED_TABLES = {
+    "EmailTestRuns": "created_at",
+    "emails_sent": "sent_at",
+}
+
+# Hversu marga mánuði fram í tímann partitions eru búnar til
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+# Partitions sem enda fyrir meira en RETENTION_MONTHS mánuðum eru teknar úr
+# sambandi, skrifaðar í ARCHIVE_DIR og eytt
+RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", 12))
+ARCHIVE_DIR = Path(os.getenv("PARTITION_ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "archive"))
+
+# Partitions sem hafa verið teknar úr sambandi en ekki enn skrifaðar í skrá
+ARCHIVE_PREFIX = "archive_"
+
+_BOUNDS = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: Optional[date]     # None = MINVALUE
+    upper: Optional[date]     # None = MAXVALUE
+    is_default: bool
+
+
+def _month(d: date, add: int = 0) -> date:
+    m = d.year * 12 + d.month - 1 + add
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def _bound(value: str) -> Optional[date]:
+    value = value.strip()
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return date.fromisoformat(value.strip("'")[:10])
+
+
+def list_partitions(conn, table: str) -> List[Partition]:
+    rows = conn.execute(
+        text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(quote_ident(:table))
+            ORDER BY c.relname
+        """),
+        {"table": table},
+    ).all()
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions.append(Partition(name, None, None, True))
+            continue
+        m = _BOUNDS.search(bound)
+        partitions.append(Partition(name, _bound(m.group(1)), _bound(m.group(2)), False))
+    return partitions
+
+
+def is_partitioned(conn, table: str) -> bool:
+    # False þar til migrations/013 hefur verið keyrð
+    return conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(quote_ident(:table))"),
+        {"table": table},
+    ).scalar() is True
+
+
+def _covers(p: Partition, d: date) -> bool:
+    return not p.is_default and (p.lower is None or p.lower <= d) and (p.upper is None or d < p.upper)
+
+
+def _create_month(conn, table: str, name: str, start: date, end: date, default: Optional[Partition]) -> int:
+    """
+    Býr til partition fyrir [start, end). Ef default partition hefur raðir á
+    því bili neitar Postgres CREATE ... PARTITION OF, svo þá er default tekin
+    úr sambandi, raðirnar færðar í nýju partition og default tengd aftur, allt
+    í sömu færslu. Skilar fjölda raða sem voru færðar.
+
+    Raðirnar eru skrifaðar beint í partition-ina, ekki í gegnum "table", svo
+    statement triggerar á "table" (run_rollups, migrations/015) telja þær ekki
+    aftur.
+    """
+    col = PARTITIONED_TABLES[table]
+    bounds = {"start": start, "end": end}
+    moved = 0
+    if default is not None:
+        moved = conn.execute(
+            text(f'SELECT COUNT(*) FROM "{default.name}" WHERE "{col}" >= :start AND "{col}" < :end'),
+            bounds,
+        ).scalar()
+    if moved:
+        conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{default.name}"'))
+    conn.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    if moved:
+        conn.execute(
+            text(f'INSERT INTO "{name}" SELECT * FROM "{default.name}" WHERE "{col}" >= :start AND "{col}" < :end'),
+            bounds,
+        )
+        conn.execute(
+            text(f'DELETE FROM "{default.name}" WHERE "{col}" >= :start AND "{col}" < :end'),
+            bounds,
+        )
+        conn.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{default.name}" DEFAULT'))
+    return moved
+
+
+def ensure_partitions(months_ahead: int = MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """
+    Býr til partition fyrir núverandi mánuð og months_ahead mánuði fram í
+    tímann, ef hún er ekki til. Raðir sem lentu í default partition fyrir
+    þann mánuð eru færðar í nýju partition-ina. Skilar nöfnum nýrra partitions.
+
+    Reynir alla mánuði og kastar RuntimeError í lokin ef einhver mistókst,
+    svo partitions.py (cron) og ræsing sýni villuna.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    created, failed = [], []
+    for table in PARTITIONED_TABLES:
+        for i in range(months_ahead + 1):
+            start, end = _month(today, i), _month(today, i + 1)
+            name = f"{table}_p{start:%Y_%m}"
+            try:
+                with get_engine().begin() as conn:
+                    conn.execute(text("SET LOCAL timezone = 'UTC'"))
+                    if not is_partitioned(conn, table):
+                        break
+                    partitions = list_partitions(conn, table)
+                    if any(_covers(p, start) for p in partitions):
+                        continue
+                    default = next((p for p in partitions if p.is_default), None)
+                    moved = _create_month(conn, table, name, start, end, default)
+                created.append(name)
+                if moved:
+                    print(f"Moved {moved} rows from {default.name} into new partition {name}")
+            except Exception as e:
+                failed.append(f"{name}: {e}")
+    if failed:
+        raise RuntimeError(f"Could not create partitions: {'; '.join(failed)}")
+    return created
+
+
+def detach_expired(retention_months: int = RETENTION_MONTHS, today: Optional[date] = None) -> List[str]:
+    """
+    Tekur partitions sem enda fyrir retention_months mánuðum úr sambandi og
+    endurnefnir þær archive_<nafn> svo archive_detached() finni þær, líka ef
+    ferlið deyr á milli.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = _month(today, -retention_months)
+    detached = []
+    for table in PARTITIONED_TABLES:
+        with get_engine().begin() as conn:
+            conn.execute(text("SET LOCAL timezone = 'UTC'"))
+            for p in list_partitions(conn, table):
+                if p.is_default or p.upper is None or p.upper > cutoff:
+                    continue
+                archived = f"{ARCHIVE_PREFIX}{p.name}"[:63]
+                conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{p.name}"'))
+                conn.execute(text(f'ALTER TABLE "{p.name}" RENAME TO "{archived}"'))
+                detached.append(archived)
+    return detached
+
+
+def _archive_one(name: str, archive_dir: Path) -> dict:
+    """
+    Streymir töflunni með COPY í gzip CSV skrá (aldrei öll í minni), ber saman
+    fjölda raða og eyðir töflunni aðeins ef skráin er heil.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name[len(ARCHIVE_PREFIX):]}.csv.gz"
+    tmp = path.with_suffix(".gz.tmp")
+
+    raw = get_engine().raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f'SELECT COUNT(*) FROM "{name}"')
+        expected = cur.fetchone()[0]
+        with gzip.open(tmp, "wb") as f:
+            # pg8000: COPY ... TO STDOUT skrifar beint í stream
+            cur.execute(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER true)', stream=f)
+            copied = cur.rowcount
+        if copied != expected:
+            raise RuntimeError(f"{name}: copied {copied} rows, expected {expected}")
+
+        digest = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        os.replace(tmp, path)
+
+        cur.execute(f'DROP TABLE "{name}"')
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        raw.close()
+
+    entry = {
+        "table": name[len(ARCHIVE_PREFIX):],
+        "file": path.name,
+        "rows": expected,
+        "bytes": path.stat().st_size,
+        "sha256": digest.hexdigest(),
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(archive_dir / "manifest.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def archive_detached(archive_dir: Path = ARCHIVE_DIR) -> List[dict]:
+    """
+    Skrifar allar archive_* töflur í archive_dir og eyðir þeim.
+
+    Til að lesa partition aftur inn:
+        COPY "EmailTestRuns" FROM PROGRAM 'gunzip -c <skrá>' WITH (FORMAT csv, HEADER true)
+    """
+    with get_engine().connect() as conn:
+        names = [
+            r[0] for r in conn.execute(
+                text("""
+                    SELECT c.relname FROM pg_class c
+                    WHERE c.relkind = 'r'
+                      AND c.relnamespace = current_schema()::regnamespace
+                      AND c.relname LIKE :prefix
+                      AND NOT c.relispartition
+                    ORDER BY c.relname
+                """),
+                {"prefix": ARCHIVE_PREFIX.replace("_", r"\_") + "%"},
+            )
+        ]
+    archived = []
+    for name in names:
+        if not any(name[len(ARCHIVE_PREFIX):].startswith(f"{t}_") for t in PARTITIONED_TABLES):
+            continue
+        try:
+            archived.append(_archive_one(name, archive_dir))
+        except Exception as e:
+            print(f"Archiving {name} failed, table kept: {e}")
+    return archived
+
+
+def run_maintenance(months_ahead: int = MONTHS_AHEAD, retention_months: int = RETENTION_MONTHS,
+                    archive_dir: Path = ARCHIVE_DIR, archive: bool = True) -> dict:
+    return {
+        "created": ensure_partitions(months_ahead),
+        "detached": detach_expired(retention_months),
+        "archived": archive_detached(archive_dir) if archive else [],
+    }
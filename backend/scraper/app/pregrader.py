@@ -0,0 +1,182 @@
+# app/pregrader.py
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from .database import SessionLocal
+
+# Líkindi (0..1) undir LOW eða yfir HIGH eru talin örugg; þar á milli fer
+# svarið til LLM dómarans.
+PREGRADE_LOW = float(os.getenv("PREGRADE_LOW", 0.15))
+PREGRADE_HIGH = float(os.getenv("PREGRADE_HIGH", 0.55))
+
+TFIDF_WEIGHT = 0.5          # restin er ROUGE-L
+ROUGE_BETA = 1.2            # eins og í upprunalegu ROUGE-L
+MAX_TOKENS = 400            # lengri svör eru stytt áður en LCS er reiknað
+CHUNK_SIZE = 128            # pör í hverri dense TF-IDF matrix
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text_: str) -> List[str]:
+    return _TOKEN.findall((text_ or "").lower())
+
+
+def tfidf_cosine(candidates: Sequence[List[str]], references: Sequence[List[str]]) -> np.ndarray:
+    """
+    Cosine líkindi TF-IDF vigra fyrir hvert par (candidates[i], references[i]).
+    IDF er reiknað yfir allan batch-inn; matrixurnar eru byggðar í bútum svo
+    minnið haldist O(CHUNK_SIZE × orðaforði).
+    """
+    n = len(candidates)
+    if n == 0:
+        return np.zeros(0)
+
+    vocab: Dict[str, int] = {}
+    ids = [
+        np.fromiter((vocab.setdefault(t, len(vocab)) for t in doc), dtype=np.int64, count=len(doc))
+        for doc in list(candidates) + list(references)
+    ]
+    v = max(len(vocab), 1)
+
+    # Document frequency: hvert orð talið einu sinni í hverju skjali
+    df = np.bincount(np.concatenate([np.unique(d) for d in ids] + [np.zeros(0, np.int64)]), minlength=v)
+    idf = (np.log((1 + 2 * n) / (1 + df)) + 1).astype(np.float32)
+
+    def dense(docs: List[np.ndarray]) -> np.ndarray:
+        m = np.zeros((len(docs), v), dtype=np.float32)
+        rows = np.repeat(np.arange(len(docs)), [len(d) for d in docs])
+        np.add.at(m, (rows, np.concatenate(docs + [np.zeros(0, np.int64)])), 1.0)
+        return m * idf
+
+    out = np.empty(n, dtype=np.float64)
+    for start in range(0, n, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, n)
+        a = dense(ids[start:end])
+        b = dense(ids[n + start:n + end])
+        norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+        dots = np.einsum("ij,ij->i", a, b)
+        out[start:end] = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+    return out
+
+
+def _encode(docs: Sequence[List[str]], vocab: Dict[str, int], pad: int) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.array([min(len(d), MAX_TOKENS) for d in docs], dtype=np.int64)
+    width = max(int(lengths.max()) if len(docs) else 0, 1)
+    m = np.full((len(docs), width), pad, dtype=np.int64)
+    for i, doc in enumerate(docs):
+        doc = doc[:MAX_TOKENS]
+        m[i, :len(doc)] = [vocab.setdefault(t, len(vocab)) for t in doc]
+    return m, lengths
+
+
+def rouge_l(candidates: Sequence[List[str]], references: Sequence[List[str]]) -> np.ndarray:
+    """
+    ROUGE-L F fyrir hvert par, allur batch-inn í einu.
+
+    LCS línan er uppfærð fyrir öll pör samtímis, einn candidate tóka í einu:
+        cur[j] = max(cur[j-1], prev[j], prev[j-1] + match[j])
+    Þar sem prev er vaxandi er það sama og np.maximum.accumulate yfir
+    max(prev[j], prev[j-1] + match[j]), svo innri lykkjan er vektoriseruð.
+    """
+    n = len(candidates)
+    if n == 0:
+        return np.zeros(0)
+
+    vocab: Dict[str, int] = {}
+    # Mismunandi padding gildi svo padding passi aldrei við padding
+    cand, cand_len = _encode(candidates, vocab, pad=-1)
+    ref, ref_len = _encode(references, vocab, pad=-2)
+
+    prev = np.zeros((n, ref.shape[1] + 1), dtype=np.int32)
+    for i in range(cand.shape[1]):
+        match = (ref == cand[:, i:i + 1]).astype(np.int32)
+        cur = np.empty_like(prev)
+        cur[:, 0] = 0
+        cur[:, 1:] = np.maximum(prev[:, 1:], prev[:, :-1] + match)
+        np.maximum.accumulate(cur, axis=1, out=cur)
+        # Pör þar sem candidate er búinn halda fyrri línu
+        active = (i < cand_len)[:, None]
+        prev = np.where(active, cur, prev)
+
+    lcs = prev[np.arange(n), ref_len].astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(cand_len > 0, lcs / cand_len, 0.0)
+        r = np.where(ref_len > 0, lcs / ref_len, 0.0)
+        b2 = ROUGE_BETA ** 2
+        f = np.where(p + r > 0, (1 + b2) * p * r / (r + b2 * p), 0.0)
+    return np.nan_to_num(f)
+
+
+def similarity(candidates: Sequence[str], references: Sequence[str]) -> np.ndarray:
+    cand = [tokenize(c) for c in candidates]
+    ref = [tokenize(r) for r in references]
+    return TFIDF_WEIGHT * tfidf_cosine(cand, ref) + (1 - TFIDF_WEIGHT) * rouge_l(cand, ref)
+
+
+def score_to_grade(score: float) -> float:
+    # 0..1 líkindi yfir á 1..10 skala dómarans
+    return round(1.0 + 9.0 * min(max(score, 0.0), 1.0), 1)
+
+
+def load_expected_answers(pairs) -> Dict[Tuple[str, str], List[str]]:
+    """
+    {(scenario, company_name): [expected_body, ...]} fyrir gefin pör.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    scenarios = sorted({s for s, _ in pairs})
+    companies = sorted({c for _, c in pairs})
+    answers: Dict[Tuple[str, str], List[str]] = {}
+    with SessionLocal() as db:
+        for scenario, company, body in db.execute(
+            text("""
+                SELECT scenario, company_name, expected_body
+                FROM "ExpectedAnswers"
+                WHERE scenario = ANY(:scenarios) AND company_name = ANY(:companies)
+            """),
+            {"scenarios": scenarios, "companies": companies},
+        ):
+            if (scenario, company) in pairs:
+                answers.setdefault((scenario, company), []).append(body)
+    return answers
+
+
+def pregrade(rows, low: float = PREGRADE_LOW, high: float = PREGRADE_HIGH) -> Dict[int, Tuple[Optional[float], Optional[float]]]:
+    """
+    rows: hlutir með id, scenario, company_name, generated_body.
+
+    Skilar {run_id: (grade, score)}. grade er None ef svarið er á gráa svæðinu
+    (low < score < high) eða ekkert ExpectedAnswer er til; þá á LLM dómarinn að meta það.
+    score er hæstu líkindi við eitthvert ExpectedAnswer (None ef ekkert er til).
+    """
+    if not 0 <= low <= high <= 1:
+        raise ValueError("pre-grader bands must satisfy 0 <= low <= high <= 1")
+
+    answers = load_expected_answers((r.scenario, r.company_name) for r in rows)
+
+    # Eitt par fyrir hvert (keyrsla, expected answer); hámark yfir svörin
+    pair_run, candidates, references = [], [], []
+    for r in rows:
+        for expected in answers.get((r.scenario, r.company_name), []):
+            pair_run.append(r.id)
+            candidates.append(r.generated_body)
+            references.append(expected)
+
+    best: Dict[int, float] = {}
+    if pair_run:
+        for run_id, score in zip(pair_run, similarity(candidates, references).tolist()):
+            best[run_id] = max(best.get(run_id, 0.0), score)
+
+    result = {}
+    for r in rows:
+        score = best.get(r.id)
+        if score is not None and (score <= low or score >= high):
+            result[r.id] = (score_to_grade(score), score)
+        else:
+            result[r.id] = (None, score)
+    return result
@@ -0,0 +1,193 @@
+# app/prompts.py
+"""
+Útgáfustýrð prompt sniðmát fyrir llm_service.
+
+OpenAI (og flestir aðrir) cache-a lengsta forskeyti prompts sem hefur sést
+nýlega, í 128 token skrefum eftir fyrstu 1024 token. Í v2 er allt sem er eins
+í öllum köllum haft fremst, í system skilaboðunum, og það sem breytist
+(fyrirtæki, scenario, tölvupóstur, svar) aftast í user skilaboðunum.
+
+Útgáfan er skráð á hverja keyrslu (EmailTestRuns.prompt_version) svo hægt sé
+að bera saman tests fyrir og eftir breytingu á sniðmáti. Breyting á texta í
+system = ný útgáfa; annars blandast saman keyrslur með ólíkum prompts.
+"""
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException
+
+# Sjálfgefin útgáfa; v1 er gamla uppsetningin (breytur inni í miðjum texta).
+# Helst v1 svo nýjar einkunnir séu sambærilegar við eldri tests; skipt aðeins
+# eftir mælingu á móti raunverulega API-inu.
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v1")
+
+
+class PromptTemplate(NamedTuple):
+    name: str
+    version: str
+    system: Optional[str]   # fast forskeyti; None fyrir v1
+    user: str               # str.format sniðmát með breytilegu hlutunum
+
+    @property
+    def key(self) -> str:
+        # Sent sem prompt_cache_key svo köll með sama forskeyti lendi á sama cache
+        return f"{self.name}-{self.version}"
+
+    def render(self, **values) -> List[dict]:
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        messages.append({"role": "user", "content": self.user.format(**values)})
+        return messages
+
+
+# Sömu viðmið í dómaranum og í sjálfsmati reply_with_grade
+RUBRIC_CRITERIA = """- correctness and factual accuracy
+- helpfulness and clarity
+- tone and professionalism
+- whether it fully answers the customer’s request/complaint"""
+
+
+# --- v1: gamla uppsetningin, óbreytt svo eldri tests séu sambærileg -----------------
+
+_V1_REPLY = """
+You are a representative of the company "{company_name}".
+
+You received the following email from a customer:
+
+{input_email}
+
+1) First, infer an appropriate email subject line.
+2) Then, write a professional, friendly email reply.
+
+Return your result in JSON with the fields:
+- subject
+- body
+"""
+
+_V1_REPLY_WITH_GRADE = """
+You are a representative of the company "{company_name}".
+
+SCENARIO: {scenario}
+
+You received the following email from a customer:
+
+{input_email}
+
+1) Infer an appropriate email subject line.
+2) Write a professional, friendly email reply.
+3) Then review your reply as a strict reviewer and give it a score from 1 to 10 for:
+""" + RUBRIC_CRITERIA + """
+
+Return subject, body and self_grade.
+"""
+
+_V1_GRADE = """
+You are a strict reviewer grading an automatic customer support email reply.
+
+COMPANY:
+--------
+{company_name}
+
+SCENARIO:
+---------
+{scenario}
+
+CUSTOMER EMAIL:
+---------------
+{input_email}
+
+MODEL-GENERATED REPLY:
+----------------------
+{generated_body}
+
+TASK:
+Give a single numeric score from 1 to 10 indicating how good this reply is in terms of:
+""" + RUBRIC_CRITERIA + """
+
+Respond ONLY with the number, for example: 7.5
+"""
+
+
+# --- v2: sömu fyrirmæli og v1, fast forskeyti fremst og breytur aftast --------------
+
+# Enginn uppfyllingartexti: forskeytin eru undir 1024 token og OpenAI cache-ar
+# þau ekki ein og sér. v2 er aðeins ódýrara en v1 ef fyrirmælin sjálf vaxa
+# fram yfir það, og það þarf að mæla á móti raunverulega API-inu.
+_REPLY_SYSTEM = """You are a representative of a company, replying to an email from a customer.
+
+1) First, infer an appropriate email subject line.
+2) Then, write a professional, friendly email reply.
+
+Return your result in JSON with the fields:
+- subject
+- body
+"""
+
+_REPLY_WITH_GRADE_SYSTEM = """You are a representative of a company, replying to an email from a customer.
+
+1) Infer an appropriate email subject line.
+2) Write a professional, friendly email reply.
+3) Then review your reply as a strict reviewer and give it a score from 1 to 10 for:
+""" + RUBRIC_CRITERIA + """
+
+Return subject, body and self_grade.
+"""
+
+_GRADER_SYSTEM = """You are a strict reviewer grading an automatic customer support email reply.
+
+Give a single numeric score from 1 to 10 indicating how good this reply is in terms of:
+""" + RUBRIC_CRITERIA + """
+
+Respond ONLY with the number, for example: 7.5
+"""
+
+_V2_REPLY_USER = """COMPANY: {company_name}
+
+CUSTOMER EMAIL:
+{input_email}
+"""
+
+_V2_REPLY_WITH_GRADE_USER = """COMPANY: {company_name}
+SCENARIO: {scenario}
+
+CUSTOMER EMAIL:
+{input_email}
+"""
+
+_V2_GRADE_USER = """COMPANY: {company_name}
+SCENARIO: {scenario}
+
+CUSTOMER EMAIL:
+{input_email}
+
+MODEL-GENERATED REPLY:
+{generated_body}
+"""
+
+
+TEMPLATES: Dict[str, Dict[str, PromptTemplate]] = {
+    "reply": {
+        "v1": PromptTemplate("reply", "v1", None, _V1_REPLY),
+        "v2": PromptTemplate("reply", "v2", _REPLY_SYSTEM, _V2_REPLY_USER),
+    },
+    "reply_with_grade": {
+        "v1": PromptTemplate("reply_with_grade", "v1", None, _V1_REPLY_WITH_GRADE),
+        "v2": PromptTemplate("reply_with_grade", "v2", _REPLY_WITH_GRADE_SYSTEM, _V2_REPLY_WITH_GRADE_USER),
+    },
+    "grade": {
+        "v1": PromptTemplate("grade", "v1", None, _V1_GRADE),
+        "v2": PromptTemplate("grade", "v2", _GRADER_SYSTEM, _V2_GRADE_USER),
+    },
+}
+
+PROMPT_VERSIONS = tuple(TEMPLATES["reply"])
+
+
+def get_template(name: str, version: Optional[str] = None) -> PromptTemplate:
+    version = version or PROMPT_VERSION
+    try:
+        return TEMPLATES[name][version]
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown prompt version {version!r}; expected one of {', '.join(PROMPT_VERSIONS)}",
+        )
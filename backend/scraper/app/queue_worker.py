@@ -0,0 +1,221 @@
+# app/queue_worker.py
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .job_service import _company_kwargs, _grading_kwargs, _run_rng, finalize_queue_job
+from .llm_service import evaluate_with_openai_rubric
+from .run_writer import run_writer
+from .simulation_service import _remaining, run_single_simulation
+from . import reevaluation_service, task_queue
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueWorker:
+    """
+    Tekur verk úr simulation_tasks og keyrir þau, í mesta lagi concurrency í einu.
+
+    Heartbeat þráður framlengir lease á verkum í gangi á lease_seconds/3 fresti.
+    Ef worker deyr rennur lease-ið út og reap() (sem allir workers keyra) setur
+    verkið aftur í biðröð. Keyrsla sem var skrifuð í EmailTestRuns rétt áður en
+    worker dó getur því verið keyrð tvisvar.
+
+    Verk sem mistakast (LLM villa o.s.frv.) eru ekki reynd aftur: þau eru hluti
+    af mælingunni, eins og þegar job er keyrt í API ferlinu.
+
+    Verk eru ein hermun (closed loop), ein hermun fyrir eina stillingu (model
+    matrix, payload {"cell", "index"}) eða síða af keyrslum sem á að endurmeta
+    (payload {"run_ids"}).
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, concurrency: int = 4,
+                 lease_seconds: float = task_queue.DEFAULT_LEASE_SECONDS, poll_interval: float = 1.0):
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self._slot_free = threading.Event()
+        self._lock = threading.Lock()
+        self._active: Dict[int, task_queue.Task] = {}
+        self._last_reap = 0.0
+
+    def stop(self):
+        # Ekkert nýtt er tekið; verk í gangi fá að klára
+        self.stopping.set()
+        self._slot_free.set()
+
+    def run(self):
+        print(f"Worker {self.worker_id} started (concurrency={self.concurrency}, lease={self.lease_seconds}s)")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True)
+        heartbeat.start()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sim")
+        try:
+            while not self.stopping.is_set():
+                self._reap()
+                claimed = self._fill(executor)
+                if not claimed:
+                    # Bíðum þar til pláss losnar eða poll_interval er liðið
+                    self._slot_free.wait(self.poll_interval)
+                    self._slot_free.clear()
+        finally:
+            executor.shutdown(wait=True)
+            run_writer.close()
+            print(f"Worker {self.worker_id} stopped")
+
+    def _fill(self, executor) -> int:
+        claimed = 0
+        while len(self._active) < self.concurrency and not self.stopping.is_set():
+            try:
+                task = task_queue.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Claim failed: {e}")
+                break
+            if task is None:
+                break
+            with self._lock:
+                self._active[task.task_id] = task
+            executor.submit(self._execute, task)
+            claimed += 1
+        return claimed
+
+    def _reap(self):
+        # Einu sinni á lease tímabili dugar; allir workers keyra þetta
+        now = time.monotonic()
+        if now - self._last_reap < self.lease_seconds / 2:
+            return
+        self._last_reap = now
+        try:
+            for job_id in task_queue.reap():
+                finalize_queue_job(job_id)
+        except Exception as e:
+            print(f"Reap failed: {e}")
+
+    def _heartbeat_loop(self):
+        interval = self.lease_seconds / 3
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                task_ids = list(self._active)
+            if not task_ids:
+                if self.stopping.is_set():
+                    return
+                continue
+            try:
+                held = set(task_queue.heartbeat(self.worker_id, task_ids, self.lease_seconds))
+            except Exception as e:
+                print(f"Heartbeat failed: {e}")
+                continue
+            for task_id in task_ids:
+                if task_id not in held:
+                    print(f"Lost lease on task {task_id}")
+
+    def _execute(self, task: task_queue.Task):
+        try:
+            status, error, counts = self._run(task)
+            if not task_queue.complete(task, self.worker_id, status, error, counts):
+                print(f"Task {task.task_id} was taken over by another worker; result not recorded")
+            finalize_queue_job(task.job_id)
+        except Exception as e:
+            print(f"Task {task.task_id} failed to complete: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(task.task_id, None)
+            self._slot_free.set()
+
+    def _run(self, task: task_queue.Task):
+        """
+        Skilar (status, error, counts); counts er None nema verkið nái yfir
+        fleiri en eina keyrslu (sjá task_queue.complete).
+        """
+        job = task_queue.job_info(task.job_id)
+        if job is None:
+            return "cancelled", "job not found", None
+        if job["status"] not in ("queued", "running"):
+            return "cancelled", "job cancelled", None
+        if job["deadline"] is not None and time.time() >= job["deadline"]:
+            return "cancelled", "deadline exceeded", None
+        if job["params"].get("mode") == "reevaluate":
+            return self._reevaluate(task, job)
+        return self._simulate(task, job) + (None,)
+
+    def _simulate(self, task: task_queue.Task, job: dict):
+        params = job["params"]
+        index = task.seq
+        llm = {}
+        if params.get("mode") == "matrix":
+            # Beiðni index fær sama fyrirtæki, scenario og seed í öllum cells
+            cell, index = task.payload["cell"], task.payload["index"]
+            llm = dict(
+                model=cell["model"],
+                temperature=cell["temperature"],
+                max_tokens=cell["max_tokens"],
+                llm_seed=params["seed"] + index,
+            )
+        try:
+            run_single_simulation(
+                params["to"],
+                params.get("company_name"),
+                job_id=task.job_id,
+                deadline=job["deadline"],
+                scenario=task.scenario,
+                rng=_run_rng(params["seed"], index),
+                **llm,
+                **_grading_kwargs(params),
+                **_company_kwargs(params),
+            )
+        except Exception as e:
+            # Líka SimulationStopped("deadline exceeded"), talið sem failed eins og í API ferlinu
+            return "failed", str(e)
+        return "done", None
+
+    def _reevaluate(self, task: task_queue.Task, job: dict):
+        """
+        Metur síðu af keyrslum eina í einu (samhliða verk job-sins gefa
+        concurrency_level) og skrifar einkunnirnar í einni UPDATE.
+        tests-raðirnar eru reiknaðar aftur í finalize_queue_job.
+        """
+        params, deadline = job["params"], job["deadline"]
+        rows = reevaluation_service.select_runs_by_ids(task.payload["run_ids"])
+        decisions = {}
+        if params.get("pregrade"):
+            # pregrader dregur inn numpy; aðeins sótt fyrir endurmat með pregrade
+            from . import pregrader
+
+            decisions = pregrader.pregrade(rows, params["pregrade_low"], params["pregrade_high"])
+
+        grades, failed, error = [], 0, None
+        for row in rows:
+            grade, score = decisions.get(row.id, (None, None))
+            if grade is not None:
+                grades.append((row.id, grade, None, "reference", score, None, None))
+                continue
+            if deadline is not None and time.time() >= deadline:
+                # Keyrslur sem náðust ekki eru hvorki metnar né taldar failed, eins og í API ferlinu
+                error = "deadline exceeded"
+                break
+            try:
+                grade, latency_ms, usage = evaluate_with_openai_rubric(
+                    company_name=row.company_name,
+                    scenario=row.scenario,
+                    input_email=row.input_email,
+                    generated_body=row.generated_body,
+                    timeout=_remaining(deadline),
+                )
+            except Exception as e:
+                print(f"Grading run {row.id} failed: {e}")
+                failed += 1
+                continue
+            usage = usage or {}
+            grades.append((
+                row.id, grade, latency_ms, "llm", score,
+                usage.get("prompt_tokens"), usage.get("cached_tokens"),
+            ))
+        reevaluation_service.write_grades(grades)
+        return ("cancelled" if error else "done"), error, (len(grades), failed)
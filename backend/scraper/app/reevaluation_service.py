@@ -0,0 +1,144 @@
+# app/reevaluation_service.py
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .database import SessionLocal
+
+# Keyrslur eru sóttar í síðum (keyset á id) og einkunnir skrifaðar í batches
+PAGE_SIZE = 500
+WRITE_BATCH_SIZE = 100
+WRITE_MAX_DELAY_S = 1.0
+
+# SIMULATION_BACKEND=queue: fjöldi keyrslna í hverju verki í simulation_tasks
+TASK_SIZE = int(os.getenv("REEVALUATION_TASK_SIZE", 50))
+
+_RUN_COLUMNS = """
+    r.id, r.test_id, r.company_name,
+    COALESCE(s.label, r.scenario) AS scenario,
+    COALESCE(s.input_email, r.input_email) AS input_email,
+    r.generated_body, r.reply_grade
+"""
+
+
+def _where(params: dict) -> Tuple[str, dict]:
+    # Bara keyrslur sem fengu svar; hinar hafa ekkert til að meta
+    where = ["r.generated_body IS NOT NULL"]
+    binds = {}
+    if params.get("test_id") is not None:
+        where.append("r.test_id = :test_id")
+        binds["test_id"] = params["test_id"]
+    if params.get("company"):
+        where.append("r.company_name = :company")
+        binds["company"] = params["company"]
+    if params.get("since"):
+        where.append("r.created_at >= :since")
+        binds["since"] = datetime.fromisoformat(params["since"])
+    if params.get("until"):
+        where.append("r.created_at < :until")
+        binds["until"] = datetime.fromisoformat(params["until"])
+    if params.get("only_ungraded"):
+        where.append("r.reply_grade IS NULL")
+    return " AND ".join(where), binds
+
+
+def count_runs(params: dict) -> int:
+    where, binds = _where(params)
+    with SessionLocal() as db:
+        return db.execute(text(f'SELECT COUNT(*) FROM "EmailTestRuns" r WHERE {where}'), binds).scalar()
+
+
+def select_runs_page(params: dict, after_id: int, limit: int = PAGE_SIZE) -> list:
+    where, binds = _where(params)
+    with SessionLocal() as db:
+        return db.execute(
+            text(f"""
+                SELECT {_RUN_COLUMNS}
+                FROM "EmailTestRuns" r
+                LEFT JOIN "Scenarios" s ON s.id = r.scenario_id
+                WHERE {where} AND r.id > :after_id
+                ORDER BY r.id
+                LIMIT :limit
+            """),
+            {**binds, "after_id": after_id, "limit": limit},
+        ).all()
+
+
+def select_run_ids(params: dict) -> List[int]:
+    # Aðeins id, svo API ferlið geti skipt endurmati í verk án þess að lesa svörin
+    where, binds = _where(params)
+    with SessionLocal() as db:
+        return [
+            r[0] for r in db.execute(
+                text(f'SELECT r.id FROM "EmailTestRuns" r WHERE {where} ORDER BY r.id'), binds
+            )
+        ]
+
+
+def select_runs_by_ids(run_ids: List[int]) -> list:
+    with SessionLocal() as db:
+        return db.execute(
+            text(f"""
+                SELECT {_RUN_COLUMNS}
+                FROM "EmailTestRuns" r
+                LEFT JOIN "Scenarios" s ON s.id = r.scenario_id
+                WHERE r.id = ANY(:ids)
+                ORDER BY r.id
+            """),
+            {"ids": list(run_ids)},
+        ).all()
+
+
+def affected_test_ids(params: dict) -> List[int]:
+    where, binds = _where(params)
+    with SessionLocal() as db:
+        return [
+            r[0] for r in db.execute(
+                text(f'SELECT DISTINCT r.test_id FROM "EmailTestRuns" r WHERE {where} AND r.test_id IS NOT NULL'),
+                binds,
+            )
+        ]
+
+
+def write_grades(batch: List[Tuple[int, float, Optional[int], str, Optional[float], Optional[int], Optional[int]]]):
+    """
+    Ein UPDATE fyrir allan batch-inn: (run_id, grade, grading_latency_ms, grade_source,
+    pregrade_score, grading_prompt_tokens, grading_cached_tokens).
+    """
+    if not batch:
+        return
+    ids, grades, latencies, sources, scores, prompt_tokens, cached_tokens = zip(*batch)
+    with SessionLocal() as db:
+        db.execute(
+            text("""
+                UPDATE "EmailTestRuns" AS r
+                SET reply_grade = v.grade,
+                    grading_latency_ms = v.latency_ms,
+                    grade_source = v.source,
+                    pregrade_score = v.score,
+                    grading_prompt_tokens = v.prompt_tokens,
+                    grading_cached_tokens = v.cached_tokens
+                FROM unnest(
+                    CAST(:ids AS integer[]),
+                    CAST(:grades AS numeric[]),
+                    CAST(:latencies AS integer[]),
+                    CAST(:sources AS text[]),
+                    CAST(:scores AS double precision[]),
+                    CAST(:prompt_tokens AS integer[]),
+                    CAST(:cached_tokens AS integer[])
+                ) AS v(id, grade, latency_ms, source, score, prompt_tokens, cached_tokens)
+                WHERE r.id = v.id
+            """),
+            {
+                "ids": list(ids),
+                "grades": list(grades),
+                "latencies": list(latencies),
+                "sources": list(sources),
+                "scores": list(scores),
+                "prompt_tokens": list(prompt_tokens),
+                "cached_tokens": list(cached_tokens),
+            },
+        )
+        db.commit()
@@ -0,0 +1,59 @@
+# app/responses.py
+from decimal import Decimal
+from typing import Iterable, List, Optional, Sequence
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    # Það sem orjson þekkir ekki sjálft; Numeric dálkar koma sem Decimal
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse sem serializar með orjson. Ef endpoint skilar þessu beint fer
+    svarið framhjá jsonable_encoder, sem er yfirleitt dýrari hlutinn; datetime,
+    date, UUID og Decimal eru serializuð hér.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """
+    fields=a,b,c úr query string -> ["a", "b", "c"] í röð allowed, eða None ef
+    ekkert var beðið um (öll svæði). Óþekkt svæði gefa 400.
+    """
+    if fields is None:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - set(allowed)
+    if unknown or not wanted:
+        raise HTTPException(
+            status_code=400,
+            detail=f"fields must be a comma separated subset of: {', '.join(allowed)}",
+        )
+    return [f for f in allowed if f in wanted]
+
+
+def pick_fields(rows: Iterable, fields: Optional[List[str]]) -> List[dict]:
+    # rows mega vera dicts eða SQLAlchemy RowMapping
+    if fields is None:
+        return [dict(row) for row in rows]
+    return [{f: row[f] for f in fields} for row in rows]
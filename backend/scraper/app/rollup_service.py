@@ -0,0 +1,144 @@
+# app/rollup_service.py
+import math
+from datetime import date
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+# Efri mörk latency hólfa í ms, sama og í run_rollup_bucket (migrations/015).
+# latency_buckets hefur einu hólfi meira: allt >= síðustu mörkum.
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000]
+
+# group_by gildi -> dálkur í run_rollups
+GROUP_COLUMNS = {
+    "day": "day",
+    "company": "company_name",
+    "model": "model_name",
+}
+
+PERCENTILES = (0.50, 0.90, 0.95, 0.99)
+
+
+def histogram_percentile(buckets: List[int], p: float) -> Optional[float]:
+    """
+    Áætlað percentile úr hólfatalningu, línuleg brúun innan hólfsins (eins og
+    histogram_quantile í Prometheus). Síðasta hólfið hefur engin efri mörk,
+    svo neðri mörk þess eru notuð.
+    """
+    total = sum(buckets)
+    if total <= 0:
+        return None
+    rank = p * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count > 0 and seen + count >= rank:
+            lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            if i >= len(LATENCY_BUCKETS_MS):
+                return float(lower)
+            upper = LATENCY_BUCKETS_MS[i]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _mean_std(n: int, total: float, sumsq: float):
+    if n <= 0:
+        return None, None
+    mean = total / n
+    if n < 2:
+        return mean, None
+    # Sama og stddev_samp; max() vegna fleytitöluskekkju
+    variance = max(0.0, (sumsq - total * total / n) / (n - 1))
+    return mean, math.sqrt(variance)
+
+
+def rollup_to_dict(row, group_by: List[str]) -> dict:
+    out = {}
+    for key in group_by:
+        value = row[GROUP_COLUMNS[key]]
+        out[key] = value.isoformat() if isinstance(value, date) else value
+
+    runs = row["run_count"]
+    buckets = [int(b) for b in (row["latency_buckets"] or [])]
+    avg_latency, latency_std = _mean_std(row["latency_count"], row["latency_sum"], row["latency_sumsq"])
+    avg_grade, grade_std = _mean_std(row["graded_count"], row["grade_sum"], row["grade_sumsq"])
+    out.update(
+        runs=runs,
+        failure_rate=(runs - row["generated_count"]) / runs if runs else None,
+        sent_ok_rate=row["sent_ok_count"] / runs if runs else None,
+        avg_latency_ms=avg_latency,
+        latency_stddev_ms=latency_std,
+        **{f"latency_p{int(p * 100)}_ms": histogram_percentile(buckets, p) for p in PERCENTILES},
+        graded_runs=row["graded_count"],
+        avg_reply_grade=avg_grade,
+        reply_grade_stddev=grade_std,
+        latency_histogram={
+            "bounds_ms": LATENCY_BUCKETS_MS,
+            "counts": buckets,
+        },
+    )
+    return out
+
+
+def query_rollups(db, group_by: List[str], company: Optional[str] = None, model: Optional[str] = None,
+                  since: Optional[date] = None, until: Optional[date] = None, limit: int = 1000) -> List[dict]:
+    """
+    Les bara run_rollups: kostnaðurinn fer eftir fjölda daga × fyrirtækja ×
+    líkana í síunni, ekki fjölda keyrslna.
+    """
+    unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+    if unknown or not group_by:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be one or more of {', '.join(GROUP_COLUMNS)}",
+        )
+    group_by = list(dict.fromkeys(group_by))
+
+    where = []
+    params: Dict[str, object] = {"limit": limit}
+    if company:
+        where.append("company_name = :company")
+        params["company"] = company
+    if model is not None:
+        # model="" eru keyrslur án model_name
+        where.append("model_name = :model")
+        params["model"] = model
+    if since:
+        where.append("day >= :since")
+        params["since"] = since
+    if until:
+        where.append("day < :until")
+        params["until"] = until
+
+    columns = ", ".join(GROUP_COLUMNS[g] for g in group_by)
+    # Nýjustu dagar fyrst, síðan hópar með flestar keyrslur
+    order = ", ".join(
+        (["day DESC"] if "day" in group_by else [])
+        + ["run_count DESC"]
+        + [GROUP_COLUMNS[g] for g in group_by if g != "day"]
+    )
+
+    rows = db.execute(
+        text(f"""
+            SELECT {columns},
+                   SUM(run_count)::bigint       AS run_count,
+                   SUM(generated_count)::bigint AS generated_count,
+                   SUM(sent_ok_count)::bigint   AS sent_ok_count,
+                   SUM(latency_count)::bigint   AS latency_count,
+                   SUM(latency_sum)             AS latency_sum,
+                   SUM(latency_sumsq)           AS latency_sumsq,
+                   run_rollup_sum(latency_buckets) AS latency_buckets,
+                   SUM(graded_count)::bigint    AS graded_count,
+                   SUM(grade_sum)               AS grade_sum,
+                   SUM(grade_sumsq)             AS grade_sumsq
+            FROM run_rollups
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY {columns}
+            HAVING SUM(run_count) > 0
+            ORDER BY {order}
+            LIMIT :limit
+        """),
+        params,
+    ).mappings().all()
+    return [rollup_to_dict(row, group_by) for row in rows]
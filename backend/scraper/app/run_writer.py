@@ -0,0 +1,220 @@
+# app/run_writer.py
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import List, Tuple
+
+from sqlalchemy import insert
+
+from .database import get_engine
+from .models import EmailTestRun
+
+BATCH_SIZE = int(os.getenv("RUN_WRITER_BATCH_SIZE", 50))
+MAX_DELAY_MS = int(os.getenv("RUN_WRITER_MAX_DELAY_MS", 50))
+# Hámarksbið eftir að röð sé skrifuð, svo kallari hangi ekki ef grunnurinn frýs
+WRITE_TIMEOUT_SECONDS = float(os.getenv("RUN_WRITER_TIMEOUT_SECONDS", 60))
+
+_table = EmailTestRun.__table__
+# id og created_at koma úr grunninum (RETURNING)
+_COLUMNS = [c for c in _table.columns if c.name not in ("id", "created_at")]
+
+
+def row_values(test_run: EmailTestRun) -> dict:
+    """
+    Breytir transient EmailTestRun í dict með öllum dálkum, svo allar raðir
+    í sama batch hafi sömu lykla (krafa fyrir multi-row INSERT).
+    """
+    values = {}
+    for col in _COLUMNS:
+        value = getattr(test_run, col.key)
+        if value is None and col.default is not None and col.default.is_scalar:
+            value = col.default.arg
+        values[col.key] = value
+    return values
+
+
+def _insert_rows(rows: List[dict]) -> List[Tuple[int, object]]:
+    stmt = insert(_table).returning(
+        _table.c.id, _table.c.created_at, sort_by_parameter_order=True
+    )
+    with get_engine().begin() as conn:
+        return [(r.id, r.created_at) for r in conn.execute(stmt, rows)]
+
+
+def _resolve(future: Future, result=None, exception: Exception = None):
+    # close() getur hafa fellt future á undan writer þræðinum, eða öfugt
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class RunWriteBehind:
+    """
+    Safnar kláruðum EmailTestRuns og skrifar þær í multi-row INSERT ... RETURNING id,
+    annaðhvort þegar BATCH_SIZE raðir eru komnar eða MAX_DELAY_MS eftir fyrstu röð.
+
+    submit() skilar Future sem fær (id, created_at) þegar röðin er komin í grunninn.
+    Future sem er hætt við (cancel()) áður en batch-ið er tekið er aldrei skrifað.
+    close() tæmir biðröðina áður en hætt er, og eftir close() er skrifað beint.
+    Ef það tekst ekki innan timeout fá raðir sem bíða enn exception og close()
+    skilar þeim.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, max_delay_ms: int = MAX_DELAY_MS,
+                 write_timeout: float = WRITE_TIMEOUT_SECONDS):
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay_ms / 1000
+        self.write_timeout = write_timeout
+        self._queue: "queue.Queue[Tuple[dict, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._in_flight: List[Tuple[dict, Future]] = []
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="run-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, values: dict) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_running_or_notify_cancel()
+                self._write([(values, future)])
+                return future
+            self._ensure_started()
+            self._queue.put((values, future))
+        return future
+
+    def write(self, test_run: EmailTestRun) -> EmailTestRun:
+        """
+        Blocking: bíður eftir að röðin sé skrifuð (í mesta lagi write_timeout
+        sekúndur, annars TimeoutError) og setur id/created_at á hlutinn.
+
+        Við timeout er röðin tekin úr biðröðinni, svo kallari sem telur hana
+        misheppnaða finni hana ekki seinna í grunninum. Ef INSERT-ið er þegar
+        byrjað er beðið eftir því í annað write_timeout.
+        """
+        future = self.submit(row_values(test_run))
+        try:
+            run_id, created_at = future.result(timeout=self.write_timeout)
+        except CancelledError:
+            # close() gafst upp á biðröðinni áður en röðin var skrifuð
+            raise TimeoutError("EmailTestRun was not written before the writer closed; discarded")
+        except FutureTimeoutError:
+            if future.cancel():
+                raise TimeoutError(f"EmailTestRun was not written within {self.write_timeout}s; discarded")
+            try:
+                run_id, created_at = future.result(timeout=self.write_timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(
+                    f"EmailTestRun insert still running after {2 * self.write_timeout}s; it may still be written"
+                )
+        test_run.id = run_id
+        test_run.created_at = created_at
+        return test_run
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # False ef write() hætti við röðina (timeout); eftir þetta er ekki hægt að hætta við
+            if not item[1].set_running_or_notify_cancel():
+                continue
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                if nxt[1].set_running_or_notify_cancel():
+                    batch.append(nxt)
+
+            self._in_flight = batch
+            self._write(batch)
+            self._in_flight = []
+            if stop:
+                return
+
+    def _write(self, batch: List[Tuple[dict, Future]]):
+        try:
+            results = _insert_rows([values for values, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _resolve(batch[0][1], exception=e)
+                return
+            # Ein gölluð röð á ekki að fella hinar: reynum hverja fyrir sig
+            print(f"Batch insert of {len(batch)} EmailTestRuns failed, retrying row by row: {e}")
+            for item in batch:
+                self._write([item])
+            return
+
+        for (_, future), result in zip(batch, results):
+            _resolve(future, result=result)
+
+    def close(self, timeout: float = 30.0) -> List[dict]:
+        """
+        Skrifar allt sem er í biðröðinni og stöðvar þráðinn. Skilar röðunum
+        (values) sem voru ekki skrifaðar af því að þráðurinn kláraði ekki
+        innan timeout; tómur listi ef allt komst í grunninn.
+        """
+        with self._lock:
+            if self._closed:
+                return []
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is None:
+            return []
+        thread.join(timeout)
+        if not thread.is_alive():
+            return []
+
+        # Grunnurinn svarar ekki: látum alla sem bíða vita í stað þess að þeir hangi
+        error = TimeoutError(f"EmailTestRun writer did not finish within {timeout}s")
+        unwritten: List[dict] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            values, future = item
+            # Röðin er aldrei tekin af þræðinum eftir cancel()
+            if future.cancel():
+                unwritten.append(values)
+        # Þráðurinn hættir þá þegar (ef) núverandi batch klárast
+        self._queue.put(None)
+        in_flight = list(self._in_flight)
+        for _, future in in_flight:
+            _resolve(future, exception=error)
+        print(f"run_writer.close: {len(unwritten)} EmailTestRuns were not written and "
+              f"{len(in_flight)} were still being inserted: {error}")
+        for values in unwritten:
+            print(f"run_writer.close: not written: job_id={values.get('job_id')} "
+                  f"test_id={values.get('test_id')} company={values.get('company_name')}")
+        return unwritten
+
+
+run_writer = RunWriteBehind()
+atexit.register(run_writer.close)
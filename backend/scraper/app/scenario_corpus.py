@@ -0,0 +1,164 @@
+# app/scenario_corpus.py
+import bisect
+import csv
+import json
+import os
+import random
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from fastapi import HTTPException
+
+# Scenario skrár (.jsonl eða .csv) eru í þessari möppu og vísað í þær með nafni
+CORPUS_DIR = Path(os.getenv("SCENARIO_CORPUS_DIR", Path(__file__).resolve().parent.parent / "scenarios"))
+DEFAULT_CORPUS = os.getenv("SCENARIO_CORPUS", "default.jsonl")
+
+STRATIFY_KEYS = ("category", "company")
+
+
+def corpus_path(name: str) -> Path:
+    """
+    Nafn á corpus skrá -> slóð. Bara skráarnöfn í CORPUS_DIR eru leyfð.
+    """
+    if not name or Path(name).name != name or Path(name).suffix not in (".jsonl", ".csv"):
+        raise HTTPException(status_code=400, detail="corpus must be a .jsonl or .csv file name in the scenario directory")
+    path = CORPUS_DIR / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail=f"Scenario corpus not found: {name}")
+    return path
+
+
+def _normalize(raw: dict, line_no: int) -> dict:
+    input_email = (raw.get("input_email") or "").strip()
+    if not input_email:
+        raise ValueError(f"scenario on line {line_no} has no input_email")
+    weight = float(raw.get("weight") or 1.0)
+    if weight <= 0:
+        raise ValueError(f"scenario on line {line_no} has weight <= 0")
+    return {
+        "id": str(raw.get("id") or line_no),
+        "category": raw.get("category") or None,
+        "company": raw.get("company") or None,
+        "weight": weight,
+        "input_email": input_email,
+    }
+
+
+def iter_scenarios(path: Path) -> Iterator[dict]:
+    """
+    Les scenarios eitt í einu úr JSONL eða CSV (dálkar: id, category, company,
+    weight, input_email). Skráin er aldrei lesin öll inn í minni.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix == ".csv":
+            for i, row in enumerate(csv.DictReader(f), start=1):
+                yield _normalize(row, i)
+        else:
+            for i, line in enumerate(f, start=1):
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield _normalize(json.loads(line), i)
+
+
+def _stratum(scenario: dict, stratify_by: Sequence[str]) -> tuple:
+    return tuple(scenario[k] for k in stratify_by)
+
+
+def _allocate(n: int, shares: Dict[tuple, float]) -> Dict[tuple, int]:
+    """
+    Skiptir n úrtökum á strata í hlutfalli við shares (largest remainder),
+    svo hvert stratum fái floor eða ceil af sínum hlut.
+    """
+    total = sum(shares.values())
+    exact = {k: n * v / total for k, v in shares.items()}
+    counts = {k: int(v) for k, v in exact.items()}
+    leftover = n - sum(counts.values())
+    for k in sorted(exact, key=lambda k: (-(exact[k] - counts[k]), str(k)))[:leftover]:
+        counts[k] += 1
+    return counts
+
+
+def sample_plan(
+    corpus: str,
+    n: int,
+    seed: int,
+    stratify_by: Sequence[str] = (),
+    strata: str = "proportional",
+) -> List[dict]:
+    """
+    n scenarios dregin með skilum (weighted) úr corpus, alltaf þau sömu fyrir
+    sama corpus + seed + stillingar.
+
+    stratify_by: t.d. ("category",) eða ("category", "company"). Úrtökunum er
+    skipt á strata fyrirfram svo hvert stratum fái sinn hlut nákvæmlega, í stað
+    þess að treysta á heppni:
+      strata="proportional": í hlutfalli við samanlagða vigt stratum-sins
+      strata="equal":        jafnt á öll strata
+
+    Tvær umferðir yfir skrána: sú fyrri safnar bara vigtum hvers stratum, sú
+    seinni heldur aðeins þeim scenarios sem voru dregin. Minnið er O(strata + n).
+    """
+    if n <= 0:
+        return []
+    unknown = set(stratify_by) - set(STRATIFY_KEYS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"stratify_by must be among {', '.join(STRATIFY_KEYS)}")
+    if strata not in ("proportional", "equal"):
+        raise HTTPException(status_code=400, detail="strata must be 'proportional' or 'equal'")
+
+    path = corpus_path(corpus)
+    rng = random.Random(seed)
+
+    # 1) Heildarvigt hvers stratum
+    weights: Dict[tuple, float] = {}
+    try:
+        for scenario in iter_scenarios(path):
+            key = _stratum(scenario, stratify_by)
+            weights[key] = weights.get(key, 0.0) + scenario["weight"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario corpus {corpus}: {e}")
+    if not weights:
+        raise HTTPException(status_code=400, detail=f"Scenario corpus {corpus} is empty")
+
+    shares = weights if strata == "proportional" else {k: 1.0 for k in weights}
+    counts = _allocate(n, shares)
+
+    # Hvert úrtak er punktur á uppsafnaðri vigt stratum-sins; raðaðir punktar
+    # leyfa að finna öll úrtök í einni umferð.
+    targets: Dict[tuple, List[float]] = {
+        key: sorted(rng.random() * weights[key] for _ in range(count))
+        for key, count in sorted(counts.items(), key=lambda kv: str(kv[0]))
+        if count
+    }
+
+    # 2) Sækja dregin scenarios
+    picked: List[dict] = []
+    cumulative: Dict[tuple, float] = {key: 0.0 for key in targets}
+    position: Dict[tuple, int] = {key: 0 for key in targets}
+    for scenario in iter_scenarios(path):
+        key = _stratum(scenario, stratify_by)
+        if key not in targets:
+            continue
+        hi = cumulative[key] + scenario["weight"]
+        pts = targets[key]
+        end = bisect.bisect_left(pts, hi, lo=position[key])
+        for _ in range(end - position[key]):
+            picked.append(scenario)
+        position[key] = end
+        cumulative[key] = hi
+
+    # Floating point afgangur: punktar við allra efstu mörk fara á síðasta scenario
+    if len(picked) < n:
+        last: Dict[tuple, dict] = {}
+        for scenario in iter_scenarios(path):
+            last[_stratum(scenario, stratify_by)] = scenario
+        for key, pts in targets.items():
+            picked.extend([last[key]] * (len(pts) - position[key]))
+
+    rng.shuffle(picked)
+    return picked
+
+
+def new_seed() -> int:
+    # Nógu lítið til að passa í BIGINT og í OpenAI seed
+    return random.SystemRandom().randrange(2 ** 31)
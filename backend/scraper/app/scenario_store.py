@@ -0,0 +1,110 @@
+# app/scenario_store.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+from .database import SessionLocal
+
+# Hámarksfjöldi scenarios í minni. Hermanir nota örfá; manual-generate getur
+# búið til ótal einstök, svo elstu detta út (LRU).
+MAX_CACHED = 4096
+
+
+def content_hash(label: Optional[str], input_email: str) -> str:
+    # Sama og í migrations/012: sha256(COALESCE(scenario, '') || E'\n' || input_email)
+    return hashlib.sha256(f"{label or ''}\n{input_email}".encode("utf-8")).hexdigest()
+
+
+class ScenarioInterner:
+    """
+    Process-wide intern cache fyrir "Scenarios" töfluna.
+
+    intern() skilar id fyrir (label, input_email); fyrsta kall fyrir nýjan texta
+    skrifar hann (INSERT ... ON CONFLICT), öll síðari eru bara dict uppfletting.
+    resolve()/resolve_many() fara hina leiðina fyrir svör í API.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._texts: "OrderedDict[int, Tuple[Optional[str], str]]" = OrderedDict()
+
+    def _remember(self, scenario_id: int, digest: str, label: Optional[str], input_email: str):
+        with self._lock:
+            self._ids[digest] = scenario_id
+            self._ids.move_to_end(digest)
+            self._texts[scenario_id] = (label, input_email)
+            self._texts.move_to_end(scenario_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            while len(self._texts) > self.max_size:
+                self._texts.popitem(last=False)
+
+    def intern(self, label: Optional[str], input_email: str) -> int:
+        digest = content_hash(label, input_email)
+        with self._lock:
+            scenario_id = self._ids.get(digest)
+            if scenario_id is not None:
+                self._ids.move_to_end(digest)
+                return scenario_id
+
+        # Tveir þræðir geta lent hér samtímis fyrir sama texta; ON CONFLICT sér um það
+        with SessionLocal() as db:
+            scenario_id = db.execute(
+                text("""
+                    INSERT INTO "Scenarios" (content_hash, label, input_email)
+                    VALUES (:hash, :label, :input_email)
+                    ON CONFLICT (content_hash) DO NOTHING
+                    RETURNING id
+                """),
+                {"hash": digest, "label": label, "input_email": input_email},
+            ).scalar()
+            if scenario_id is None:
+                scenario_id = db.execute(
+                    text('SELECT id FROM "Scenarios" WHERE content_hash = :hash'), {"hash": digest}
+                ).scalar()
+            db.commit()
+
+        self._remember(scenario_id, digest, label, input_email)
+        return scenario_id
+
+    def resolve_many(self, ids: Iterable[int]) -> Dict[int, Tuple[Optional[str], str]]:
+        """
+        {scenario_id: (label, input_email)}; það sem vantar í cache er sótt í einni fyrirspurn.
+        """
+        wanted = {i for i in ids if i is not None}
+        found = {}
+        with self._lock:
+            for i in wanted:
+                if i in self._texts:
+                    found[i] = self._texts[i]
+        missing = wanted - found.keys()
+        if missing:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    text('SELECT id, content_hash, label, input_email FROM "Scenarios" WHERE id = ANY(:ids)'),
+                    {"ids": sorted(missing)},
+                ).all()
+            for row in rows:
+                self._remember(row.id, row.content_hash, row.label, row.input_email)
+                found[row.id] = (row.label, row.input_email)
+        return found
+
+    def resolve(self, scenario_id: Optional[int]) -> Tuple[Optional[str], Optional[str]]:
+        return self.resolve_many([scenario_id]).get(scenario_id, (None, None))
+
+    def for_run(self, test_run) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (scenario, input_email) fyrir EmailTestRun. Eldri raðir sem eru ekki
+        komnar með scenario_id hafa textann enn í eigin dálkum.
+        """
+        if test_run.scenario_id is not None:
+            return self.resolve(test_run.scenario_id)
+        return test_run.scenario, test_run.input_email
+
+
+scenario_interner = ScenarioInterner()
@@ -1,7 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+from .metrics import SCRAPE_FETCH_LATENCY, SCRAPE_PARSE_LATENCY, timed
+from .chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, NearDuplicateIndex, iter_chunks, iter_words
 from urllib.parse import urljoin
 
+# Síður sem textinn er sóttur af, forsíðan og "um okkur" síðan meðtaldar;
+# fleiri síður þýða fleiri HTTP köll á hvert scrape
+SCRAPE_MAX_PAGES = int(os.getenv("SCRAPE_MAX_PAGES", 2))
+
 def normalize_url(url: str) -> str:
     # ef notandinn skrifar bara "visir.is" þá bætum við https:// fyrir framan
     if not url.startswith("http://") and not url.startswith("https://"):
@@ -23,13 +28,21 @@ def find_about_page(base_url, soup):
 
 
 def extract_clean_text(soup):
+    return " ".join(extract_text_blocks(soup))
+
+def extract_text_blocks(soup):
     # fjarlægjum script/style o.fl.
     for tag in soup(["script", "style", "nav", "footer", "header"]):
         tag.extract()
 
-    text = soup.get_text(separator=" ", strip=True)
-    cleaned = " ".join(text.split())
-    return cleaned
+    # Ein lína á hvern texta-hnút; endurtekinn texti milli síðna (cookie borðar,
+    # tengiliðaupplýsingar) er þá heill block sem NearDuplicateIndex þekkir
+    blocks = []
+    for line in soup.get_text(separator="\n").splitlines():
+        line = " ".join(line.split())
+        if line:
+            blocks.append(line)
+    return blocks
 
 def get_internal_links(url, soup):
     base = url.split("//")[1].split("/")[0]
@@ -40,18 +53,11 @@ def get_internal_links(url, soup):
         if base in href:
             links.append(href)
 
-    return list(set(links))
-
-def chunk_text(text, max_length=800):
-    words = text.split()
-    chunks = []
-
-    for i in range(0, len(words), max_length):
-        chunk = " ".join(words[i:i+max_length])
-        if len(chunk) > 50:  # tryggjum að chunk sé ekki of stuttur
-            chunks.append(chunk)
+    return sorted(set(links))
 
-    return chunks
+def chunk_text(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    # Ein síða án tvítekningaleitar; sjá scrape_company fyrir heilan vef
+    return [c for c in iter_chunks(iter_words([text]), max_tokens, overlap_tokens) if len(c) > 50]
 
 def scrape_company_http(request):
     data = request.get_json()
@@ -59,16 +65,22 @@ def scrape_company_http(request):
     return scrape_company(url)
 
 def scrape_company(url: str):
+    # requests og bs4 eru sótt við fyrsta scrape en ekki þegar API ferlið ræsir
+    import requests
+    from bs4 import BeautifulSoup
+
     url = normalize_url(url)
 
     # 1. Fetch HTML
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        with timed(SCRAPE_FETCH_LATENCY):
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
     except Exception as e:
         return {"error": f"Failed to fetch URL: {str(e)}"}
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    with timed(SCRAPE_PARSE_LATENCY):
+        soup = BeautifulSoup(response.text, "html.parser")
 
     # 2. Basic metadata
     title = soup.title.string.strip() if soup.title else ""
@@ -82,19 +94,45 @@ def scrape_company(url: str):
     favicon = soup.find("link", rel="icon")
     favicon_url = urljoin(url, favicon["href"]) if favicon and favicon.get("href") else ""
 
-    # 3. Extract ABOUT PAGE TEXT
-    try:
-        about_url = find_about_page(url, soup)
-        about_response = requests.get(about_url, timeout=10)
-        about_response.raise_for_status()
-
-        about_soup = BeautifulSoup(about_response.text, "html.parser")
-        clean_text = extract_clean_text(about_soup)
-        chunks = chunk_text(clean_text)
-
-    except Exception:
-        clean_text = ""
-        chunks = []
+    # 3. Texti af "um okkur" síðunni, forsíðunni og öðrum innri síðum (SCRAPE_MAX_PAGES).
+    # Síðurnar eru sóttar ein í einu eftir því sem chunker-inn les; blocks og
+    # chunks sem hafa sést á fyrri síðu eru felld út (app/chunker.py)
+    about_url = find_about_page(url, soup)
+    other_urls = [link for link in get_internal_links(url, soup) if link not in (url, about_url)]
+    page_urls = ([about_url] if about_url != url else []) + other_urls
+
+    def pages():
+        fetched = 1   # forsíðan
+        for page_url in page_urls:
+            if fetched >= SCRAPE_MAX_PAGES:
+                break
+            fetched += 1
+            try:
+                with timed(SCRAPE_FETCH_LATENCY):
+                    page_response = requests.get(page_url, timeout=10)
+                    page_response.raise_for_status()
+                with timed(SCRAPE_PARSE_LATENCY):
+                    page_blocks = extract_text_blocks(BeautifulSoup(page_response.text, "html.parser"))
+            except Exception:
+                continue
+            yield page_blocks
+        # Blocks reiknuð inni í timed en yield utan við, svo dedupe og chunking
+        # forsíðunnar teljist ekki með í parse tímanum
+        with timed(SCRAPE_PARSE_LATENCY):
+            home_blocks = extract_text_blocks(soup)
+        yield home_blocks
+
+    kept_blocks = []
+
+    def new_blocks():
+        block_index = NearDuplicateIndex()
+        for page_blocks in pages():
+            for block in block_index.filter(page_blocks):
+                kept_blocks.append(block)
+                yield block
+
+    chunks = list(NearDuplicateIndex().filter(iter_chunks(iter_words(new_blocks()))))
+    clean_text = " ".join(kept_blocks)
 
     # 4. FALLBACK → You place THIS here
     if not clean_text or len(clean_text) < 50:
@@ -108,6 +146,7 @@ def scrape_company(url: str):
         "company_description": description,
         "keywords": keywords,
         "favicon": favicon_url,
+        "company_information": clean_text,
         "clean_text": clean_text,
         "text_chunks": chunks
     }
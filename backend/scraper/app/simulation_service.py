@@ -1,170 +1,557 @@
 # app/simulation_service.py
-import json, random
-from datetime import datetime
-from typing import List, Optional, Tuple
+import json, os, random, threading, time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
 from sqlalchemy import text
 
-from .database import SessionLocal
 from .models import EmailTestRun
-from .llm_service import generate_reply_with_openai, evaluate_with_openai_rubric
+from .run_writer import run_writer
+from .tracing import RunTrace
+from .metrics import SIMULATIONS_IN_FLIGHT
+from .company_cache import company_catalog
+from .scenario_corpus import DEFAULT_CORPUS, sample_plan
+from .scenario_store import scenario_interner
+from .llm_service import (
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_TEMPERATURE,
+    MODEL_NAME,
+    generate_and_grade_with_openai,
+    generate_reply_with_openai,
+    evaluate_with_openai_rubric,
+)
+from .prompts import get_template
+
+# "judge": svar og einkunn í tveimur köllum (sjálfgefið)
+# "self":  eitt structured output kall skilar svari og sjálfsmati
+GRADING_MODES = ("judge", "self")
+
+class SimulationStopped(Exception):
+    """Keyrslan var stöðvuð (cancel eða deadline) áður en hún kláraðist."""
+
+
+# Hámarks timeout á LLM kalli í background job, líka þegar það hefur ekkert
+# deadline, svo cancel þurfi aldrei að bíða endalaust eftir þræði
+JOB_CALL_TIMEOUT_SECONDS = float(os.getenv("SIMULATION_CALL_TIMEOUT_SECONDS", 120))
 
-SCENARIOS = [
-    "Subject: Inquiry about your products\nDear team, I would like to know more about your skincare line...",
-    "Subject: Complaint about delivery\nHello, my recent order arrived damaged...",
-    "Subject: Question about ingredients\nHi, can you tell me if your products are suitable for sensitive skin?"
-]
 
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    # deadline er time.time() gildi; skilar sekúndum sem eftir eru
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise SimulationStopped("deadline exceeded")
+    return remaining
 
+
+def _call_timeout(deadline: Optional[float], stop_event: Optional[threading.Event]) -> Optional[float]:
+    # Keyrslur úr jobs (stop_event gefið) fá alltaf timeout; /simulate-email ekki
+    remaining = _remaining(deadline)
+    if stop_event is None:
+        return remaining
+    return JOB_CALL_TIMEOUT_SECONDS if remaining is None else min(remaining, JOB_CALL_TIMEOUT_SECONDS)
+
+
+@SIMULATIONS_IN_FLIGHT.track_inprogress()
 def run_single_simulation(
     to_email: str,
     company_name: Optional[str] = None,
+    job_id: Optional[int] = None,
+    deadline: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None,
+    scheduled_at: Optional[datetime] = None,
+    trace: Optional[RunTrace] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    llm_seed: Optional[int] = None,
+    rng: Optional[random.Random] = None,
+    scenario: Optional[dict] = None,
+    grading: str = "judge",
+    judge_sample_rate: float = 0.0,
+    prompt_version: Optional[str] = None,
+    company_weights: Optional[Dict[str, float]] = None,
 ) -> Tuple[EmailTestRun, int, int]:
-    db = SessionLocal()
-    try:
-        # 1) choose company
+    """
+    Ein hermun: velur fyrirtæki og scenario, býr til svar og gefur einkunn.
+
+    deadline (time.time()) og stop_event eru notuð af background jobs: LLM köll
+    fá timeout sem rennur út á deadline (í mesta lagi JOB_CALL_TIMEOUT_SECONDS),
+    og ef stop_event er sett eftir að svarið er komið er einkunnagjöf sleppt
+    (svarið er samt vistað).
+
+    scheduled_at er hvenær open-loop álagsprófun ætlaði keyrslunni að byrja;
+    started_at er skráð hér svo seinkun vegna biðraðar sjáist.
+
+    trace: spans fyrir hvert skref. Kallandi getur búið hana til fyrr til að
+    mæla bið eftir semaphore/threadpool; tímarnir eru vistaðir í stage_timings.
+
+    model/temperature/max_tokens/llm_seed fara beint í generate kallið (None =
+    sjálfgefið). rng ræður vali á fyrirtæki og scenario, svo model matrix getur
+    látið hverja stillingu fá nákvæmlega sömu beiðnir.
+
+    scenario kemur úr scenario_corpus.sample_plan (jobs draga öll scenarios
+    fyrirfram með seed). Ef það er ekki gefið er eitt dregið úr sjálfgefna corpus.
+    Fyrirtæki scenario-sins er notað ef company_name er ekki gefið. Annars er
+    fyrirtæki dregið úr company_catalog, eftir company_weights ef þær eru gefnar.
+
+    grading="self": svar og sjálfsmat koma úr einu kalli (helmingi færri köll).
+    judge_sample_rate af þeim keyrslum (dregið með rng) fara samt líka til
+    óháða dómarans; þá er reply_grade einkunn dómarans og self_grade geymt til
+    samanburðar (self_grade_bias/self_grade_mae í samantekt).
+
+    prompt_version velur sniðmát í app/prompts.py fyrir bæði svar og dómara;
+    cached_tokens úr hvoru kalli eru vistuð á keyrslunni.
+    """
+    if stop_event is not None and stop_event.is_set():
+        raise SimulationStopped("job stopped")
+    started_at = datetime.now(timezone.utc)
+    trace = trace or RunTrace(job_id=job_id)
+    rng = rng or random
+    model = model or MODEL_NAME
+    temperature = DEFAULT_TEMPERATURE if temperature is None else temperature
+    max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+    prompt_version = get_template("reply", prompt_version).version
+    llm_settings = dict(model_name=model, temperature=temperature, max_tokens=max_tokens, llm_seed=llm_seed,
+                        prompt_version=prompt_version)
+
+    # 1) choose company
+    with trace.span("pick_company"):
         if company_name:
             chosen_company = company_name
+        elif scenario is not None and scenario.get("company"):
+            chosen_company = scenario["company"]
         else:
-            result = db.execute(
-                text('SELECT "CompanyName" FROM "Companies" ORDER BY RANDOM() LIMIT 1')
-            )
-            row = result.fetchone()
-            if not row:
+            # O(1) úr company_catalog í stað ORDER BY RANDOM() á hverju emaili
+            if company_weights:
+                chosen_company = company_catalog.weighted_company(company_weights, rng)
+            else:
+                chosen_company = company_catalog.random_company(rng)
+            if not chosen_company:
+                trace.finish(error="no companies")
                 raise HTTPException(status_code=400, detail="No companies available in database")
-            chosen_company = row[0]
 
-        # 2) scenario
-        input_email = random.choice(SCENARIOS)
-        scenario = input_email.split("\n", 1)[0].strip()
-
-        # 3) LLM reply
-        try:
-            subj, body, model_name, llm_latency_ms = generate_reply_with_openai(
-                company_name=chosen_company,
-                input_email=input_email,
-            )
-        except HTTPException:
-            test_run = EmailTestRun(
-                company_name=chosen_company,
-                scenario=scenario,
-                input_email=input_email,
-                generated_subject=None,
-                generated_body=None,
-                model_name="gpt-4.1-mini",
-                latency_ms=None,
-                sent_ok=False,
-            )
-            db.add(test_run)
-            db.commit()
-            db.refresh(test_run)
-            raise
-
-        total_latency_ms = llm_latency_ms
+    # 2) scenario
+    with trace.span("pick_scenario"):
+        if scenario is None:
+            scenario = sample_plan(DEFAULT_CORPUS, 1, rng.randrange(2 ** 31))[0]
+        input_email = scenario["input_email"]
+        scenario_label = input_email.split("\n", 1)[0].strip()
+        # Bara dict uppfletting nema í fyrsta sinn sem þessi texti sést
+        scenario_id = scenario_interner.intern(scenario_label, input_email)
 
+    # 3) LLM reply
+    timeout = _call_timeout(deadline, stop_event)
+    self_grade = None
+    try:
+        with trace.span("generate", model=model, grading=grading):
+            if grading == "self":
+                subj, body, self_grade, model_name, llm_latency_ms, usage = generate_and_grade_with_openai(
+                    company_name=chosen_company,
+                    scenario=scenario_label,
+                    input_email=input_email,
+                    timeout=timeout,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    seed=llm_seed,
+                    prompt_version=prompt_version,
+                )
+            else:
+                subj, body, model_name, llm_latency_ms, usage = generate_reply_with_openai(
+                    company_name=chosen_company,
+                    input_email=input_email,
+                    timeout=timeout,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    seed=llm_seed,
+                    prompt_version=prompt_version,
+                )
+    except Exception as e:
+        # Mistókst keyrslan er hún samt skráð (án svars) svo hún sjáist í samantekt
         test_run = EmailTestRun(
             company_name=chosen_company,
-            scenario=scenario,
-            input_email=input_email,
-            generated_subject=subj,
-            generated_body=body,
-            model_name="gpt-4.1-mini",
-            latency_ms=total_latency_ms,
+            scenario_id=scenario_id,
+            generated_subject=None,
+            generated_body=None,
+            latency_ms=None,
             sent_ok=False,
+            job_id=job_id,
+            scheduled_at=scheduled_at,
+            started_at=started_at,
+            **llm_settings,
         )
+        _write_traced(test_run, trace, error=str(e))
+        raise
 
-        # grading
-        try:
-            grade, _ = evaluate_with_openai_rubric(
+    total_latency_ms = llm_latency_ms
+
+    test_run = EmailTestRun(
+        company_name=chosen_company,
+        scenario_id=scenario_id,
+        generated_subject=subj,
+        generated_body=body,
+        latency_ms=total_latency_ms,
+        sent_ok=False,
+        job_id=job_id,
+        scheduled_at=scheduled_at,
+        started_at=started_at,
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        cached_tokens=usage["cached_tokens"],
+        self_grade=self_grade,
+        **llm_settings,
+    )
+
+    if self_grade is not None:
+        test_run.reply_grade = self_grade
+        test_run.grade_source = "self"
+        # Úrtak fyrir kvörðun: aðeins judge_sample_rate fer líka til dómarans
+        if rng.random() >= judge_sample_rate:
+            _write_traced(test_run, trace)
+            return test_run, total_latency_ms, llm_latency_ms
+
+    # grading
+    try:
+        if stop_event is not None and stop_event.is_set():
+            raise SimulationStopped("job stopped before grading")
+        with trace.span("grade"):
+            grade, grading_latency_ms, grading_usage = evaluate_with_openai_rubric(
                 company_name=chosen_company,
-                scenario=scenario,
+                scenario=scenario_label,
                 input_email=input_email,
                 generated_body=body,
+                timeout=_call_timeout(deadline, stop_event),
+                prompt_version=prompt_version,
             )
-            test_run.reply_grade = grade
-        except Exception as e:
-            print(f"LLM grading failed: {e}")
+        test_run.reply_grade = grade
+        test_run.grading_latency_ms = grading_latency_ms
+        test_run.grading_prompt_tokens = grading_usage["prompt_tokens"]
+        test_run.grading_cached_tokens = grading_usage["cached_tokens"]
+        test_run.grade_source = "llm"
+    except Exception as e:
+        print(f"LLM grading failed: {e}")
 
-        db.add(test_run)
-        db.commit()
-        db.refresh(test_run)
+    _write_traced(test_run, trace)
 
-        return test_run, total_latency_ms, llm_latency_ms
+    return test_run, total_latency_ms, llm_latency_ms
 
+
+def _write_traced(test_run: EmailTestRun, trace: RunTrace, **attributes):
+    """
+    Vistar keyrsluna með stage_timings og lýkur trace-inu.
+
+    db_write er mælt en getur eðli málsins samkvæmt ekki verið í röðinni sjálfri;
+    það er í útfluttu spönunum og í test_run.stage_timings eftir skrifin.
+    """
+    test_run.stage_timings = trace.stage_timings
+    try:
+        # Skrifað í batch með öðrum keyrslum (multi-row INSERT ... RETURNING id)
+        with trace.span("db_write"):
+            run_writer.write(test_run)
     finally:
-        db.close()
+        test_run.stage_timings = trace.stage_timings
+        trace.finish(
+            run_id=test_run.id,
+            company=test_run.company_name,
+            model=test_run.model_name,
+            job_id=test_run.job_id,
+            **attributes,
+        )
 
 
-def create_test_summary_from_run_ids(db, run_ids: List[int], concurrency_level: int):
-    if not run_ids:
-        raise HTTPException(status_code=400, detail="run_ids cannot be empty")
+# Frammistöðutölur sem eru vistaðar í hverri tests-röð (sjá migrations/005)
+TEST_METRIC_COLUMNS = [
+    "latency_p50_ms",
+    "latency_p90_ms",
+    "latency_p95_ms",
+    "latency_p99_ms",
+    "latency_max_ms",
+    "avg_generation_ms",
+    "avg_grading_ms",
+    "grading_p95_ms",
+    "throughput_rps",
+    "failure_count",
+    "grade_distribution",
+    "model_name",
+    "temperature",
+    "max_tokens",
+    "avg_prompt_tokens",
+    "avg_completion_tokens",
+    "total_tokens",
+    "self_graded_runs",
+    "calibration_runs",
+    "self_grade_bias",
+    "self_grade_mae",
+    "prompt_version",
+    "avg_cached_tokens",
+    "cache_hit_rate",
+    "cached_token_ratio",
+    "grading_cache_hit_rate",
+    "latency_cache_hit_ms",
+    "latency_cache_miss_ms",
+    "grading_latency_cache_hit_ms",
+    "grading_latency_cache_miss_ms",
+]
 
-    runs = (
-        db.query(EmailTestRun)
-        .filter(EmailTestRun.id.in_(run_ids))
-        .all()
-    )
-    if not runs:
-        raise HTTPException(status_code=404, detail="No EmailTestRuns found for given IDs")
+TEST_SUMMARY_COLUMNS = [
+    "companies",
+    "num_emails",
+    "started_at",
+    "finished_at",
+    "total_requests",
+    "avg_reply_grade",
+] + TEST_METRIC_COLUMNS
 
-    companies = sorted({r.company_name for r in runs if r.company_name})
-    num_emails = len(runs)
-    total_requests = num_emails
+# Allar tölurnar eru reiknaðar í einni aggregate fyrirspurn yfir "runs" CTE-ið,
+# svo keyrslurnar eru aldrei sóttar inn í Python.
+SUMMARY_METRICS_SQL = """
+    SELECT
+        COALESCE(
+            jsonb_agg(DISTINCT company_name ORDER BY company_name)
+                FILTER (WHERE company_name IS NOT NULL),
+            '[]'::jsonb
+        )                                                            AS companies,
+        COUNT(*)                                                     AS num_emails,
+        MIN(COALESCE(started_at, created_at))                        AS started_at,
+        MAX(created_at)                                              AS finished_at,
+        COUNT(*)                                                     AS total_requests,
+        AVG(reply_grade)                                             AS avg_reply_grade,
+        percentile_cont(0.50) WITHIN GROUP (ORDER BY latency_ms)     AS latency_p50_ms,
+        percentile_cont(0.90) WITHIN GROUP (ORDER BY latency_ms)     AS latency_p90_ms,
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms)     AS latency_p95_ms,
+        percentile_cont(0.99) WITHIN GROUP (ORDER BY latency_ms)     AS latency_p99_ms,
+        MAX(latency_ms)                                              AS latency_max_ms,
+        AVG(latency_ms)                                              AS avg_generation_ms,
+        AVG(grading_latency_ms)                                      AS avg_grading_ms,
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY grading_latency_ms) AS grading_p95_ms,
+        COUNT(*) / NULLIF(
+            EXTRACT(EPOCH FROM MAX(created_at) - MIN(COALESCE(started_at, created_at))), 0
+        )                                                            AS throughput_rps,
+        COUNT(*) FILTER (WHERE failed)                               AS failure_count,
+        (
+            SELECT COALESCE(jsonb_object_agg(bucket, n), '{}'::jsonb)
+            FROM (
+                SELECT LEAST(FLOOR(reply_grade), 10)::int AS bucket, COUNT(*) AS n
+                FROM runs
+                WHERE reply_grade IS NOT NULL
+                GROUP BY 1
+            ) g
+        )                                                            AS grade_distribution,
+        -- Stillingarnar eru bara skráðar ef allar keyrslurnar deila þeim
+        CASE WHEN COUNT(DISTINCT model_name) = 1 THEN MIN(model_name) END   AS model_name,
+        CASE WHEN COUNT(DISTINCT temperature) = 1 AND COUNT(temperature) = COUNT(*)
+             THEN MIN(temperature) END                               AS temperature,
+        CASE WHEN COUNT(DISTINCT max_tokens) = 1 AND COUNT(max_tokens) = COUNT(*)
+             THEN MIN(max_tokens) END                                AS max_tokens,
+        AVG(prompt_tokens)                                           AS avg_prompt_tokens,
+        AVG(completion_tokens)                                       AS avg_completion_tokens,
+        SUM(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0))
+            FILTER (WHERE prompt_tokens IS NOT NULL OR completion_tokens IS NOT NULL) AS total_tokens,
+        -- grading="self": sjálfsmat borið saman við dómarann þar sem hann var líka spurður
+        COUNT(self_grade)                                            AS self_graded_runs,
+        COUNT(*) FILTER (WHERE self_grade IS NOT NULL AND grade_source = 'llm') AS calibration_runs,
+        AVG(self_grade - reply_grade)
+            FILTER (WHERE self_grade IS NOT NULL AND grade_source = 'llm')      AS self_grade_bias,
+        AVG(ABS(self_grade - reply_grade))
+            FILTER (WHERE self_grade IS NOT NULL AND grade_source = 'llm')      AS self_grade_mae,
+        -- Prompt cache: hlutfall kalla með cached_tokens > 0, og svartími með og án
+        CASE WHEN COUNT(DISTINCT prompt_version) = 1 AND COUNT(prompt_version) = COUNT(*)
+             THEN MIN(prompt_version) END                            AS prompt_version,
+        AVG(cached_tokens)                                           AS avg_cached_tokens,
+        AVG((cached_tokens > 0)::int)                                AS cache_hit_rate,
+        SUM(cached_tokens)::float8
+            / NULLIF(SUM(prompt_tokens) FILTER (WHERE cached_tokens IS NOT NULL), 0) AS cached_token_ratio,
+        AVG((grading_cached_tokens > 0)::int)                        AS grading_cache_hit_rate,
+        AVG(latency_ms) FILTER (WHERE cached_tokens > 0)             AS latency_cache_hit_ms,
+        AVG(latency_ms) FILTER (WHERE cached_tokens = 0)             AS latency_cache_miss_ms,
+        AVG(grading_latency_ms) FILTER (WHERE grading_cached_tokens > 0) AS grading_latency_cache_hit_ms,
+        AVG(grading_latency_ms) FILTER (WHERE grading_cached_tokens = 0) AS grading_latency_cache_miss_ms
+    FROM runs
+"""
 
-    grades = [float(r.reply_grade) for r in runs if r.reply_grade is not None]
-    avg_reply_grade = sum(grades) / len(grades) if grades else None
+RUN_COLUMNS_FOR_SUMMARY = """
+    company_name, reply_grade, latency_ms, grading_latency_ms,
+    generated_body IS NULL AS failed, started_at, created_at,
+    model_name, temperature, max_tokens, prompt_tokens, completion_tokens,
+    self_grade, grade_source,
+    prompt_version, cached_tokens, grading_prompt_tokens, grading_cached_tokens
+"""
 
-    started_at = min(getattr(r, "created_at", datetime.utcnow()) for r in runs)
-    finished_at = max(getattr(r, "created_at", datetime.utcnow()) for r in runs)
 
-    companies_json = json.dumps(companies)
+def parse_companies(val):
+    # Ensure companies is a Python list, regardless of JSONB/text
+    try:
+        if val is None:
+            return []
+        if isinstance(val, (list, dict)):
+            return val
+        return json.loads(val)
+    except Exception:
+        # Fallback: return as-is if parsing fails
+        return val
 
-    insert_sql = text("""
-        INSERT INTO tests (
-            companies,
-            num_emails,
-            concurrency_level,
-            started_at,
-            finished_at,
-            total_requests,
-            avg_reply_grade
-        )
-        VALUES (
-            :companies,
-            :num_emails,
-            :concurrency_level,
-            :started_at,
-            :finished_at,
-            :total_requests,
-            :avg_reply_grade
+
+def test_summary_to_dict(row) -> dict:
+    """
+    tests-röð (mapping) yfir í JSON-hæft dict fyrir API svör.
+    """
+    def num(v):
+        return float(v) if v is not None else None
+
+    def ts(v):
+        return v.isoformat() if isinstance(v, datetime) else v
+
+    grade_distribution = row.get("grade_distribution")
+    if isinstance(grade_distribution, str):
+        grade_distribution = json.loads(grade_distribution)
+
+    return {
+        "test_id": row["test_id"],
+        "companies": parse_companies(row["companies"]),
+        "num_emails": row["num_emails"],
+        "concurrency_level": row["concurrency_level"],
+        "started_at": ts(row["started_at"]),
+        "finished_at": ts(row["finished_at"]),
+        "total_requests": row["total_requests"],
+        "avg_reply_grade": num(row["avg_reply_grade"]),
+        "latency_ms": {
+            "p50": num(row.get("latency_p50_ms")),
+            "p90": num(row.get("latency_p90_ms")),
+            "p95": num(row.get("latency_p95_ms")),
+            "p99": num(row.get("latency_p99_ms")),
+            "max": num(row.get("latency_max_ms")),
+        },
+        "avg_generation_ms": num(row.get("avg_generation_ms")),
+        "avg_grading_ms": num(row.get("avg_grading_ms")),
+        "grading_p95_ms": num(row.get("grading_p95_ms")),
+        "throughput_rps": num(row.get("throughput_rps")),
+        "failure_count": row.get("failure_count"),
+        "grade_distribution": grade_distribution or {},
+        "model_name": row.get("model_name"),
+        "temperature": num(row.get("temperature")),
+        "max_tokens": row.get("max_tokens"),
+        "tokens": {
+            "avg_prompt": num(row.get("avg_prompt_tokens")),
+            "avg_completion": num(row.get("avg_completion_tokens")),
+            "avg_cached": num(row.get("avg_cached_tokens")),
+            "total": row.get("total_tokens"),
+        },
+        "prompt_version": row.get("prompt_version"),
+        "prompt_cache": {
+            "hit_rate": num(row.get("cache_hit_rate")),
+            "cached_token_ratio": num(row.get("cached_token_ratio")),
+            "grading_hit_rate": num(row.get("grading_cache_hit_rate")),
+            "latency_hit_ms": num(row.get("latency_cache_hit_ms")),
+            "latency_miss_ms": num(row.get("latency_cache_miss_ms")),
+            "grading_latency_hit_ms": num(row.get("grading_latency_cache_hit_ms")),
+            "grading_latency_miss_ms": num(row.get("grading_latency_cache_miss_ms")),
+        },
+        "self_grading": {
+            "runs": row.get("self_graded_runs"),
+            "calibration_runs": row.get("calibration_runs"),
+            "bias": num(row.get("self_grade_bias")),
+            "mae": num(row.get("self_grade_mae")),
+        },
+        "seed": row.get("seed"),
+        "scenario_corpus": row.get("scenario_corpus"),
+        "stratify_by": row.get("stratify_by"),
+        "label": row.get("label"),
+        "peak_rss_mb": num(row.get("peak_rss_mb")),
+    }
+
+
+# Lyklar test_summary_to_dict, fyrir /tests?fields=
+TEST_SUMMARY_FIELDS = (
+    "test_id", "companies", "num_emails", "concurrency_level", "started_at", "finished_at",
+    "total_requests", "avg_reply_grade", "latency_ms", "avg_generation_ms", "avg_grading_ms",
+    "grading_p95_ms", "throughput_rps", "failure_count", "grade_distribution", "model_name",
+    "temperature", "max_tokens", "tokens", "prompt_version", "prompt_cache", "self_grading",
+    "seed", "scenario_corpus",
+    "stratify_by", "label", "peak_rss_mb",
+)
+
+
+# Stillingar sem job getur skráð á tests-röðina svo hægt sé að endurtaka hana
+TEST_REPLAY_COLUMNS = ["seed", "scenario_corpus", "stratify_by"]
+
+
+def create_test_summary_from_run_ids(db, run_ids: List[int], concurrency_level: int,
+                                     test_attrs: Optional[dict] = None):
+    """
+    Býr til tests-röð úr keyrslunum og tengir þær við hana, allt í einni SQL skipun.
+
+    test_attrs: gildi fyrir TEST_REPLAY_COLUMNS (seed, scenario_corpus, stratify_by).
+    """
+    if not run_ids:
+        raise HTTPException(status_code=400, detail="run_ids cannot be empty")
+
+    attrs = {k: v for k, v in (test_attrs or {}).items() if k in TEST_REPLAY_COLUMNS and v is not None}
+    columns = ", ".join(TEST_SUMMARY_COLUMNS)
+    attr_columns = "".join(f", {k}" for k in attrs)
+    attr_values = "".join(f", :{k}" for k in attrs)
+    sql = text(f"""
+        WITH runs AS (
+            SELECT {RUN_COLUMNS_FOR_SUMMARY}
+            FROM "EmailTestRuns"
+            WHERE id = ANY(:run_ids)
+        ),
+        agg AS ({SUMMARY_METRICS_SQL}),
+        ins AS (
+            INSERT INTO tests ({columns}, concurrency_level{attr_columns})
+            SELECT {columns}, :concurrency_level{attr_values}
+            FROM agg
+            WHERE num_emails > 0
+            RETURNING *
+        ),
+        linked AS (
+            -- Tengjum keyrslurnar við test-ið svo hægt sé að sía /test-runs eftir því
+            UPDATE "EmailTestRuns" r
+            SET test_id = ins.test_id
+            FROM ins
+            WHERE r.id = ANY(:run_ids)
         )
-        RETURNING test_id
+        SELECT * FROM ins
     """)
 
-    result = db.execute(
-        insert_sql,
-        {
-            "companies": companies_json,
-            "num_emails": num_emails,
-            "concurrency_level": concurrency_level,
-            "started_at": started_at,
-            "finished_at": finished_at,
-            "total_requests": total_requests,
-            "avg_reply_grade": avg_reply_grade,
-        },
-    )
+    row = db.execute(
+        sql,
+        {"run_ids": list(run_ids), "concurrency_level": concurrency_level, **attrs},
+    ).mappings().first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="No EmailTestRuns found for given IDs")
     db.commit()
-    new_test_id = result.fetchone()[0]
 
-    return {
-        "status": "ok",
-        "test_id": new_test_id,
-        "companies": companies,
-        "num_emails": num_emails,
-        "concurrency_level": concurrency_level,
-        "total_requests": total_requests,
-        "avg_reply_grade": avg_reply_grade,
-        "started_at": started_at.isoformat(),
-        "finished_at": finished_at.isoformat(),
-    }
+    return {"status": "ok", **test_summary_to_dict(row)}
+
+
+def refresh_test_summary(db, test_id: int) -> Optional[dict]:
+    """
+    Reiknar frammistöðutölur tests-raðar aftur út frá keyrslunum sem eru tengdar
+    henni (t.d. eftir að einkunnir hafa verið endurmetnar). Sama SQL og þegar
+    röðin var búin til, svo tölurnar haldist sambærilegar.
+    """
+    assignments = ", ".join(f"{c} = agg.{c}" for c in TEST_SUMMARY_COLUMNS)
+    row = db.execute(
+        text(f"""
+            WITH runs AS (
+                SELECT {RUN_COLUMNS_FOR_SUMMARY}
+                FROM "EmailTestRuns"
+                WHERE test_id = :test_id
+            ),
+            agg AS ({SUMMARY_METRICS_SQL})
+            UPDATE tests t
+            SET {assignments}
+            FROM agg
+            WHERE t.test_id = :test_id AND agg.num_emails > 0
+            RETURNING t.*
+        """),
+        {"test_id": test_id},
+    ).mappings().first()
+    db.commit()
+    return test_summary_to_dict(row) if row is not None else None
+
@@ -0,0 +1,308 @@
+# app/task_queue.py
+import json
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+from .database import SessionLocal
+
+# Hversu lengi worker á verk án heartbeat áður en annar má taka það
+DEFAULT_LEASE_SECONDS = 60.0
+
+
+class Task(NamedTuple):
+    task_id: int
+    job_id: int
+    seq: int
+    scenario: Optional[dict]
+    attempts: int
+    payload: Optional[dict] = None
+
+
+def _json(value) -> Optional[dict]:
+    return value if value is None or isinstance(value, dict) else json.loads(value)
+
+
+def enqueue(job_id: int, plan: List[Optional[dict]], payloads: Optional[List[Optional[dict]]] = None):
+    """
+    Eitt verk fyrir hverja beiðni í plani job-sins, allt í einni INSERT.
+    payloads (migrations/020): það sem er sérstakt fyrir hvert verk, t.d. cell
+    í model matrix eða run_ids í endurmati.
+    """
+    if not plan:
+        return
+    payloads = payloads or [None] * len(plan)
+    with SessionLocal() as db:
+        db.execute(
+            text("""
+                INSERT INTO simulation_tasks (job_id, seq, scenario, payload)
+                SELECT :job_id, t.seq, t.scenario::jsonb, t.payload::jsonb
+                FROM unnest(
+                    CAST(:seqs AS integer[]), CAST(:scenarios AS text[]), CAST(:payloads AS text[])
+                ) AS t(seq, scenario, payload)
+            """),
+            {
+                "job_id": job_id,
+                "seqs": list(range(len(plan))),
+                "scenarios": [json.dumps(s) if s is not None else None for s in plan],
+                "payloads": [json.dumps(p) if p is not None else None for p in payloads],
+            },
+        )
+        db.commit()
+
+
+def claim(worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Task]:
+    """
+    Tekur elsta lausa verkið. SKIP LOCKED: workers sem claim-a samtímis fá
+    hver sitt verk í stað þess að bíða hver eftir öðrum.
+
+    concurrency_level job-sins er virt (um það bil; tveir workers geta séð
+    sömu talningu samtímis) svo dreifð keyrsla mæli sama álag og í ferlinu.
+    Verk í gangi eru talin einu sinni per claim (running), ekki fyrir hverja
+    röð í biðröðinni.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                WITH running AS (
+                    SELECT job_id, COUNT(*) AS n
+                    FROM simulation_tasks
+                    WHERE status = 'running'
+                    GROUP BY job_id
+                ),
+                next AS (
+                    SELECT t.task_id
+                    FROM simulation_tasks t
+                    JOIN simulation_jobs j ON j.job_id = t.job_id
+                    LEFT JOIN running r ON r.job_id = t.job_id
+                    WHERE t.status = 'queued'
+                      AND j.status IN ('queued', 'running')
+                      AND COALESCE(r.n, 0) < COALESCE((j.params ->> 'concurrency_level')::int, 1)
+                    ORDER BY t.task_id
+                    LIMIT 1
+                    FOR UPDATE OF t SKIP LOCKED
+                )
+                UPDATE simulation_tasks t
+                SET status = 'running',
+                    attempts = t.attempts + 1,
+                    lease_owner = :worker,
+                    lease_expires_at = now() + make_interval(secs => :lease),
+                    heartbeat_at = now(),
+                    started_at = COALESCE(t.started_at, now())
+                FROM next
+                WHERE t.task_id = next.task_id
+                RETURNING t.task_id, t.job_id, t.seq, t.scenario, t.attempts, t.payload
+            """),
+            {"worker": worker_id, "lease": lease_seconds},
+        ).first()
+        if row is None:
+            db.rollback()
+            return None
+        db.execute(
+            text("""
+                UPDATE simulation_jobs SET status = 'running', started_at = now()
+                WHERE job_id = :job_id AND status = 'queued'
+            """),
+            {"job_id": row.job_id},
+        )
+        db.commit()
+
+    return Task(row.task_id, row.job_id, row.seq, _json(row.scenario), row.attempts, _json(row.payload))
+
+
+def heartbeat(worker_id: str, task_ids: List[int], lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List[int]:
+    """
+    Framlengir lease á verkum workers. Skilar þeim sem hann á enn; verk sem
+    vantar hafa verið tekin af honum (lease rann út og reaper setti það aftur í biðröð).
+    """
+    if not task_ids:
+        return []
+    with SessionLocal() as db:
+        held = [
+            r[0] for r in db.execute(
+                text("""
+                    UPDATE simulation_tasks
+                    SET lease_expires_at = now() + make_interval(secs => :lease),
+                        heartbeat_at = now()
+                    WHERE task_id = ANY(:ids) AND lease_owner = :worker AND status = 'running'
+                    RETURNING task_id
+                """),
+                {"ids": list(task_ids), "worker": worker_id, "lease": lease_seconds},
+            )
+        ]
+        db.commit()
+    return held
+
+
+def complete(task: Task, worker_id: str, status: str, error: Optional[str] = None,
+             counts: Optional[Tuple[int, int]] = None) -> bool:
+    """
+    status: done / failed / cancelled. Aðeins eigandi lease-sins getur lokið
+    verkinu; skilar False ef það var tekið af honum á meðan.
+
+    counts: (completed, failed) fyrir verk sem ná yfir margar keyrslur
+    (endurmat); annars telst verkið ein keyrsla eftir status.
+    """
+    if counts is None:
+        counts = (1 if status == "done" else 0, 1 if status == "failed" else 0)
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                WITH t AS (
+                    UPDATE simulation_tasks
+                    SET status = :status, error = :error, finished_at = now(),
+                        lease_owner = NULL, lease_expires_at = NULL
+                    WHERE task_id = :task_id AND lease_owner = :worker AND status = 'running'
+                    RETURNING job_id
+                )
+                UPDATE simulation_jobs j
+                SET num_completed = j.num_completed + :completed,
+                    num_failed = j.num_failed + :failed
+                FROM t
+                WHERE j.job_id = t.job_id
+                RETURNING j.job_id
+            """),
+            {
+                "task_id": task.task_id, "worker": worker_id, "status": status, "error": error,
+                "completed": counts[0], "failed": counts[1],
+            },
+        ).first()
+        db.commit()
+    return row is not None
+
+
+def reap() -> List[int]:
+    """
+    Verk með útrunnið lease (worker dó eða fraus) fara aftur í biðröð, eða
+    verða failed eftir max_attempts. Verk í biðröð eftir deadline job-sins eru
+    cancelled. Skilar job_id sem breyttust, svo hægt sé að klára þau.
+    """
+    with SessionLocal() as db:
+        requeued = db.execute(
+            text("""
+                UPDATE simulation_tasks
+                SET status = 'queued',
+                    error = 'lease expired (' || COALESCE(lease_owner, '?') || ')',
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE status = 'running' AND lease_expires_at < now() AND attempts < max_attempts
+                RETURNING job_id
+            """)
+        ).all()
+        exhausted = db.execute(
+            text("""
+                WITH t AS (
+                    UPDATE simulation_tasks
+                    SET status = 'failed', finished_at = now(),
+                        error = 'lease expired after ' || attempts || ' attempts',
+                        lease_owner = NULL, lease_expires_at = NULL
+                    WHERE status = 'running' AND lease_expires_at < now() AND attempts >= max_attempts
+                    RETURNING job_id, payload
+                ),
+                -- Verk í endurmati ná yfir len(run_ids) keyrslur
+                counts AS (
+                    SELECT job_id, SUM(COALESCE(jsonb_array_length(payload -> 'run_ids'), 1)) AS n
+                    FROM t GROUP BY job_id
+                )
+                UPDATE simulation_jobs j SET num_failed = j.num_failed + counts.n
+                FROM counts WHERE j.job_id = counts.job_id
+                RETURNING j.job_id
+            """)
+        ).all()
+        expired = db.execute(
+            text("""
+                UPDATE simulation_tasks t
+                SET status = 'cancelled', finished_at = now(), error = 'deadline exceeded'
+                FROM simulation_jobs j
+                WHERE j.job_id = t.job_id AND t.status = 'queued' AND j.deadline_at < now()
+                RETURNING t.job_id
+            """)
+        ).all()
+        db.commit()
+    return sorted({r[0] for r in requeued + exhausted + expired})
+
+
+def cancel_job(job_id: int) -> bool:
+    """
+    Verk sem eru ekki byrjuð eru cancelled; verk í gangi fá að klára.
+    Skilar False ef job-ið er ekki í biðröðinni eða þegar búið.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                UPDATE simulation_jobs SET status = 'cancelling'
+                WHERE job_id = :job_id AND status IN ('queued', 'running')
+                  AND params ->> 'backend' = 'queue'
+                RETURNING job_id
+            """),
+            {"job_id": job_id},
+        ).first()
+        if row is None:
+            db.rollback()
+            return False
+        db.execute(
+            text("""
+                UPDATE simulation_tasks
+                SET status = 'cancelled', finished_at = now(), error = 'job cancelled'
+                WHERE job_id = :job_id AND status = 'queued'
+            """),
+            {"job_id": job_id},
+        )
+        db.commit()
+    return True
+
+
+def claim_finalize(job_id: int) -> Optional[dict]:
+    """
+    Ef öll verk job-sins eru búin: merkir job-ið 'finalizing' og skilar
+    {previous, params, deadline_hit}. Aðeins einn worker fær röðina (læst með
+    FOR UPDATE), hinir fá None.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                WITH old AS (
+                    SELECT job_id, status FROM simulation_jobs
+                    WHERE job_id = :job_id
+                    FOR UPDATE
+                )
+                UPDATE simulation_jobs j
+                SET status = 'finalizing'
+                FROM old
+                WHERE j.job_id = old.job_id
+                  AND old.status IN ('queued', 'running', 'cancelling')
+                  AND NOT EXISTS (
+                      SELECT 1 FROM simulation_tasks
+                      WHERE job_id = :job_id AND status IN ('queued', 'running')
+                  )
+                RETURNING old.status AS previous, j.params,
+                          EXISTS (
+                              SELECT 1 FROM simulation_tasks
+                              WHERE job_id = :job_id AND error = 'deadline exceeded'
+                          ) AS deadline_hit
+            """),
+            {"job_id": job_id},
+        ).mappings().first()
+        db.commit()
+    if row is None:
+        return None
+    params = row["params"] if isinstance(row["params"], dict) else json.loads(row["params"] or "{}")
+    return {"previous": row["previous"], "params": params, "deadline_hit": row["deadline_hit"]}
+
+
+def job_info(job_id: int) -> Optional[dict]:
+    """
+    Staða, params og deadline (time.time()) job-s, fyrir worker áður en hann byrjar á verki.
+    """
+    with SessionLocal() as db:
+        row = db.execute(
+            text("""
+                SELECT status, params, EXTRACT(EPOCH FROM deadline_at) AS deadline
+                FROM simulation_jobs WHERE job_id = :job_id
+            """),
+            {"job_id": job_id},
+        ).mappings().first()
+    if row is None:
+        return None
+    params = row["params"] if isinstance(row["params"], dict) else json.loads(row["params"] or "{}")
+    deadline = float(row["deadline"]) if row["deadline"] is not None else None
+    return {"status": row["status"], "params": params, "deadline": deadline}
@@ -0,0 +1,206 @@
+# app/tracing.py
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Spans eru skrifaðar sem OTLP/JSON (ExportTraceServiceRequest), ein lína í
+# hverja runu, í TRACE_EXPORT_PATH og/eða POST-aðar á TRACE_EXPORT_URL
+# (t.d. http://localhost:4318/v1/traces á OpenTelemetry collector).
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "virkum-scraper")
+
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL_S = 2.0
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class RunTrace:
+    """
+    Spans fyrir eina hermun: rót ("simulation") og eitt barn fyrir hvert skref
+    (queue_wait, thread_wait, pick_company, generate, grade, db_write ...).
+
+    Ekkert er flutt út fyrr en finish() er kallað, svo kostnaðurinn á meðan
+    keyrslan er í gangi er bara time.time_ns() og nokkur dict.
+    """
+
+    def __init__(self, name: str = "simulation", **attributes):
+        self.trace_id = _new_id(16)
+        self.root = Span(name, self.trace_id, None, attributes)
+        self.spans: List[Span] = []
+
+    def start(self, name: str, **attributes) -> Span:
+        span = Span(name, self.trace_id, self.root.span_id, attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.attributes["error"] = str(e)
+            raise
+        finally:
+            span.end()
+
+    @property
+    def stage_timings(self) -> Dict[str, float]:
+        """
+        {skref: ms} fyrir þau skref sem er lokið. Ef sama skref kemur oftar en
+        einu sinni er tíminn lagður saman.
+        """
+        timings: Dict[str, float] = {}
+        for span in self.spans:
+            if span.end_ns is not None:
+                timings[span.name] = round(timings.get(span.name, 0.0) + span.duration_ms, 3)
+        return timings
+
+    def finish(self, **attributes):
+        self.root.attributes.update(attributes)
+        self.root.end()
+        for span in self.spans:
+            span.end()
+        exporter.export([self.root] + self.spans)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    out = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)}
+            for k, v in span.attributes.items()
+            if v is not None
+        ],
+    }
+    if span.parent_id:
+        out["parentSpanId"] = span.parent_id
+    if "error" in span.attributes:
+        out["status"] = {"code": 2, "message": str(span.attributes["error"])}
+    return out
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [_otlp_span(s) for s in spans],
+            }],
+        }]
+    }
+
+
+class SpanExporter:
+    """
+    Safnar spans í biðröð og skrifar þær út í bakgrunnsþræði, í runum.
+    Gerir ekkert ef hvorki TRACE_EXPORT_PATH né TRACE_EXPORT_URL er sett.
+    """
+
+    def __init__(self, path: Optional[str] = TRACE_EXPORT_PATH, url: Optional[str] = TRACE_EXPORT_URL):
+        self.path = path
+        self.url = url
+        self.enabled = bool(path or url)
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+        self._queue.put(spans)
+
+    def _run(self):
+        while True:
+            batch: List[Span] = []
+            stop = False
+            deadline = time.monotonic() + EXPORT_INTERVAL_S
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, spans: List[Span]):
+        payload = to_otlp(spans)
+        try:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+            if self.url:
+                # requests er aðeins sótt ef OTLP endpoint er stilltur
+                import requests
+                requests.post(self.url, json=payload, timeout=5)
+        except Exception as e:
+            print(f"Span export failed: {e}")
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+exporter = SpanExporter()
+atexit.register(exporter.close)
@@ -0,0 +1,126 @@
+import argparse
+import json
+import sys
+
+from fastapi import HTTPException
+
+from app.database import SessionLocal
+from app.compare_service import (
+    BOOTSTRAP_RESAMPLES,
+    DEFAULT_ALPHA,
+    MIN_FAILURE_RATE_INCREASE,
+    MIN_GRADE_DROP,
+    MIN_LATENCY_INCREASE_PCT,
+    compare_tests,
+)
+
+
+def _fmt(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_test_level(result: dict):
+    # Bench tests án keyrslna: bara tölurnar af tests-röðunum, ekkert marktektarpróf
+    print("(test-level metrics; no runs linked, so no significance test)")
+    for name, m in result["metrics"].items():
+        if m["status"] == "insufficient_data":
+            print(f"{name:<15} insufficient data")
+            continue
+        digits = 3 if name == "failure_rate" else 2
+        print(
+            f"{name:<15} {_fmt(m['baseline'], digits)} -> {_fmt(m['candidate'], digits)}, "
+            f"diff {_fmt(m['diff'], digits)}  {m['status'].upper()}"
+        )
+
+
+def print_summary(result: dict):
+    b, c = result["baseline"], result["candidate"]
+    if result.get("method") == "test_level":
+        print(f"baseline  tests {b['test_ids']}: {b['runs']} requests, {b['failures']} failed")
+        print(f"candidate tests {c['test_ids']}: {c['runs']} requests, {c['failures']} failed")
+        print()
+        print_test_level(result)
+        return
+    print(f"baseline  tests {b['test_ids']}: {b['runs']} runs, {b['failures']} failed, {b['graded']} graded")
+    print(f"candidate tests {c['test_ids']}: {c['runs']} runs, {c['failures']} failed, {c['graded']} graded")
+    print()
+
+    lat = result["metrics"]["latency_ms"]
+    if lat["status"] == "insufficient_data":
+        print("latency      insufficient data")
+    else:
+        d = lat["median_diff"]
+        print(
+            f"latency      median {_fmt(lat['baseline_median'])} -> {_fmt(lat['candidate_median'])} ms, "
+            f"diff {_fmt(d['diff'])} ms [{_fmt(d['ci_low'])}, {_fmt(d['ci_high'])}], "
+            f"p95 {_fmt(lat['baseline_p95'])} -> {_fmt(lat['candidate_p95'])} ms, "
+            f"p={lat['mann_whitney']['p_value']:.4f}  {lat['status'].upper()}"
+        )
+
+    grade = result["metrics"]["reply_grade"]
+    if grade["status"] == "insufficient_data":
+        print("reply_grade  insufficient data")
+    else:
+        d = grade["mean_diff"]
+        print(
+            f"reply_grade  mean {_fmt(grade['baseline_mean'], 2)} -> {_fmt(grade['candidate_mean'], 2)}, "
+            f"diff {_fmt(d['diff'], 2)} [{_fmt(d['ci_low'], 2)}, {_fmt(d['ci_high'], 2)}], "
+            f"p={grade['mann_whitney']['p_value']:.4f}  {grade['status'].upper()}"
+        )
+
+    fail = result["metrics"]["failure_rate"]
+    if fail["status"] == "insufficient_data":
+        print("failures     insufficient data")
+    else:
+        print(
+            f"failures     {fail['baseline_rate']:.1%} -> {fail['candidate_rate']:.1%}, "
+            f"p={fail['p_value']:.4f}  {fail['status'].upper()}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare two tests (or groups of tests). Exits 1 on a significant regression."
+    )
+    parser.add_argument("--baseline", type=int, nargs="+", required=True, help="Baseline test id(s)")
+    parser.add_argument("--candidate", type=int, nargs="+", required=True, help="Candidate test id(s)")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA)
+    parser.add_argument("--min-latency-increase-pct", type=float, default=MIN_LATENCY_INCREASE_PCT)
+    parser.add_argument("--min-grade-drop", type=float, default=MIN_GRADE_DROP)
+    parser.add_argument("--min-failure-rate-increase", type=float, default=MIN_FAILURE_RATE_INCREASE)
+    parser.add_argument("--resamples", type=int, default=BOOTSTRAP_RESAMPLES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        try:
+            result = compare_tests(
+                db,
+                args.baseline,
+                args.candidate,
+                alpha=args.alpha,
+                min_latency_increase_pct=args.min_latency_increase_pct,
+                min_grade_drop=args.min_grade_drop,
+                min_failure_rate_increase=args.min_failure_rate_increase,
+                n_resamples=args.resamples,
+                seed=args.seed,
+            )
+        except HTTPException as e:
+            print(f"❌ {e.detail}", file=sys.stderr)
+            return 2
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_summary(result)
+
+    if result["regression"]:
+        print(f"\n❌ Regression in: {', '.join(result['regressions'])}", file=sys.stderr)
+        return 1
+    print("\n✅ No significant regression", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
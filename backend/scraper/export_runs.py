@@ -0,0 +1,48 @@
+import argparse
+import gzip
+import sys
+from datetime import datetime
+
+from app.database import SessionLocal
+from app.export_service import EXPORT_FORMATS, build_export_query, iter_export, iter_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export EmailTestRuns as NDJSON, CSV or Parquet.")
+    parser.add_argument("output", help="Output file ('-' for stdout). A .gz suffix gzips NDJSON/CSV.")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--test-id", type=int)
+    parser.add_argument("--company")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="ISO date/time, inclusive")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="ISO date/time, exclusive")
+    args = parser.parse_args()
+
+    stmt = build_export_query(
+        test_id=args.test_id,
+        company=args.company,
+        since=args.since,
+        until=args.until,
+    )
+
+    if args.output == "-":
+        out = sys.stdout.buffer
+    elif args.output.endswith(".gz") and args.format != "parquet":
+        out = gzip.open(args.output, "wb")
+    else:
+        out = open(args.output, "wb")
+
+    total = 0
+    with SessionLocal() as db:
+        try:
+            for chunk in iter_export(iter_rows(db, stmt), args.format):
+                out.write(chunk)
+                total += len(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+    print(f"✅ Wrote {total} bytes ({args.format}) to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
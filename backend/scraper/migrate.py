@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.database import get_engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def split_statements(sql: str):
+    """
+    Skiptir SQL skrá í stakar skipanir. pg8000 keyrir bara eina skipun í
+    einu, svo við virðum ; nema innan '...' strengja, -- athugasemda og
+    $$ ... $$ blokka (plpgsql föll).
+    """
+    statements, buf = [], []
+    i, n = 0, len(sql)
+    quote = None  # "'" eða dollar-tag eins og "$$"
+
+    while i < n:
+        ch = sql[i]
+        if quote:
+            if sql.startswith(quote, i):
+                buf.append(quote)
+                i += len(quote)
+                quote = None
+            else:
+                buf.append(ch)
+                i += 1
+            continue
+
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end + 1
+            continue
+        if ch == "'":
+            quote = "'"
+        elif ch == "$":
+            end = sql.find("$", i + 1)
+            tag = sql[i:end + 1] if end != -1 else ""
+            if tag and (tag == "$$" or tag[1:-1].isidentifier()):
+                quote = tag
+                buf.append(tag)
+                i += len(tag)
+                continue
+        elif ch == ";":
+            stmt = "".join(buf).strip()
+            if stmt:
+                statements.append(stmt)
+            buf = []
+            i += 1
+            continue
+
+        buf.append(ch)
+        i += 1
+
+    stmt = "".join(buf).strip()
+    if stmt:
+        statements.append(stmt)
+    return statements
+
+
+def applied_versions(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def main():
+    """
+    Keyrir .sql skrár í migrations/ í röð, hverja einu sinni.
+    """
+    files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+    with get_engine().begin() as conn:
+        done = applied_versions(conn)
+
+    pending = [f for f in files if f.stem not in done]
+    if not pending:
+        print("✅ Database is up to date.")
+        return
+
+    for path in pending:
+        print(f"➡️  Applying {path.name} ...")
+        try:
+            # Hver migration keyrir í sinni eigin transaction
+            with get_engine().begin() as conn:
+                for stmt in split_statements(path.read_text(encoding="utf-8")):
+                    conn.exec_driver_sql(stmt)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version) VALUES (:v)"),
+                    {"v": path.stem},
+                )
+        except Exception as e:
+            print(f"❌ {path.name} failed: {e}")
+            sys.exit(1)
+
+    print(f"✅ Applied {len(pending)} migration(s).")
+
+
+if __name__ == "__main__":
+    main()
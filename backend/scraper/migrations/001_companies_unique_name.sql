@@ -0,0 +1,12 @@
+-- 001: one row per company name.
+--
+-- Removes existing duplicates (keeping the oldest row per "CompanyName") and
+-- adds a unique index so ingestion can use INSERT ... ON CONFLICT.
+
+DELETE FROM "Companies" c
+USING "Companies" older
+WHERE c."CompanyName" = older."CompanyName"
+  AND c.id > older.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS companies_company_name_key
+    ON "Companies" ("CompanyName");
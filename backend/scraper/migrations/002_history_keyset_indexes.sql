@@ -0,0 +1,33 @@
+-- 002: keyset pagination fyrir /email-history, /tests og /test-runs.
+--
+-- tests taflan var búin til í höndunum; hér er skemað skráð svo hægt sé
+-- að setja upp nýjan grunn.
+
+CREATE TABLE IF NOT EXISTS tests (
+    test_id           SERIAL PRIMARY KEY,
+    companies         JSONB,
+    num_emails        INTEGER,
+    concurrency_level INTEGER,
+    started_at        TIMESTAMPTZ,
+    finished_at       TIMESTAMPTZ,
+    total_requests    INTEGER,
+    avg_reply_grade   NUMERIC
+);
+
+-- Hvaða test hver keyrsla tilheyrir (sett í create_test_summary_from_run_ids)
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS test_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS ix_emails_sent_sent_at_id
+    ON emails_sent (sent_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_emails_sent_company_sent_at_id
+    ON emails_sent (company_id, sent_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_created_at_id
+    ON "EmailTestRuns" (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_company_created_at_id
+    ON "EmailTestRuns" (company_name, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_test_id
+    ON "EmailTestRuns" (test_id, id);
+
+CREATE INDEX IF NOT EXISTS ix_tests_started_at
+    ON tests (started_at DESC);
@@ -0,0 +1,23 @@
+-- 003: /run-simulated-test keyrir sem background job.
+
+CREATE TABLE IF NOT EXISTS simulation_jobs (
+    job_id        SERIAL PRIMARY KEY,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    params        JSONB,
+    num_total     INTEGER NOT NULL DEFAULT 0,
+    num_completed INTEGER NOT NULL DEFAULT 0,
+    num_failed    INTEGER NOT NULL DEFAULT 0,
+    deadline_at   TIMESTAMPTZ,
+    test_id       INTEGER,
+    error         TEXT,
+    created_at    TIMESTAMPTZ DEFAULT now(),
+    started_at    TIMESTAMPTZ,
+    finished_at   TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_simulation_jobs_job_id ON simulation_jobs (job_id);
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS job_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_job_id
+    ON "EmailTestRuns" (job_id, id);
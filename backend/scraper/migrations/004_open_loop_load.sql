@@ -0,0 +1,6 @@
+-- 004: open-loop álagsprófanir (/simulation-jobs/load-test).
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS scheduled_at TIMESTAMPTZ;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ;
+
+ALTER TABLE simulation_jobs ADD COLUMN IF NOT EXISTS report JSONB;
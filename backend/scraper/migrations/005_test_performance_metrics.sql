@@ -0,0 +1,15 @@
+-- 005: frammistöðutölur í tests (reiknaðar í create_test_summary_from_run_ids).
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS grading_latency_ms INTEGER;
+
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_p50_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_p90_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_p95_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_p99_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_max_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS avg_generation_ms  DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS avg_grading_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS grading_p95_ms     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS throughput_rps     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS failure_count      INTEGER;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS grade_distribution JSONB;
@@ -0,0 +1,3 @@
+-- 006: tímar hvers skrefs í hermun (app/tracing.py).
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS stage_timings JSONB;
@@ -0,0 +1,8 @@
+-- 007: niðurstöður úr benchmark (backend/testResult/bench.py) fara líka í tests.
+-- label auðkennir hvaðan röðin kemur (t.d. "bench:scrape"), peak_rss_mb er
+-- hámarks minnisnotkun API ferlisins á meðan mælt var.
+
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS label       TEXT;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS peak_rss_mb DOUBLE PRECISION;
+
+CREATE INDEX IF NOT EXISTS tests_label_test_id_idx ON tests (label, test_id DESC);
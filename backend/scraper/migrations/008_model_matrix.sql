@@ -0,0 +1,16 @@
+-- 008: LLM stillingar og token notkun á hverri keyrslu, og samantekt þeirra í tests
+-- (model matrix: sama scenario sett keyrt á móti mörgum líkönum/stillingum).
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS temperature       DOUBLE PRECISION;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS max_tokens        INTEGER;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS llm_seed          BIGINT;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS prompt_tokens     INTEGER;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS completion_tokens INTEGER;
+
+-- model_name/temperature/max_tokens eru NULL ef test-ið blandar saman stillingum
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS model_name            TEXT;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS temperature           DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS max_tokens            INTEGER;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS avg_prompt_tokens     DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS avg_completion_tokens DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS total_tokens          BIGINT;
@@ -0,0 +1,6 @@
+-- 009: seed og scenario corpus sem test var keyrt með, svo hægt sé að
+-- endurtaka það nákvæmlega (POST /tests/{test_id}/replay).
+
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS seed            BIGINT;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS scenario_corpus TEXT;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS stratify_by     TEXT;   -- t.d. "category,company"
@@ -0,0 +1,12 @@
+-- 010: hvaðan einkunn kemur. "reference" = app/pregrader.py (líkindi við
+-- ExpectedAnswers), "llm" = evaluate_with_openai_rubric.
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS grade_source   TEXT;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS pregrade_score DOUBLE PRECISION;
+
+-- Allar eldri einkunnir komu frá LLM dómaranum
+UPDATE "EmailTestRuns" SET grade_source = 'llm'
+WHERE reply_grade IS NOT NULL AND grade_source IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_expected_answers_scenario_company
+    ON "ExpectedAnswers" (scenario, company_name);
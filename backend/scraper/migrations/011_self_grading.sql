@@ -0,0 +1,10 @@
+-- 011: grading="self" (svar og sjálfsmat í einu kalli). grade_source = 'self'
+-- þegar reply_grade er sjálfsmatið; self_grade er líka geymt á keyrslum sem
+-- dómarinn metur, svo hægt sé að kvarða sjálfsmatið.
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS self_grade NUMERIC;
+
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS self_graded_runs INTEGER;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS calibration_runs INTEGER;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS self_grade_bias  DOUBLE PRECISION;   -- AVG(self_grade - reply_grade)
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS self_grade_mae   DOUBLE PRECISION;
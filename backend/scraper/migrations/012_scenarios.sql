@@ -0,0 +1,43 @@
+-- 012: scenario textinn er geymdur einu sinni í "Scenarios" (lykill: sha256
+-- af label + input_email) og keyrslur vísa í hann með scenario_id, í stað
+-- þess að hver röð í "EmailTestRuns" geymi allan input_email.
+-- Sama hash og app/scenario_store.content_hash.
+
+CREATE TABLE IF NOT EXISTS "Scenarios" (
+    id           SERIAL PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    label        TEXT,
+    input_email  TEXT NOT NULL,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS scenario_id INTEGER;
+ALTER TABLE "EmailTestRuns" ALTER COLUMN input_email DROP NOT NULL;
+
+-- Backfill: einn scenario fyrir hvern einstakan texta
+INSERT INTO "Scenarios" (content_hash, label, input_email)
+SELECT DISTINCT ON (content_hash) content_hash, scenario, input_email
+FROM (
+    SELECT encode(sha256(convert_to(COALESCE(scenario, '') || E'\n' || input_email, 'UTF8')), 'hex') AS content_hash,
+           scenario,
+           input_email
+    FROM "EmailTestRuns"
+    WHERE input_email IS NOT NULL AND scenario_id IS NULL
+) runs
+ORDER BY content_hash
+ON CONFLICT (content_hash) DO NOTHING;
+
+UPDATE "EmailTestRuns" r
+SET scenario_id = s.id,
+    scenario = NULL,
+    input_email = NULL
+FROM "Scenarios" s
+WHERE r.input_email IS NOT NULL
+  AND r.scenario_id IS NULL
+  AND s.content_hash = encode(sha256(convert_to(COALESCE(r.scenario, '') || E'\n' || r.input_email, 'UTF8')), 'hex');
+
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_scenario_id
+    ON "EmailTestRuns" (scenario_id);
+
+-- Plássið losnar ekki fyrr en eftir VACUUM FULL "EmailTestRuns" (eða pg_repack),
+-- sem þarf að keyra sér utan transaction.
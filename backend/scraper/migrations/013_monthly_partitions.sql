@@ -0,0 +1,86 @@
+-- 013: mánaðarlegar range partitions á "EmailTestRuns" (created_at) og
+-- emails_sent (sent_at).
+--
+-- Gögnin eru ekki afrituð: gamla taflan er endurnefnd <tafla>_legacy og tengd
+-- sem fyrsta partition (MINVALUE .. byrjun næsta mánaðar). Nýir mánuðir og
+-- retention/archive eru í app/partitions.py (partitions.py fyrir cron).
+-- Primary key verður (id, <dálkur>) því Postgres krefst þess að partition
+-- lykillinn sé í öllum unique constraints; id kemur áfram úr sömu sequence.
+-- PK gömlu töflunnar er skipt út fyrir þann sama áður en hún er tengd.
+
+CREATE OR REPLACE FUNCTION pg_temp.partition_monthly(tbl text, col text) RETURNS void AS $$
+DECLARE
+    legacy text := tbl || '_legacy';
+    seq text;
+    pk text;
+    idx record;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass(quote_ident(tbl))) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- Range partitions taka ekki við NULL lykli
+    EXECUTE format('UPDATE %I SET %I = now() WHERE %I IS NULL', tbl, col, col);
+    EXECUTE format('ALTER TABLE %I ALTER COLUMN %I SET NOT NULL', tbl, col);
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+    -- Index nöfnin losna fyrir partitioned index-ana hér að neðan
+    FOR idx IN SELECT indexname FROM pg_indexes
+               WHERE schemaname = current_schema() AND tablename = legacy LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.indexname, left(idx.indexname, 55) || '_legacy');
+    END LOOP;
+
+    -- Gamla taflan heldur PRIMARY KEY (id); ATTACH myndi þá hafna henni (42P16,
+    -- "multiple primary keys"). Með (id, <dálkur>) tekur PK index foreldrisins
+    -- við index-num hennar í stað þess að búa til nýjan.
+    SELECT conname INTO pk FROM pg_constraint
+    WHERE conrelid = to_regclass(quote_ident(legacy)) AND contype = 'p';
+    IF pk IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', legacy, pk);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, %I)', legacy, col);
+
+    seq := pg_get_serial_sequence(quote_ident(legacy), 'id');
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (%I)', tbl, legacy, col);
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, %I)', tbl, col);
+    IF seq IS NOT NULL THEN
+        -- Annars hyrfi sequence-in þegar legacy partition er eytt (retention)
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, tbl);
+    END IF;
+
+    EXECUTE format(
+        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)',
+        tbl, legacy, to_char(date_trunc('month', now()) + interval '1 month', 'YYYY-MM-DD')
+    );
+    -- Öryggisnet ef app/partitions.py hefur ekki búið til mánuðinn í tæka tíð
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT pg_temp.partition_monthly('EmailTestRuns', 'created_at');
+SELECT pg_temp.partition_monthly('emails_sent', 'sent_at');
+
+ALTER TABLE emails_sent ALTER COLUMN sent_at SET DEFAULT (now() AT TIME ZONE 'utc');
+
+-- Partitioned index-ar; samsvarandi index-ar á legacy eru tengdir við þá í
+-- stað þess að vera byggðir aftur.
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_created_at_id
+    ON "EmailTestRuns" (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_company_created_at_id
+    ON "EmailTestRuns" (company_name, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_test_id
+    ON "EmailTestRuns" (test_id, id);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_job_id
+    ON "EmailTestRuns" (job_id, id);
+CREATE INDEX IF NOT EXISTS ix_email_test_runs_scenario_id
+    ON "EmailTestRuns" (scenario_id);
+-- UPDATE ... WHERE id = ... (einkunnir, test_id) án created_at
+CREATE INDEX IF NOT EXISTS "ix_EmailTestRuns_id"
+    ON "EmailTestRuns" (id);
+
+CREATE INDEX IF NOT EXISTS ix_emails_sent_sent_at_id
+    ON emails_sent (sent_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_emails_sent_company_sent_at_id
+    ON emails_sent (company_id, sent_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_emails_sent_id
+    ON emails_sent (id);
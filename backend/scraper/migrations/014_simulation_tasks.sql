@@ -0,0 +1,31 @@
+-- 014: biðröð fyrir simulation workers (worker.py). Hver röð er ein hermun
+-- í job; workers taka verk með FOR UPDATE SKIP LOCKED og halda þeim með
+-- lease sem er framlengt með heartbeat. Verk með útrunnið lease (worker dó)
+-- eru tekin aftur, upp að max_attempts.
+
+CREATE TABLE IF NOT EXISTS simulation_tasks (
+    task_id          BIGSERIAL PRIMARY KEY,
+    job_id           INTEGER NOT NULL,
+    seq              INTEGER NOT NULL,              -- númer beiðnar í plani job-sins (rng, seed)
+    scenario         JSONB NOT NULL,                -- úr scenario_corpus.sample_plan
+    status           TEXT NOT NULL DEFAULT 'queued', -- queued/running/done/failed/cancelled
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    max_attempts     INTEGER NOT NULL DEFAULT 3,
+    lease_owner      TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at     TIMESTAMPTZ,
+    error            TEXT,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at       TIMESTAMPTZ,
+    finished_at      TIMESTAMPTZ,
+    UNIQUE (job_id, seq)
+);
+
+-- Claim: elstu verk í biðröð
+CREATE INDEX IF NOT EXISTS ix_simulation_tasks_queued
+    ON simulation_tasks (task_id) WHERE status = 'queued';
+-- Reaper: verk í gangi eftir lease
+CREATE INDEX IF NOT EXISTS ix_simulation_tasks_running_lease
+    ON simulation_tasks (lease_expires_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS ix_simulation_tasks_job_status
+    ON simulation_tasks (job_id, status);
@@ -0,0 +1,151 @@
+-- 015: samantektir á EmailTestRuns eftir degi × fyrirtæki × líkani, uppfærðar
+-- af triggerum í sömu færslu og keyrslan er skrifuð eða endurmetin. /rollups
+-- les bara þessa töflu, svo svartíminn fer eftir fjölda hópa en ekki keyrslna.
+--
+-- Summur og summur af veldum duga fyrir meðaltal og staðalfrávik; hólfin í
+-- latency_buckets eru fyrir percentiles (sjá app/rollup_service.py).
+-- Partitions sem eru teknar úr sambandi (app/partitions.py) kveikja ekki á
+-- DELETE trigger, svo saga sem hefur verið sett í archive helst í samantektunum.
+
+CREATE TABLE IF NOT EXISTS run_rollups (
+    day              DATE NOT NULL,                -- created_at í UTC
+    company_name     TEXT NOT NULL,
+    model_name       TEXT NOT NULL DEFAULT '',     -- '' ef model_name er NULL
+    run_count        BIGINT NOT NULL DEFAULT 0,
+    generated_count  BIGINT NOT NULL DEFAULT 0,    -- generated_body IS NOT NULL
+    sent_ok_count    BIGINT NOT NULL DEFAULT 0,
+    latency_count    BIGINT NOT NULL DEFAULT 0,
+    latency_sum      DOUBLE PRECISION NOT NULL DEFAULT 0,
+    latency_sumsq    DOUBLE PRECISION NOT NULL DEFAULT 0,
+    latency_buckets  BIGINT[] NOT NULL DEFAULT '{0,0,0,0,0,0,0,0,0,0}',
+    graded_count     BIGINT NOT NULL DEFAULT 0,
+    grade_sum        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    grade_sumsq      DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (day, company_name, model_name)
+);
+
+CREATE INDEX IF NOT EXISTS ix_run_rollups_company_day ON run_rollups (company_name, day);
+CREATE INDEX IF NOT EXISTS ix_run_rollups_model_day ON run_rollups (model_name, day);
+
+-- Efri mörk hólfa í ms; sama listi og LATENCY_BUCKETS_MS í app/rollup_service.py.
+-- Hólf i (0-byggt) telur latency í [mörk[i-1], mörk[i]); síðasta hólfið er >= 60000.
+CREATE OR REPLACE FUNCTION run_rollup_bucket(latency_ms INTEGER, sign INTEGER) RETURNS BIGINT[] AS $$
+    SELECT array_agg(CASE WHEN i = width_bucket(latency_ms, ARRAY[250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000]) + 1
+                          THEN sign ELSE 0 END ORDER BY i)::BIGINT[]
+    FROM generate_series(1, 10) AS i
+    WHERE latency_ms IS NOT NULL
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION run_rollup_add(a BIGINT[], b BIGINT[]) RETURNS BIGINT[] AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE ARRAY(SELECT x + y FROM unnest(a, b) WITH ORDINALITY AS u(x, y, i) ORDER BY i)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+DROP AGGREGATE IF EXISTS run_rollup_sum(BIGINT[]);
+CREATE AGGREGATE run_rollup_sum(BIGINT[]) (
+    SFUNC = run_rollup_add,
+    STYPE = BIGINT[]
+);
+
+-- SQL sem leggur raðirnar í source (dálkar EmailTestRuns + sign = 1 eða -1)
+-- við samantektirnar. Hópað fyrst svo hver skipun uppfæri hvern hóp einu sinni,
+-- og raðað eftir lykli svo tvær færslur sem snerta sömu hópa læsi þeim í sömu
+-- röð (ekkert deadlock). Hópar þar sem ekkert breyttist (t.d. UPDATE á test_id)
+-- eru ekki skrifaðir.
+CREATE OR REPLACE FUNCTION run_rollup_sql(source TEXT) RETURNS TEXT AS $$
+    SELECT format($q$
+        WITH changed AS (%s),
+        grouped AS (
+            SELECT
+                (created_at AT TIME ZONE 'UTC')::date AS day,
+                company_name,
+                COALESCE(model_name, '') AS model_name,
+                SUM(sign) AS run_count,
+                COALESCE(SUM(sign) FILTER (WHERE generated_body IS NOT NULL), 0) AS generated_count,
+                COALESCE(SUM(sign) FILTER (WHERE sent_ok), 0) AS sent_ok_count,
+                COALESCE(SUM(sign) FILTER (WHERE latency_ms IS NOT NULL), 0) AS latency_count,
+                COALESCE(SUM(sign * latency_ms::float8), 0) AS latency_sum,
+                COALESCE(SUM(sign * latency_ms::float8 * latency_ms), 0) AS latency_sumsq,
+                COALESCE(run_rollup_sum(run_rollup_bucket(latency_ms, sign)),
+                         '{0,0,0,0,0,0,0,0,0,0}') AS latency_buckets,
+                COALESCE(SUM(sign) FILTER (WHERE reply_grade IS NOT NULL), 0) AS graded_count,
+                COALESCE(SUM(sign * reply_grade::float8), 0) AS grade_sum,
+                COALESCE(SUM(sign * reply_grade::float8 * reply_grade::float8), 0) AS grade_sumsq
+            FROM changed
+            GROUP BY 1, 2, 3
+        )
+        INSERT INTO run_rollups AS r (
+            day, company_name, model_name, run_count, generated_count, sent_ok_count,
+            latency_count, latency_sum, latency_sumsq, latency_buckets,
+            graded_count, grade_sum, grade_sumsq
+        )
+        SELECT day, company_name, model_name, run_count, generated_count, sent_ok_count,
+               latency_count, latency_sum, latency_sumsq, latency_buckets,
+               graded_count, grade_sum, grade_sumsq
+        FROM grouped
+        WHERE run_count <> 0 OR generated_count <> 0 OR sent_ok_count <> 0
+           OR latency_count <> 0 OR latency_sum <> 0 OR latency_buckets <> '{0,0,0,0,0,0,0,0,0,0}'
+           OR graded_count <> 0 OR grade_sum <> 0 OR grade_sumsq <> 0
+        ORDER BY day, company_name, model_name
+        ON CONFLICT (day, company_name, model_name) DO UPDATE SET
+            run_count       = r.run_count + EXCLUDED.run_count,
+            generated_count = r.generated_count + EXCLUDED.generated_count,
+            sent_ok_count   = r.sent_ok_count + EXCLUDED.sent_ok_count,
+            latency_count   = r.latency_count + EXCLUDED.latency_count,
+            latency_sum     = r.latency_sum + EXCLUDED.latency_sum,
+            latency_sumsq   = r.latency_sumsq + EXCLUDED.latency_sumsq,
+            latency_buckets = run_rollup_add(r.latency_buckets, EXCLUDED.latency_buckets),
+            graded_count    = r.graded_count + EXCLUDED.graded_count,
+            grade_sum       = r.grade_sum + EXCLUDED.grade_sum,
+            grade_sumsq     = r.grade_sumsq + EXCLUDED.grade_sumsq,
+            updated_at      = now()
+    $q$, source)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Statement-level triggerar með transition töflum: run_writer skrifar allt að
+-- 50 raðir í einni INSERT og write_grades uppfærir margar í einu, svo
+-- samantektin er reiknuð einu sinni á hverja skipun en ekki á hverja röð.
+-- EXECUTE er í trigger fallinu sjálfu því transition töflurnar sjást bara þar.
+CREATE OR REPLACE FUNCTION run_rollup_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE run_rollup_sql('SELECT 1 AS sign, * FROM new_rows');
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE run_rollup_sql('SELECT -1 AS sign, * FROM old_rows');
+    ELSE
+        EXECUTE run_rollup_sql(
+            'SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows'
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Engar keyrslur skrifaðar á milli backfill og triggera
+LOCK TABLE "EmailTestRuns" IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS run_rollups_insert ON "EmailTestRuns";
+DROP TRIGGER IF EXISTS run_rollups_update ON "EmailTestRuns";
+DROP TRIGGER IF EXISTS run_rollups_delete ON "EmailTestRuns";
+
+CREATE TRIGGER run_rollups_insert AFTER INSERT ON "EmailTestRuns"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION run_rollup_trigger();
+CREATE TRIGGER run_rollups_update AFTER UPDATE ON "EmailTestRuns"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION run_rollup_trigger();
+CREATE TRIGGER run_rollups_delete AFTER DELETE ON "EmailTestRuns"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION run_rollup_trigger();
+
+-- Backfill úr öllum keyrslum sem eru til
+TRUNCATE run_rollups;
+DO $$
+BEGIN
+    EXECUTE run_rollup_sql('SELECT 1 AS sign, * FROM "EmailTestRuns"');
+END;
+$$;
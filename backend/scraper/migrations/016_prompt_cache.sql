@@ -0,0 +1,18 @@
+-- 016: útgáfa prompt sniðmáts (app/prompts.py) og prompt cache á hverri keyrslu,
+-- og samantekt í tests: hlutfall kalla sem fengu cache hit og svartími með og án.
+-- Eldri keyrslur hafa prompt_version NULL; þær notuðu allar v1 uppsetninguna.
+
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS prompt_version        TEXT;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS cached_tokens         INTEGER;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS grading_prompt_tokens INTEGER;
+ALTER TABLE "EmailTestRuns" ADD COLUMN IF NOT EXISTS grading_cached_tokens INTEGER;
+
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS prompt_version                TEXT;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS avg_cached_tokens             DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS cache_hit_rate                DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS cached_token_ratio            DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS grading_cache_hit_rate        DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_cache_hit_ms          DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS latency_cache_miss_ms         DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS grading_latency_cache_hit_ms  DOUBLE PRECISION;
+ALTER TABLE tests ADD COLUMN IF NOT EXISTS grading_latency_cache_miss_ms DOUBLE PRECISION;
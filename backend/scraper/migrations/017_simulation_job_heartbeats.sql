@@ -0,0 +1,11 @@
+-- 017: hvaða API ferli keyrir hvert in-process job, og hvenær það lét síðast
+-- vita af sér. Ferlið uppfærir heartbeat_at á meðan job-ið er í gangi; job er
+-- aðeins klárað sem 'interrupted' þegar heartbeat er orðið gamalt, svo ný
+-- eintök (autoscaling, --workers N, rolling restart) snerta ekki job annarra.
+
+ALTER TABLE simulation_jobs ADD COLUMN IF NOT EXISTS owner        TEXT;
+ALTER TABLE simulation_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS ix_simulation_jobs_active
+    ON simulation_jobs (heartbeat_at)
+    WHERE status IN ('queued', 'running');
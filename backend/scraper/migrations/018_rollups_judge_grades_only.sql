@@ -0,0 +1,72 @@
+-- 018: run_rollups (migrations/015) lögðu reply_grade allra keyrslna í
+-- graded_count/grade_sum/grade_sumsq, líka sjálfsmat úr grading="self"
+-- (migrations/011). avg_reply_grade í /rollups blandaði því saman sjálfsmati og
+-- einkunnum dómarans. Nú eru aðeins einkunnir dómarans (llm, reference eða
+-- eldri raðir án grade_source) taldar, og samantektirnar reiknaðar aftur.
+
+CREATE OR REPLACE FUNCTION run_rollup_sql(source TEXT) RETURNS TEXT AS $$
+    SELECT format($q$
+        WITH changed AS (
+            -- Sjálfsmat (grade_source = 'self') er ekki einkunn dómarans og fer
+            -- ekki í grade_*; NULL grade_source eru eldri einkunnir dómarans
+            SELECT c.*,
+                   c.reply_grade IS NOT NULL AND c.grade_source IS DISTINCT FROM 'self' AS judged
+            FROM (%s) AS c
+        ),
+        grouped AS (
+            SELECT
+                (created_at AT TIME ZONE 'UTC')::date AS day,
+                company_name,
+                COALESCE(model_name, '') AS model_name,
+                SUM(sign) AS run_count,
+                COALESCE(SUM(sign) FILTER (WHERE generated_body IS NOT NULL), 0) AS generated_count,
+                COALESCE(SUM(sign) FILTER (WHERE sent_ok), 0) AS sent_ok_count,
+                COALESCE(SUM(sign) FILTER (WHERE latency_ms IS NOT NULL), 0) AS latency_count,
+                COALESCE(SUM(sign * latency_ms::float8), 0) AS latency_sum,
+                COALESCE(SUM(sign * latency_ms::float8 * latency_ms), 0) AS latency_sumsq,
+                COALESCE(run_rollup_sum(run_rollup_bucket(latency_ms, sign)),
+                         '{0,0,0,0,0,0,0,0,0,0}') AS latency_buckets,
+                COALESCE(SUM(sign) FILTER (WHERE judged), 0) AS graded_count,
+                COALESCE(SUM(sign * reply_grade::float8) FILTER (WHERE judged), 0) AS grade_sum,
+                COALESCE(SUM(sign * reply_grade::float8 * reply_grade::float8) FILTER (WHERE judged), 0)
+                    AS grade_sumsq
+            FROM changed
+            GROUP BY 1, 2, 3
+        )
+        INSERT INTO run_rollups AS r (
+            day, company_name, model_name, run_count, generated_count, sent_ok_count,
+            latency_count, latency_sum, latency_sumsq, latency_buckets,
+            graded_count, grade_sum, grade_sumsq
+        )
+        SELECT day, company_name, model_name, run_count, generated_count, sent_ok_count,
+               latency_count, latency_sum, latency_sumsq, latency_buckets,
+               graded_count, grade_sum, grade_sumsq
+        FROM grouped
+        WHERE run_count <> 0 OR generated_count <> 0 OR sent_ok_count <> 0
+           OR latency_count <> 0 OR latency_sum <> 0 OR latency_buckets <> '{0,0,0,0,0,0,0,0,0,0}'
+           OR graded_count <> 0 OR grade_sum <> 0 OR grade_sumsq <> 0
+        ORDER BY day, company_name, model_name
+        ON CONFLICT (day, company_name, model_name) DO UPDATE SET
+            run_count       = r.run_count + EXCLUDED.run_count,
+            generated_count = r.generated_count + EXCLUDED.generated_count,
+            sent_ok_count   = r.sent_ok_count + EXCLUDED.sent_ok_count,
+            latency_count   = r.latency_count + EXCLUDED.latency_count,
+            latency_sum     = r.latency_sum + EXCLUDED.latency_sum,
+            latency_sumsq   = r.latency_sumsq + EXCLUDED.latency_sumsq,
+            latency_buckets = run_rollup_add(r.latency_buckets, EXCLUDED.latency_buckets),
+            graded_count    = r.graded_count + EXCLUDED.graded_count,
+            grade_sum       = r.grade_sum + EXCLUDED.grade_sum,
+            grade_sumsq     = r.grade_sumsq + EXCLUDED.grade_sumsq,
+            updated_at      = now()
+    $q$, source)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Engar keyrslur skrifaðar á milli þess að samantektin er tæmd og reiknuð aftur
+LOCK TABLE "EmailTestRuns" IN SHARE ROW EXCLUSIVE MODE;
+
+TRUNCATE run_rollups;
+DO $$
+BEGIN
+    EXECUTE run_rollup_sql('SELECT 1 AS sign, * FROM "EmailTestRuns"');
+END;
+$$;
@@ -0,0 +1,26 @@
+-- 019: útgáfunúmer á "Companies" fyrir company_catalog (app/company_cache.py).
+-- Trigger hækkar version í hverri skipun sem breytir töflunni, líka þeim sem
+-- koma úr öðrum ferlum (aðrir uvicorn workers, worker.py, scraper). Hvert ferli
+-- ber version saman við sitt snapshot og les töfluna aftur ef hún hefur breyst.
+
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name        TEXT PRIMARY KEY,
+    version     BIGINT NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO catalog_versions (name) VALUES ('Companies') ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION companies_bump_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE catalog_versions
+    SET version = version + 1, updated_at = now()
+    WHERE name = 'Companies';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS companies_version ON "Companies";
+CREATE TRIGGER companies_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Companies"
+    FOR EACH STATEMENT EXECUTE FUNCTION companies_bump_version();
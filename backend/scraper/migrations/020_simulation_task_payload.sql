@@ -0,0 +1,6 @@
+-- 020: verk í simulation_tasks fyrir model matrix og endurmat (SIMULATION_BACKEND=queue).
+-- payload geymir það sem er sérstakt fyrir hvert verk: cell og númer beiðnar
+-- í model matrix, run_ids í endurmati. Verk í endurmati hafa ekkert scenario.
+
+ALTER TABLE simulation_tasks ADD COLUMN IF NOT EXISTS payload JSONB;
+ALTER TABLE simulation_tasks ALTER COLUMN scenario DROP NOT NULL;
@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from app.partitions import ARCHIVE_DIR, MONTHS_AHEAD, RETENTION_MONTHS, run_maintenance
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Create upcoming monthly partitions, detach expired ones and archive them to disk."
+    )
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS,
+                        help="Keep partitions that end less than this many months ago")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Only detach expired partitions; archive and drop them on a later run")
+    args = parser.parse_args()
+
+    if args.retention_months < 1:
+        print("❌ --retention-months must be at least 1", file=sys.stderr)
+        return 2
+
+    try:
+        report = run_maintenance(
+            months_ahead=args.months_ahead,
+            retention_months=args.retention_months,
+            archive_dir=args.archive_dir,
+            archive=not args.no_archive,
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(report, indent=2))
+    print(
+        f"✅ {len(report['created'])} created, {len(report['detached'])} detached, "
+        f"{len(report['archived'])} archived",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import argparse
+import os
+import signal
+import sys
+
+from app.queue_worker import QueueWorker, default_worker_id
+from app.task_queue import DEFAULT_LEASE_SECONDS
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Run simulation tasks from the simulation_tasks queue (SIMULATION_BACKEND=queue)."
+    )
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Simulations run at once by this worker")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Tasks not heartbeated for this long are retried by another worker")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between queue polls when idle")
+    parser.add_argument("--worker-id", default=default_worker_id())
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        print("❌ --concurrency must be at least 1", file=sys.stderr)
+        return 2
+    if args.lease_seconds < 3:
+        print("❌ --lease-seconds must be at least 3", file=sys.stderr)
+        return 2
+
+    worker = QueueWorker(args.worker_id, args.concurrency, args.lease_seconds, args.poll_interval)
+
+    def on_signal(signum, frame):
+        if worker.stopping.is_set():
+            # Annað merki: hætta strax, lease rennur út og verkin eru tekin aftur
+            # os._exit: sys.exit myndi bíða eftir executor.shutdown(wait=True) í
+            # run() og eftir þráðunum við lokun túlksins
+            print("Exiting without waiting for running tasks", file=sys.stderr)
+            sys.stderr.flush()
+            os._exit(1)
+        print("Finishing running tasks (signal again to exit now)", file=sys.stderr)
+        worker.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+Benchmark fyrir API-ið: keyrir scriptuð scenarios á móti raunverulegum uvicorn
+þjóni, þar sem ytri þjónustum er skipt út fyrir staðbundna staðgengla
+(sjá mock_services.py), og mælir throughput, latency percentiles og RSS.
+
+Hvert scenario fær sína tests-röð (label="bench:<scenario>") í gegnum
+INSERT_TEST_DATA og heildarskýrsla er skrifuð sem JSON.
+
+    cd backend/testResult
+    python bench.py --requests 100 --concurrency 8 --llm-latency-ms 300
+    python bench.py --scenarios scrape,send-email --no-save --report out.json
+
+DATABASE_URL þarf að vísa á grunn með migrations (scrape og manual-generate skrifa í hann).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from mock_services import FixtureSite, MockOpenAI, SmtpSink
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scraper.app.load_generator import percentile
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent / "scraper"
+SCENARIOS = ("scrape", "send-email", "manual-generate", "run-simulated-test")
+
+MANUAL_EMAIL = (
+    "Subject: Question about ingredients\n"
+    "Hi, can you tell me if your moss serum is suitable for sensitive skin?"
+)
+
+
+# --- RSS -------------------------------------------------------------------------
+
+def read_rss_mb(pid: int):
+    # Linux: VmRSS úr /proc; annars er RSS ekki mælt
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """
+    Les RSS API ferlisins á interval fresti í bakgrunnsþræði; reset() byrjar nýtt hámark.
+    """
+
+    def __init__(self, pid, interval_s: float = 0.1):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def sample(self):
+        rss = read_rss_mb(self.pid) if self.pid else None
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return rss
+
+    def reset(self):
+        self.peak = None
+        return self.sample()
+
+    def start(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+# --- API þjónn -------------------------------------------------------------------
+
+def start_api(port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SCRAPER_DIR,
+        env={**os.environ, **env},
+    )
+    url = f"http://127.0.0.1:{port}/"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with code {proc.returncode} during startup")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API did not start within 60s")
+
+
+# --- Scenarios -------------------------------------------------------------------
+
+def build_requests(args, site: FixtureSite, company: str):
+    """
+    scenario -> fall(session) sem sendir eina beiðni og skilar (response, grade)
+    """
+    base = args.server_url.rstrip("/")
+
+    def scrape(s):
+        return s.get(f"{base}/scrape", params={"url": site.url}, timeout=args.timeout), None
+
+    def send_email(s):
+        r = s.post(f"{base}/send-email", json={
+            "to": args.to,
+            "subject": "Benchmark",
+            "content": "Þetta er prófunarpóstur úr benchmark.",
+            "company_name": company,
+        }, timeout=args.timeout)
+        # /send-email skilar 200 með success=False ef SMTP mistekst
+        if r.ok and not r.json().get("success"):
+            r.status_code = 502
+        return r, None
+
+    def manual_generate(s):
+        r = s.post(f"{base}/manual-generate", json={
+            "company_name": company,
+            "to": args.to,
+            "input_email": MANUAL_EMAIL,
+        }, timeout=args.timeout)
+        return r, (r.json().get("grade") if r.ok else None)
+
+    def run_simulated_test(s):
+        r = s.post(f"{base}/run-simulated-test", json={
+            "num_emails": 1,
+            "concurrency_level": 1,
+            "to": args.to,
+            "company_name": company,
+        }, timeout=args.timeout)
+        return r, (r.json().get("avg_reply_grade") if r.ok else None)
+
+    return {
+        "scrape": scrape,
+        "send-email": send_email,
+        "manual-generate": manual_generate,
+        "run-simulated-test": run_simulated_test,
+    }
+
+
+def run_scenario(send, n_requests: int, concurrency: int):
+    """
+    Closed loop: concurrency þræðir, hver með sína requests.Session, þar til
+    n_requests beiðnir hafa verið sendar.
+    """
+    local = threading.local()
+    counter = iter(range(n_requests))
+    counter_lock = threading.Lock()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def worker():
+        local.session = requests.Session()
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            t0 = time.perf_counter()
+            try:
+                response, grade = send(local.session)
+                ok, error = response.ok, None if response.ok else f"HTTP {response.status_code}"
+            except Exception as e:
+                ok, grade, error = False, None, str(e)
+            latency_ms = (time.perf_counter() - t0) * 1000
+            with samples_lock:
+                samples.append({"latency_ms": latency_ms, "ok": ok, "grade": grade, "error": error})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed_s: float) -> dict:
+    ok = sorted(s["latency_ms"] for s in samples if s["ok"])
+    grades = [float(s["grade"]) for s in samples if s["grade"] is not None]
+    errors = Counter(s["error"] for s in samples if s["error"])
+    return {
+        "total_requests": len(samples),
+        "failure_count": len(samples) - len(ok),
+        "elapsed_s": elapsed_s,
+        "throughput_rps": len(ok) / elapsed_s if elapsed_s > 0 else 0.0,
+        "latency_p50_ms": percentile(ok, 0.50),
+        "latency_p90_ms": percentile(ok, 0.90),
+        "latency_p95_ms": percentile(ok, 0.95),
+        "latency_p99_ms": percentile(ok, 0.99),
+        "latency_max_ms": ok[-1] if ok else None,
+        "avg_reply_grade": sum(grades) / len(grades) if grades else None,
+        # Sömu hólf og grade_distribution í SUMMARY_METRICS_SQL
+        "grade_distribution": dict(Counter(str(min(int(g), 10)) for g in grades)) or None,
+        "errors": dict(errors.most_common(5)),
+    }
+
+
+# --- main ------------------------------------------------------------------------
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scenarios", default=",".join(SCENARIOS),
+                   help=f"comma separated subset of {', '.join(SCENARIOS)}")
+    p.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--llm-latency-ms", type=float, default=200.0,
+                   help="artificial latency of the mock OpenAI server")
+    p.add_argument("--server-url", default=None,
+                   help="benchmark an already running API instead of starting one "
+                        "(it must be configured against the mocks yourself)")
+    p.add_argument("--server-pid", type=int, default=None, help="pid for RSS when --server-url is used")
+    p.add_argument("--port", type=int, default=4101)
+    p.add_argument("--to", default="bench@example.com")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--report", default="bench-report.json")
+    p.add_argument("--no-save", action="store_true", help="do not write rows to the tests table")
+    args = p.parse_args(argv)
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        p.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if args.requests <= 0 or args.concurrency <= 0:
+        p.error("--requests and --concurrency must be > 0")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    with FixtureSite() as site, SmtpSink() as smtp, MockOpenAI(args.llm_latency_ms) as llm:
+        proc = None
+        pid = args.server_pid
+        if not args.server_url:
+            proc = start_api(args.port, {
+                "OPENAI_BASE_URL": llm.base_url,
+                "OPENAI_API_KEY": "sk-bench",
+                "SMTP_SERVER": "127.0.0.1",
+                "SMTP_PORT": str(smtp.port),
+                "SMTP_USE_TLS": "false",
+                "SMTP_USERNAME": "bench",
+                "SMTP_PASSWORD": "bench",
+                "FROM_EMAIL": "bench@example.com",
+            })
+            args.server_url = f"http://127.0.0.1:{args.port}"
+            pid = proc.pid
+
+        rss = RssSampler(pid).start()
+        try:
+            # Upphitun: /scrape setur fixture fyrirtækið í grunninn fyrir hin scenarios
+            warmup = requests.get(f"{args.server_url}/scrape", params={"url": site.url}, timeout=args.timeout)
+            warmup.raise_for_status()
+            company = warmup.json()["scraped"]["company_name"]
+            rss_baseline = rss.reset()
+
+            senders = build_requests(args, site, company)
+            report = {
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "server_url": args.server_url,
+                "requests_per_scenario": args.requests,
+                "concurrency": args.concurrency,
+                "llm_latency_ms": args.llm_latency_ms,
+                "rss_baseline_mb": rss_baseline,
+                "scenarios": {},
+            }
+
+            for name in args.scenarios:
+                rss.reset()
+                started_at = datetime.now(timezone.utc)
+                samples, elapsed_s = run_scenario(senders[name], args.requests, args.concurrency)
+                result = summarize(samples, elapsed_s)
+                result["peak_rss_mb"] = rss.peak
+                result["rss_end_mb"] = rss.sample()
+
+                if not args.no_save:
+                    from saveTest import INSERT_TEST_DATA
+                    result["test_id"] = INSERT_TEST_DATA(
+                        {
+                            "companies": [company],
+                            "num_emails": args.requests,
+                            "concurrency_level": args.concurrency,
+                            "started_at": started_at,
+                        },
+                        {
+                            **result,
+                            "label": f"bench:{name}",
+                            "finished_at": datetime.now(timezone.utc),
+                        },
+                    )
+
+                report["scenarios"][name] = result
+                print(
+                    f"{name:<20} {result['throughput_rps']:8.1f} req/s  "
+                    f"p50 {result['latency_p50_ms'] or 0:8.1f} ms  "
+                    f"p99 {result['latency_p99_ms'] or 0:8.1f} ms  "
+                    f"failed {result['failure_count']:>4}  "
+                    f"peak RSS {result['peak_rss_mb'] or 0:6.1f} MB"
+                )
+
+            report["finished_at"] = datetime.now(timezone.utc).isoformat()
+            report["smtp_messages"] = smtp.messages
+        finally:
+            rss.stop()
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Report written to {args.report}")
+
+    # Scenario þar sem allar beiðnir mistókust er villa í uppsetningu, ekki mæling
+    broken = [n for n, r in report["scenarios"].items() if r["failure_count"] == r["total_requests"]]
+    if broken:
+        print(f"All requests failed in: {', '.join(broken)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
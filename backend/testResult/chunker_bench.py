@@ -0,0 +1,121 @@
+"""
+Ber saman gamla chunk_text (800 orð, engin skörun, enginn samanburður milli
+síðna) og nýja chunker-inn (app/chunker.py) á tilbúnum vef: hver síða hefur
+sinn texta en líka sömu boilerplate blocks (cookie borði, tengiliðir,
+fréttabréf), og hluti síðnanna er til á tveimur slóðum.
+
+Mælt er: fjöldi chunks, áætlaður token fjöldi sem er geymdur (CompanyInfo) og
+fer í prompts, og tími fyrir chunking (HTML parsing ekki meðtalið) fyrir
+mismarga síður, svo sjáist að tíminn vex línulega.
+
+    cd backend/testResult
+    python chunker_bench.py --pages 25,100,400
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scraper.app.chunker import NearDuplicateIndex, estimate_tokens, iter_chunks, iter_words
+
+WORDS = (
+    "við bjóðum upp á íslenskar vörur úr hreinu vatni mosa og hveraleir fyrir viðkvæma húð "
+    "pantanir sendar samdægurs skil innan þrjátíu daga verslanir um allt land og vefverslun "
+    "umhverfisvænar umbúðir endurunnið gler svansvottun rakakrem serum maski hreinsifroða"
+).split()
+
+BOILERPLATE = [
+    "Við notum vafrakökur til að bæta upplifun þína á vefnum og til að greina umferð. "
+    "Með því að halda áfram samþykkir þú notkun á vafrakökum samkvæmt persónuverndarstefnu okkar.",
+    "Hafðu samband: Norðurljós ehf., Glerárgötu 1, 600 Akureyri. Sími 000 0000. "
+    "Þjónustuverið svarar tölvupósti alla virka daga frá klukkan níu til fjögur.",
+    "Skráðu þig á póstlistann okkar og fáðu tíu prósent afslátt af fyrstu pöntun, "
+    "fréttir af nýjum vörum og tilboð sem bjóðast bara áskrifendum.",
+]
+
+
+def old_chunk_text(text, max_length=800):
+    # Eins og chunk_text var fyrir app/chunker.py
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), max_length):
+        chunk = " ".join(words[i:i + max_length])
+        if len(chunk) > 50:
+            chunks.append(chunk)
+    return chunks
+
+
+def make_site(rng: random.Random, n_pages: int):
+    """
+    Listi af síðum, hver síða listi af blocks eins og extract_text_blocks skilar.
+    Tíunda hver síða er afrit af fyrri síðu (sama síða á annarri slóð).
+    """
+    pages = []
+    for i in range(n_pages):
+        if i and i % 10 == 0:
+            pages.append(list(pages[rng.randrange(len(pages))]))
+            continue
+        body = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 120)))
+            for _ in range(rng.randint(3, 8))
+        ]
+        pages.append([f"Síða {i}", *body, *BOILERPLATE])
+    return pages
+
+
+def old_pipeline(pages):
+    # Allur textinn í einum streng, eins og ef allar síðurnar væru skrapaðar
+    return old_chunk_text(" ".join(block for page in pages for block in page))
+
+
+def new_pipeline(pages, max_tokens, overlap_tokens):
+    block_index = NearDuplicateIndex()
+    kept = (block for page in pages for block in block_index.filter(page))
+    return list(NearDuplicateIndex().filter(iter_chunks(iter_words(kept), max_tokens, overlap_tokens)))
+
+
+def tokens(chunks) -> int:
+    return sum(estimate_tokens(w) for chunk in chunks for w in chunk.split())
+
+
+def measure(fn, pages, runs: int) -> dict:
+    best = None
+    for _ in range(runs):
+        t = time.perf_counter()
+        chunks = fn(pages)
+        elapsed = (time.perf_counter() - t) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return {"chunks": len(chunks), "tokens": tokens(chunks), "best_ms": round(best, 2)}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--pages", default="25,100,400")
+    p.add_argument("--max-tokens", type=int, default=400)
+    p.add_argument("--overlap-tokens", type=int, default=50)
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--report", default=None, help="also write the result as JSON to this file")
+    args = p.parse_args(argv)
+
+    report = {}
+    for n in [int(x) for x in args.pages.split(",")]:
+        pages = make_site(random.Random(args.seed), n)
+        source_tokens = tokens(block for page in pages for block in page)
+        report[f"{n} pages"] = {
+            "source_tokens": source_tokens,
+            "before": measure(old_pipeline, pages, args.runs),
+            "after": measure(lambda ps: new_pipeline(ps, args.max_tokens, args.overlap_tokens), pages, args.runs),
+        }
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
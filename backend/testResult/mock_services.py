@@ -0,0 +1,230 @@
+"""
+Staðbundnir staðgenglar fyrir ytri þjónustur svo benchmark mæli bara okkar kóða:
+
+- FixtureSite:  HTTP þjónn sem birtir vistaðar HTML síður (fixtures/site) fyrir /scrape
+- SmtpSink:     SMTP þjónn sem samþykkir allt og hendir póstinum (SMTP_USE_TLS=false)
+- MockOpenAI:   /v1/chat/completions með fastri töf; API notar hann í gegnum OPENAI_BASE_URL.
+                Hermir prompt cache OpenAI (forskeyti >= 1024 token, 128 token skref).
+
+Allir þjónarnir hlusta á 127.0.0.1 og port 0 (OS velur), og keyra í daemon þráðum.
+"""
+import base64
+import functools
+import hashlib
+import json
+import socketserver
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "site"
+
+
+class _Background:
+    def __init__(self, server):
+        self.server = server
+        self.thread = threading.Thread(target=server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# --- HTML fixtures -------------------------------------------------------------
+
+class _QuietFileHandler(SimpleHTTPRequestHandler):
+    # Án charset myndi requests lesa síðurnar sem latin-1
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, ".html": "text/html; charset=utf-8"}
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureSite(_Background):
+    def __init__(self, directory: Path = FIXTURES_DIR):
+        handler = functools.partial(_QuietFileHandler, directory=str(directory))
+        super().__init__(ThreadingHTTPServer(("127.0.0.1", 0), handler))
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/index.html"
+
+
+# --- SMTP sink -----------------------------------------------------------------
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 localhost bench SMTP sink")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode(errors="replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == "AUTH":
+                parts = cmd.split()
+                if len(parts) > 1 and parts[1].upper() == "LOGIN":
+                    for prompt in ("Username:", "Password:"):
+                        self.reply("334 " + base64.b64encode(prompt.encode()).decode())
+                        self.rfile.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply("250 OK: queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP ...
+                self.reply("250 OK")
+
+
+class _SmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    messages = 0
+    lock = threading.Lock()
+
+
+class SmtpSink(_Background):
+    def __init__(self):
+        super().__init__(_SmtpServer(("127.0.0.1", 0), _SmtpHandler))
+
+    @property
+    def messages(self) -> int:
+        return self.server.messages
+
+
+# --- OpenAI ----------------------------------------------------------------------
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        cached_tokens = self.server.prefix_cache.lookup(prompt)
+        # cache_speedup: hlutfall af töf sem sparast ef allt prompt-ið kemur úr cache
+        time.sleep(self.server.latency_s * (1 - self.server.cache_speedup * cached_tokens / prompt_tokens))
+
+        # Sama prompt gefur alltaf sama svar svo niðurstöður séu samanburðarhæfar
+        digest = int(hashlib.sha256(prompt.encode()).hexdigest(), 16)
+        response_format = (request.get("response_format") or {}).get("type")
+        if response_format == "json_object":
+            content = json.dumps({
+                "subject": "Re: your message",
+                "body": "Thank you for contacting us. " * 20,
+            })
+        elif response_format == "json_schema":
+            # generate_and_grade_with_openai: svar og sjálfsmat í einu
+            content = json.dumps({
+                "subject": "Re: your message",
+                "body": "Thank you for contacting us. " * 20,
+                "self_grade": round(5 + digest % 50 / 10, 1),
+            })
+        else:
+            content = f"{5 + digest % 50 / 10:.1f}"
+
+        completion_tokens = max(1, len(content) // 4)
+        self._send(200, {
+            "id": f"chatcmpl-bench-{digest % 10**12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _PrefixCache:
+    """
+    Eins og prompt caching hjá OpenAI: forskeyti eru cache-uð í 128 token
+    skrefum frá 1024 token; cached_tokens er lengsta forskeyti sem hefur sést
+    áður. Token eru áætluð sem 4 stafir.
+    """
+    MIN_TOKENS = 1024
+    STEP_TOKENS = 128
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str) -> int:
+        tokens = len(prompt) // 4
+        keys = [
+            (n, hashlib.sha256(prompt[:n * 4].encode()).digest())
+            for n in range(self.MIN_TOKENS, tokens + 1, self.STEP_TOKENS)
+        ]
+        with self._lock:
+            cached = max((n for n, key in keys if key in self._seen), default=0)
+            self._seen.update(key for _, key in keys)
+        return cached
+
+
+class MockOpenAI(_Background):
+    def __init__(self, latency_ms: float = 0.0, cache_speedup: float = 0.0):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _OpenAIHandler)
+        server.daemon_threads = True
+        server.latency_s = latency_ms / 1000
+        server.cache_speedup = cache_speedup
+        server.prefix_cache = _PrefixCache()
+        super().__init__(server)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
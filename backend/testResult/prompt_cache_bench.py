@@ -0,0 +1,98 @@
+"""
+Ber saman prompt sniðmát (app/prompts.py) m.t.t. prompt cache: sendir sömu
+beiðnir (generate + dómari) í gegnum llm_service fyrir hverja útgáfu á móti
+MockOpenAI, sem hermir prompt caching OpenAI, og skilar cache hit hlutfalli,
+hlutfalli prompt token úr cache og svartíma með og án cache hit.
+
+Hver útgáfa fær nýjan MockOpenAI (tómt cache), svo fyrstu köllin eru alltaf miss.
+
+    cd backend/testResult
+    python prompt_cache_bench.py --requests 200 --llm-latency-ms 300 --cache-speedup 0.5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+from mock_services import MockOpenAI
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scraper.app.load_generator import percentile
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent / "scraper"
+COMPANIES = ["Nói Síríus", "Omnom", "Kaffitár", "66°North", "Bláa Lónið", "Sjóvá", "Ölgerðin", "Hekla"]
+
+
+def load_corpus(name: str):
+    with open(SCRAPER_DIR / "scenarios" / name, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(calls) -> dict:
+    hits = sorted(c["latency_ms"] for c in calls if c["cached_tokens"])
+    misses = sorted(c["latency_ms"] for c in calls if not c["cached_tokens"])
+    prompt = sum(c["prompt_tokens"] for c in calls)
+    return {
+        "calls": len(calls),
+        "avg_prompt_tokens": round(prompt / len(calls), 1),
+        "cache_hit_rate": round(sum(1 for c in calls if c["cached_tokens"]) / len(calls), 3),
+        "cached_token_ratio": round(sum(c["cached_tokens"] for c in calls) / prompt, 3),
+        "latency_hit_p50_ms": percentile(hits, 0.50) if hits else None,
+        "latency_miss_p50_ms": percentile(misses, 0.50) if misses else None,
+    }
+
+
+def run_version(llm_service, version: str, plan) -> dict:
+    generate, grade = [], []
+    for company, scenario in plan:
+        input_email = scenario["input_email"]
+        _, body, _, latency_ms, usage = llm_service.generate_reply_with_openai(
+            company_name=company, input_email=input_email, prompt_version=version,
+        )
+        generate.append(dict(usage, latency_ms=latency_ms, cached_tokens=usage["cached_tokens"] or 0))
+        _, latency_ms, usage = llm_service.evaluate_with_openai_rubric(
+            company_name=company,
+            scenario=input_email.split("\n", 1)[0],
+            input_email=input_email,
+            generated_body=body,
+            prompt_version=version,
+        )
+        grade.append(dict(usage, latency_ms=latency_ms, cached_tokens=usage["cached_tokens"] or 0))
+    return {"generate": summarize(generate), "grade": summarize(grade)}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--llm-latency-ms", type=float, default=200.0)
+    p.add_argument("--cache-speedup", type=float, default=0.5,
+                   help="share of mock latency saved when the whole prompt is cached")
+    p.add_argument("--corpus", default="default.jsonl")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--versions", default="v1,v2")
+    p.add_argument("--report", default=None, help="also write the result as JSON to this file")
+    args = p.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus(args.corpus)
+    plan = [(rng.choice(COMPANIES), rng.choice(corpus)) for _ in range(args.requests)]
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    from scraper.app import llm_service
+
+    report = {}
+    for version in args.versions.split(","):
+        with MockOpenAI(args.llm_latency_ms, args.cache_speedup) as llm:
+            os.environ["OPENAI_BASE_URL"] = llm.base_url
+            llm_service.get_client.cache_clear()
+            report[version] = run_version(llm_service, version, plan)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,20 @@ import json
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from scraper.app.database import SessionLocal
 
+# Valkvæðir dálkar í tests (migrations/005 og 007) sem results má innihalda
+OPTIONAL_RESULT_COLUMNS = [
+    "label",
+    "latency_p50_ms",
+    "latency_p90_ms",
+    "latency_p95_ms",
+    "latency_p99_ms",
+    "latency_max_ms",
+    "throughput_rps",
+    "failure_count",
+    "grade_distribution",
+    "peak_rss_mb",
+]
+
 
 def INSERT_TEST_DATA(settings: dict, results: dict) -> int:
     companies         = settings["companies"]
@@ -16,16 +30,20 @@ def INSERT_TEST_DATA(settings: dict, results: dict) -> int:
     started_at  = settings.get("started_at", datetime.now(timezone.utc))
     finished_at = results.get("finished_at", datetime.now(timezone.utc))
 
-    sql = text("""
+    extra = [c for c in OPTIONAL_RESULT_COLUMNS if results.get(c) is not None]
+
+    sql = text(f"""
         INSERT INTO tests (
             companies, num_emails, concurrency_level,
             started_at, finished_at,
             total_requests, avg_reply_grade
+            {"".join(", " + c for c in extra)}
         )
         VALUES (
             :companies, :num_emails, :concurrency_level,
             :started_at, :finished_at,
             :total_requests, :avg_reply_grade
+            {"".join(", CAST(:grade_distribution AS jsonb)" if c == "grade_distribution" else ", :" + c for c in extra)}
         )
         RETURNING test_id;
     """)
@@ -39,6 +57,8 @@ def INSERT_TEST_DATA(settings: dict, results: dict) -> int:
         "total_requests": results.get("total_requests", 0),
         "avg_reply_grade": results.get("avg_reply_grade"),
     }
+    for c in extra:
+        params[c] = json.dumps(results[c]) if c == "grade_distribution" else results[c]
 
     with SessionLocal() as session:
         result = session.execute(sql, params)
@@ -0,0 +1,176 @@
+"""
+Ber saman serialization og stærð svara fyrir list endpoints á seeded gögnum:
+
+  before     jsonable_encoder + JSONResponse (json.dumps), eins og FastAPI gerði
+             fyrir /companies, /tests og /email-history
+  after      FastJSONResponse (orjson) á raðirnar beint
+  fields     after með ?fields=..., t.d. bara id og nafn fyrir /companies
+
+Fyrir hvert tilvik er mældur tími (percentiles yfir --runs endurtekningar) og
+stærð svarsins óþjappað, með gzip og með brotli (sömu stillingar og
+app/compression.py).
+
+    cd backend/testResult
+    python serialization_bench.py --companies 500 --tests 1000 --emails 1000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scraper.app.compression import _Compressor, brotli
+from scraper.app.load_generator import percentile
+from scraper.app.responses import FastJSONResponse, pick_fields
+
+WORDS = (
+    "fish bakery coffee roastery tours glacier lava wool design hotel dairy "
+    "brewery salmon lamb skyr delivery online shop iceland reykjavik north"
+).split()
+
+
+def text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def seed_companies(rng, n):
+    # CompanyInfo er skrapaður texti af vefsíðu fyrirtækisins, oft nokkur KB
+    return [
+        {
+            "id": i + 1,
+            "CompanyName": f"{text(rng, 2).title()} ehf. {i}",
+            "CompanyDescription": text(rng, 30),
+            "CompanyInfo": text(rng, rng.randint(300, 900)),
+        }
+        for i in range(n)
+    ]
+
+
+def seed_tests(rng, n):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    out = []
+    for i in range(n):
+        started = start + timedelta(minutes=17 * i)
+        p50 = rng.uniform(400, 2000)
+        out.append({
+            "test_id": n - i,
+            "companies": [text(rng, 2).title() for _ in range(rng.randint(1, 8))],
+            "num_emails": 100,
+            "concurrency_level": rng.choice([1, 4, 8, 16]),
+            "started_at": started,
+            "finished_at": started + timedelta(seconds=rng.randint(30, 600)),
+            "total_requests": 100,
+            "avg_reply_grade": rng.uniform(5, 10),
+            "latency_ms": {"p50": p50, "p90": p50 * 1.8, "p95": p50 * 2.1, "p99": p50 * 3, "max": p50 * 4},
+            "avg_generation_ms": p50 * 0.8,
+            "avg_grading_ms": p50 * 0.5,
+            "grading_p95_ms": p50,
+            "throughput_rps": rng.uniform(0.5, 20),
+            "failure_count": rng.randint(0, 5),
+            "grade_distribution": {str(g): rng.randint(0, 30) for g in range(1, 11)},
+            "model_name": rng.choice(["gpt-4.1-mini", "gpt-4.1", "gpt-4o-mini"]),
+            "temperature": 0.7,
+            "max_tokens": 600,
+            "tokens": {"avg_prompt": 812.5, "avg_completion": 240.1, "total": 105260},
+            "self_grading": {"runs": None, "calibration_runs": None, "bias": None, "mae": None},
+            "seed": rng.getrandbits(31),
+            "scenario_corpus": "default.jsonl",
+            "stratify_by": ["category"],
+            "label": None,
+            "peak_rss_mb": rng.uniform(120, 400),
+        })
+    return out
+
+
+def seed_emails(rng, n):
+    start = datetime(2026, 6, 1)
+    return [
+        {
+            "id": n - i,
+            "recipient": f"user{rng.randint(1, 500)}@example.is",
+            "subject": text(rng, 6),
+            "sent_at": start - timedelta(minutes=3 * i),
+            "status": rng.choice(["sent", "sent", "sent", "failed"]),
+            "company_id": rng.randint(1, 500),
+        }
+        for i in range(n)
+    ]
+
+
+def before(rows):
+    # Eldri leiðin: endpoint skilaði dicts með datetime sem isoformat strengjum
+    rows = [
+        {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+        for row in rows
+    ]
+    return JSONResponse(jsonable_encoder(rows)).body
+
+
+def after(rows, fields=None):
+    return FastJSONResponse(pick_fields(rows, fields)).body
+
+
+def compress(body: bytes, encoding: str) -> dict:
+    t = time.perf_counter()
+    size = len(_Compressor(encoding).compress(body, final=True))
+    return {f"{encoding}_bytes": size, f"{encoding}_ms": round((time.perf_counter() - t) * 1000, 3)}
+
+
+def measure(fn, runs: int) -> dict:
+    body = fn()
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    sizes = {"raw_bytes": len(body), **compress(body, "gzip")}
+    if brotli is not None:
+        sizes.update(compress(body, "br"))
+    return {
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        **sizes,
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--companies", type=int, default=500)
+    p.add_argument("--tests", type=int, default=1000)
+    p.add_argument("--emails", type=int, default=1000)
+    p.add_argument("--runs", type=int, default=30)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--report", default=None, help="also write the result as JSON to this file")
+    args = p.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    datasets = {
+        "/companies": (seed_companies(rng, args.companies), ["id", "CompanyName"]),
+        "/tests": (seed_tests(rng, args.tests), ["test_id", "label", "started_at"]),
+        "/email-history": (seed_emails(rng, args.emails), ["id", "subject", "sent_at"]),
+    }
+
+    report = {}
+    for endpoint, (rows, fields) in datasets.items():
+        report[endpoint] = {
+            "rows": len(rows),
+            "before": measure(lambda: before(rows), args.runs),
+            "after": measure(lambda: after(rows), args.runs),
+            f"after fields={','.join(fields)}": measure(lambda: after(rows, fields), args.runs),
+        }
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
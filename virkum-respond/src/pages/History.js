@@ -10,7 +10,35 @@ function formatDateTime(isoString) {
   return d.toLocaleString();
 }
 
+function formatMs(value) {
+  return value != null ? `${Math.round(value)} ms` : "N/A";
+}
+
+function GradeDistribution({ distribution }) {
+  const buckets = Object.entries(distribution || {}).sort(
+    ([a], [b]) => Number(a) - Number(b)
+  );
+  if (buckets.length === 0) return <span>N/A</span>;
+  const max = Math.max(...buckets.map(([, n]) => n));
+
+  return (
+    <div className={styles.distribution}>
+      {buckets.map(([grade, n]) => (
+        <div key={grade} className={styles.distributionRow}>
+          <span className={styles.distributionLabel}>{grade}</span>
+          <span
+            className={styles.distributionBar}
+            style={{ width: `${(n / max) * 100}%` }}
+          />
+          <span>{n}</span>
+        </div>
+      ))}
+    </div>
+  );
+}
+
 function TestDetailsModal({ test, onClose }) {
+  const latency = test.latency_ms || {};
   return (
     <Modal title={`Test #${test.test_id}`} onClose={onClose}>
       <div className={styles.detailsGrid}>
@@ -42,6 +70,29 @@ function TestDetailsModal({ test, onClose }) {
             ? `${(test.avg_reply_grade*10).toFixed(1)} %`
             : "N/A"}
         </p>
+        <p>
+          <strong>Failures:</strong> {test.failure_count ?? "N/A"}
+        </p>
+        <p>
+          <strong>Throughput:</strong>{" "}
+          {test.throughput_rps != null
+            ? `${test.throughput_rps.toFixed(2)} emails/s`
+            : "N/A"}
+        </p>
+        <p>
+          <strong>Latency p50 / p90 / p95 / p99 / max:</strong>{" "}
+          {formatMs(latency.p50)} / {formatMs(latency.p90)} /{" "}
+          {formatMs(latency.p95)} / {formatMs(latency.p99)} /{" "}
+          {formatMs(latency.max)}
+        </p>
+        <p>
+          <strong>Avg. generation / grading:</strong>{" "}
+          {formatMs(test.avg_generation_ms)} / {formatMs(test.avg_grading_ms)}
+        </p>
+        <div>
+          <strong>Grade distribution:</strong>
+          <GradeDistribution distribution={test.grade_distribution} />
+        </div>
       </div>
     </Modal>
   );
@@ -100,6 +151,9 @@ export default function HistoryPage() {
                 <span className={styles.meta}>
                   Performed at{" "}
                   {formatDateTime(t.finished_at || t.started_at)}
+                  {t.latency_ms?.p95 != null &&
+                    ` · p95 ${formatMs(t.latency_ms.p95)}`}
+                  {t.failure_count ? ` · ${t.failure_count} failed` : ""}
                 </span>
               </button>
             </li>